@@ -1,5 +1,5 @@
 import graphene
-from crm.schema import Query as CRMQuery, Mutation as CRMMutation
+from crm.schema import AsyncQuery as CRMAsyncQuery, Query as CRMQuery, Mutation as CRMMutation
 
 class Query(CRMQuery, graphene.ObjectType):
     hello = graphene.String()
@@ -10,4 +10,12 @@ class Query(CRMQuery, graphene.ObjectType):
 class Mutation(CRMMutation, graphene.ObjectType):
     pass
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+schema = graphene.Schema(query=Query, mutation=Mutation)
+
+# Same fields, with coroutine resolvers where the async ORM is used; served
+# by crm.views.AsyncCRMGraphQLView under ASGI
+class AsyncQuery(CRMAsyncQuery, Query):
+    class Meta:
+        name = 'Query'
+
+async_schema = graphene.Schema(query=AsyncQuery, mutation=Mutation)
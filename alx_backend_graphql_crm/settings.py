@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -80,6 +81,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so atomic blocks that read then write
+            # (order placement) serialize instead of failing on lock upgrade.
+            # This is SQLite's stand-in for SELECT ... FOR UPDATE.
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -127,7 +134,87 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # GraphQL
 GRAPHENE = {
-    'SCHEMA': 'alx_backend_graphql_crm.schema.schema'
+    'SCHEMA': 'alx_backend_graphql_crm.schema.schema',
+    # Under DEBUG graphene-django adds DjangoDebugMiddleware, which wraps
+    # the connection's cursors until a `_debug` field resolves. The schema
+    # has none, so they stayed wrapped and broke executemany for the thread.
+    'MIDDLEWARE': [],
+}
+
+# Caches; 'graphql' backs the opt-in resolver response cache (crm/cache.py).
+# Swap in 'django.core.cache.backends.filebased.FileBasedCache' with a
+# directory LOCATION to share entries between worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'graphql': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crm-graphql',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+CRM_RESOLVER_CACHE = {
+    'ENABLED': False,
+    'CACHE_ALIAS': 'graphql',
+    'TIMEOUT': 60,
+}
+
+# Parsed + validated documents kept per process, keyed by query sha256
+GRAPHQL_DOCUMENT_CACHE_SIZE = 256
+
+# Operations registered with `manage.py register_persisted_queries`
+GRAPHQL_PERSISTED_QUERIES_PATH = BASE_DIR / 'persisted_queries.json'
+
+# Per-operation limits checked before execution (crm/complexity.py); page
+# sizes default to graphene's RELAY_CONNECTION_MAX_LIMIT, plain lists count
+# as LIST_SIZE rows and FIELD_COSTS overrides the cost of 'Type.field'
+GRAPHQL_QUERY_COST = {
+    'MAX_DEPTH': 5,
+    'MAX_COST': 10000,
+    'LIST_SIZE': 100,
+    'FIELD_COSTS': {},
+}
+
+# Per-resolver timings (crm/tracing.py); RECORD keeps a rolling window of
+# traced operations for `manage.py resolver_timings`
+GRAPHQL_TRACING = {
+    'RECORD': DEBUG,
+    'WINDOW': 1000,
+}
+
+# 'fts5' serves the name/email substring filters from FTS5 trigram tables
+# (crm/search.py); 'like' uses plain icontains
+CRM_SEARCH_BACKEND = 'fts5'
+
+# Threads (and so database connections) the async GraphQL view uses for
+# resolvers that still run on the sync ORM
+GRAPHQL_ASYNC_DB_THREADS = 8
+
+# View behind /graphql/: 'async' runs graphql-core's async executor and is
+# the default under ASGI (asgi.py); WSGI servers keep the 'sync' view
+GRAPHQL_VIEW = os.environ.get('CRM_GRAPHQL_VIEW', 'sync')
+
+# Shared GraphQL client of the CRM's jobs (crm/client.py). LOCAL runs their
+# operations against the schema in process.
+CRM_GRAPHQL_CLIENT = {
+    'URL': 'http://localhost:8000/graphql/',
+    'LOCAL': True,
+    'TIMEOUT': 10,
+    'RETRIES': 3,
+    'RETRY_BACKOFF': 0.5,
+    'SCHEMA_SNAPSHOT': BASE_DIR / 'graphql_schema_snapshot.json',
+}
+
+# /health/ report (crm/health.py), cached CACHE_SECONDS per process; the
+# heartbeat jobs probe URL. WINDOW GraphQL requests feed the p50/p99 latency
+CRM_HEALTH = {
+    'URL': 'http://localhost:8000/health/',
+    'TIMEOUT': 5,
+    'CACHE_SECONDS': 5,
+    'WINDOW': 1000,
 }
 
 CRONJOBS = [
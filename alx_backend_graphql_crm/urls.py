@@ -14,12 +14,27 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, export_view, health, resolver_cache_stats, resolver_timings
+from .schema import async_schema
+
+sync_graphql = csrf_exempt(CRMGraphQLView.as_view(graphiql=True))
+async_graphql = csrf_exempt(AsyncCRMGraphQLView.as_view(graphiql=True, schema=async_schema))
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    # The async view under ASGI (settings.GRAPHQL_VIEW), the sync one under WSGI
+    path("graphql/", async_graphql if settings.GRAPHQL_VIEW == 'async' else sync_graphql),
+    # Same API on graphql-core's async executor whatever the server
+    path("graphql/async/", async_graphql),
+    # DB, migration and latency report probed by the heartbeat jobs
+    path("health/", health),
+    # Streaming CSV/NDJSON of customers, products or orders
+    path("export/<str:resource>/", export_view),
+    # Per-process telemetry for staff, signed in through /admin/
+    path("internal/resolver-timings/", resolver_timings),
+    path("internal/resolver-cache/", resolver_cache_stats),
 ]
\ No newline at end of file
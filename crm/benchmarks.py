@@ -0,0 +1,410 @@
+"""Latency, SQL and memory benchmarks of every Query and Mutation field.
+
+``benchmark_operations()`` returns one operation per root field, and one
+per filter (or gte/lte pair) of the ``*Filtered`` fields. Their variables
+are anchored on the data rather than the clock, mostly as the range of
+the ``WINDOW`` newest or largest values, so a generated dataset gives the
+same result sizes on every run.
+
+``run_benchmark()`` times an operation on one of two paths: ``schema``
+executes it against ``alx_backend_graphql_crm.schema.schema`` in process,
+and ``client`` posts it to ``/graphql/`` through the Django test client. It
+then makes one more run to count the SQL statements and record peak
+traced memory. Mutations run in a transaction that is rolled back, so the
+dataset stays as it was.
+
+Two more groups compare implementations of the same work, one mode each:
+
+* ``search_benchmarks()`` runs the substring filters of ``crm.search`` on
+  its ``like`` and ``fts5`` backends,
+* ``view_benchmarks()`` posts a batch of requests to ``/graphql/`` one at a
+  time (``wsgi``) and to ``/graphql/async/`` all in flight at once
+  (``asgi``).
+
+``measure()`` times any of them; ``compare()`` lists the results that
+regressed against a stored baseline.
+"""
+import asyncio
+import time
+import tracemalloc
+from functools import partial
+from types import SimpleNamespace
+
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from graphql import OperationType, get_operation_ast, parse
+
+from .models import Customer, CustomerStats, DailySales, Order, Product
+from .search import icontains
+
+MODES = ('schema', 'client')
+SEARCH_BACKENDS = ('like', 'fts5')
+VIEW_MODES = ('wsgi', 'asgi')
+
+# Modes whose SQL runs on the async view's threads, out of sight of the
+# calling thread's connection; their statements are not counted
+THREADED_MODES = {'asgi'}
+
+# Rows in the range filters' windows
+WINDOW = 100
+
+CUSTOMER_FIELDS = 'id name email'
+PRODUCT_FIELDS = 'id name price stock'
+ORDER_FIELDS = 'id totalAmount orderDate customer { name }'
+
+CUSTOMERS_FILTERED = f"""
+query CustomersFiltered($filter: CustomerFilterInput) {{
+    customersFiltered(filter: $filter) {{ {CUSTOMER_FIELDS} }}
+}}
+"""
+
+PRODUCTS_FILTERED = f"""
+query ProductsFiltered($filter: ProductFilterInput) {{
+    productsFiltered(filter: $filter) {{ {PRODUCT_FIELDS} }}
+}}
+"""
+
+ORDERS_FILTERED = f"""
+query OrdersFiltered($filter: OrderFilterInput) {{
+    ordersFiltered(filter: $filter) {{ {ORDER_FIELDS} }}
+}}
+"""
+
+
+def _window(model, field):
+    """``(low, high)`` of ``field`` over the ``WINDOW`` rows where it is largest"""
+    values = list(model.objects.order_by(f'-{field}').values_list(field, flat=True)[:WINDOW])
+    return (values[-1], values[0]) if values else (None, None)
+
+
+def anchors():
+    """Ids and filter bounds taken from the data being benchmarked"""
+    # The newest rows: "Customer 1" would also match "Customer 10..." and
+    # every later name of that form
+    customer = Customer.objects.order_by('pk').last()
+    product = Product.objects.order_by('pk').last()
+    order = Order.objects.order_by('pk').last()
+    if not (customer and product and order):
+        raise ValueError('Benchmarks need at least one customer, product and order')
+    return {
+        'customer': customer,
+        'product': product,
+        'order': order,
+        'product_ids': list(Product.objects.order_by('-pk').values_list('pk', flat=True)[:3]),
+        'created_at': _window(Customer, 'created_at'),
+        'order_count': _window(CustomerStats, 'order_count'),
+        'lifetime_value': _window(CustomerStats, 'lifetime_value'),
+        'last_order_at': _window(CustomerStats, 'last_order_at'),
+        'price': _window(Product, 'price'),
+        'order_date': _window(Order, 'order_date'),
+        'total_amount': _window(Order, 'total_amount'),
+        'sales_date': _window(DailySales, 'date'),
+    }
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _float(value):
+    # The filter inputs declare their decimal bounds as Float
+    return float(value) if value is not None else None
+
+
+def benchmark_operations(anchor):
+    """Return ``[(name, query, variables)]`` covering every root field"""
+    customer, product, order = anchor['customer'], anchor['product'], anchor['order']
+    operations = [
+        ('allCustomers', f"""
+            query {{ allCustomers(first: 50) {{ edges {{ node {{ {CUSTOMER_FIELDS} orderCount lifetimeValue }} }} }} }}
+        """, {}),
+        ('allProducts', f"""
+            query {{ allProducts(first: 50) {{ edges {{ node {{ {PRODUCT_FIELDS} }} }} }} }}
+        """, {}),
+        ('allOrders', """
+            query {
+                allOrders(first: 50) {
+                    edges { node {
+                        id totalAmount orderDate
+                        customer { name email }
+                        products { edges { node { name price } } }
+                    } }
+                }
+            }
+        """, {}),
+        ('customer', f"""
+            query Customer($id: Int!) {{ customer(id: $id) {{ {CUSTOMER_FIELDS} orderCount lastOrderAt }} }}
+        """, {'id': customer.pk}),
+        ('product', f"""
+            query Product($id: Int!) {{ product(id: $id) {{ {PRODUCT_FIELDS} }} }}
+        """, {'id': product.pk}),
+        ('order', """
+            query Order($id: Int!) {
+                order(id: $id) { id totalAmount customer { name } products { edges { node { name } } } }
+            }
+        """, {'id': order.pk}),
+    ]
+
+    def between(field, anchor_key, convert=lambda value: value):
+        low, high = anchor[anchor_key]
+        return {f'{field}Gte': convert(low), f'{field}Lte': convert(high)}
+
+    customer_filters = [
+        ('nameIcontains', {'nameIcontains': customer.name}),
+        ('emailIcontains', {'emailIcontains': customer.email}),
+        ('createdAtGte/Lte', between('createdAt', 'created_at', _iso)),
+        ('phonePattern', {'phonePattern': customer.phone[:-2]}),
+        ('orderCountGte/Lte', between('orderCount', 'order_count')),
+        ('lifetimeValueGte/Lte', between('lifetimeValue', 'lifetime_value', _float)),
+        ('lastOrderAtGte/Lte', between('lastOrderAt', 'last_order_at', _iso)),
+    ]
+    product_filters = [
+        ('nameIcontains', {'nameIcontains': product.name}),
+        ('priceGte/Lte', between('price', 'price', _float)),
+        ('stockGte/Lte', {'stockGte': product.stock, 'stockLte': product.stock}),
+        ('lowStock', {'lowStock': True}),
+    ]
+    order_filters = [
+        ('totalAmountGte/Lte', between('totalAmount', 'total_amount', _float)),
+        ('orderDateGte/Lte', between('orderDate', 'order_date', _iso)),
+        ('customerName', {'customerName': customer.name}),
+        ('productName', {'productName': product.name}),
+        ('productId', {'productId': product.pk}),
+    ]
+    for field, query, filters in (
+        ('customersFiltered', CUSTOMERS_FILTERED, customer_filters),
+        ('productsFiltered', PRODUCTS_FILTERED, product_filters),
+        ('ordersFiltered', ORDERS_FILTERED, order_filters),
+    ):
+        operations.extend((f'{field}.{name}', query, {'filter': variables}) for name, variables in filters)
+
+    sales_from, sales_to = map(_iso, anchor['sales_date'])
+    operations += [
+        ('salesByDay', """
+            query SalesByDay($from: Date, $to: Date) { salesByDay(from: $from, to: $to) { date orderCount revenue units } }
+        """, {'from': sales_from, 'to': sales_to}),
+        ('topProducts', """
+            query TopProducts($from: Date, $to: Date) {
+                topProducts(n: 10, from: $from, to: $to) { product { id name } orderCount revenue units }
+            }
+        """, {'from': sales_from, 'to': sales_to}),
+        ('topProducts.allTime', """
+            query { topProducts(n: 10) { product { id name } orderCount revenue units } }
+        """, {}),
+        ('topCustomers', """
+            query TopCustomers($from: Date, $to: Date) {
+                topCustomers(n: 10, from: $from, to: $to) { customer { id name } orderCount revenue units }
+            }
+        """, {'from': sales_from, 'to': sales_to}),
+        ('topCustomers.allTime', """
+            query { topCustomers(n: 10) { customer { id name } orderCount revenue units } }
+        """, {}),
+        ('hello', 'query { hello }', {}),
+        ('createCustomer', """
+            mutation CreateCustomer($input: CustomerInput!) {
+                createCustomer(input: $input) { customer { id } message }
+            }
+        """, {'input': {'name': 'Bench Customer', 'email': 'bench-customer@example.com', 'phone': '+15550000000'}}),
+        ('bulkCreateCustomers', """
+            mutation BulkCreateCustomers($input: [CustomerInput]!) {
+                bulkCreateCustomers(input: $input) { customers { id } errors }
+            }
+        """, {'input': [
+            {'name': f'Bench Customer {i}', 'email': f'bench-{i}@example.com', 'phone': '+15550000000'}
+            for i in range(100)
+        ]}),
+        ('createProduct', """
+            mutation CreateProduct($input: ProductInput!) {
+                createProduct(input: $input) { product { id } message }
+            }
+        """, {'input': {'name': 'Bench Product', 'price': '9.99', 'stock': 5}}),
+        ('createOrder', """
+            mutation CreateOrder($input: OrderInput!) {
+                createOrder(input: $input) { order { id totalAmount } message }
+            }
+        """, {'input': {'customerId': customer.pk, 'productIds': anchor['product_ids']}}),
+        ('bulkCreateOrders', """
+            mutation BulkCreateOrders($input: [OrderInput!]!) {
+                bulkCreateOrders(input: $input) { orders { id } errors }
+            }
+        """, {'input': [{'customerId': customer.pk, 'productIds': anchor['product_ids']}] * 50}),
+        ('updateLowStockProducts', """
+            mutation { updateLowStockProducts(returnProducts: false) { success message } }
+        """, {}),
+    ]
+    return operations
+
+
+def _percentile(durations, q):
+    return durations[min(len(durations) - 1, int(len(durations) * q))]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _executor(mode, query):
+    """A callable running ``query`` once on ``mode``, raising on GraphQL errors"""
+    if mode == 'schema':
+        from alx_backend_graphql_crm.schema import schema
+
+        def run(variables):
+            result = schema.execute(query, variable_values=variables, context_value=SimpleNamespace())
+            if result.errors:
+                raise ValueError(f"GraphQL errors: {result.errors}")
+    else:
+        client = Client()
+
+        def run(variables):
+            response = client.post('/graphql/', {'query': query, 'variables': variables}, content_type='application/json')
+            errors = response.json().get('errors')
+            if response.status_code != 200 or errors:
+                raise ValueError(f"HTTP {response.status_code}: {errors}")
+
+    operation = get_operation_ast(parse(query))
+    if operation.operation != OperationType.MUTATION:
+        return run
+
+    def rolled_back(variables):
+        with transaction.atomic():
+            run(variables)
+            transaction.set_rollback(True)
+    return rolled_back
+
+
+def _first_page(queryset):
+    return list(queryset.values_list('pk', flat=True)[:20])
+
+
+def search_benchmarks(anchor):
+    """Return ``[(name, {backend: run})]`` for the substring filters of ``crm.search``"""
+    customer, product = anchor['customer'], anchor['product']
+    # Tails of the newest names, as a user would type them
+    searches = [
+        (Customer, 'name', customer.name[-8:]),
+        (Customer, 'email', customer.email.split('@')[0][-4:] + '@'),
+        (Product, 'name', product.name[-7:]),
+        (Order, 'customer__name', customer.name[-8:]),
+    ]
+    benchmarks = []
+    for model, field_path, term in searches:
+        runs = {}
+        for backend in SEARCH_BACKENDS:
+            queryset = icontains(model.objects.all(), field_path, term, backend=backend)
+            runs[backend] = partial(_first_page, queryset)
+        benchmarks.append((f'search.{model.__name__}.{field_path}', runs))
+    return benchmarks
+
+
+VIEW_QUERY = """
+query {
+    allOrders(first: 50) {
+        edges { node { id totalAmount customer { name email } products { edges { node { name price } } } } }
+    }
+}
+"""
+
+
+def _check_response(response):
+    errors = response.json().get('errors')
+    if response.status_code != 200 or errors:
+        raise ValueError(f"HTTP {response.status_code}: {errors}")
+
+
+def view_benchmarks(concurrency=16):
+    """Return ``[(name, {mode: run})]`` posting ``concurrency`` requests per run"""
+    payload = {'query': VIEW_QUERY}
+
+    def wsgi():
+        client = Client()
+        for _ in range(concurrency):
+            _check_response(client.post('/graphql/', payload, content_type='application/json'))
+
+    async def in_flight():
+        client = AsyncClient()
+        responses = await asyncio.gather(*(
+            client.post('/graphql/async/', payload, content_type='application/json')
+            for _ in range(concurrency)
+        ))
+        for response in responses:
+            _check_response(response)
+
+    return [(f'views.allOrders.x{concurrency}', {'wsgi': wsgi, 'asgi': lambda: asyncio.run(in_flight())})]
+
+
+def graphql_benchmarks(operations):
+    """Return ``[(name, {mode: run})]`` for ``benchmark_operations()``"""
+    return [
+        (name, {mode: partial(_executor(mode, query), variables) for mode in MODES})
+        for name, query, variables in operations
+    ]
+
+
+def measure(run, iterations=20, warmup=2, count_queries=True):
+    """Time ``iterations`` calls of ``run``; return the result row"""
+    for _ in range(warmup):
+        run()
+
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+
+    # Counted and traced apart from the timings, which both would slow down
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'p50_ms': _ms(_percentile(durations, 0.5)),
+        'p95_ms': _ms(_percentile(durations, 0.95)),
+        'p99_ms': _ms(_percentile(durations, 0.99)),
+        'max_ms': _ms(durations[-1]),
+        'queries': len(queries) if count_queries else None,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmark(mode, query, variables, iterations=20, warmup=2):
+    """Time ``iterations`` runs of ``query`` on ``mode``; return the result row"""
+    return measure(partial(_executor(mode, query), variables), iterations, warmup)
+
+
+def dataset_counts():
+    return {model._meta.db_table: model.objects.count() for model in (Customer, Product, Order)}
+
+
+def compare(results, baseline, tolerance=0.5, min_delta_ms=2.0, min_delta_kb=64):
+    """Return a line per regression of ``results`` against ``baseline``.
+
+    More SQL statements than the baseline always count, where both counted
+    them. Latency (p50) and peak memory count when over ``tolerance`` and an
+    absolute noise floor. Benchmarks missing from either side are skipped.
+    """
+    regressions = []
+    for name, modes in results.items():
+        for mode, result in modes.items():
+            base = baseline.get(name, {}).get(mode)
+            if base is None:
+                continue
+            label = f"{name} [{mode}]"
+            if None not in (result['queries'], base['queries']) and result['queries'] > base['queries']:
+                regressions.append(f"{label}: {base['queries']} -> {result['queries']} SQL queries")
+            if (
+                result['p50_ms'] > base['p50_ms'] * (1 + tolerance)
+                and result['p50_ms'] - base['p50_ms'] > min_delta_ms
+            ):
+                regressions.append(f"{label}: p50 {base['p50_ms']} -> {result['p50_ms']} ms")
+            if (
+                result['peak_kb'] > base['peak_kb'] * (1 + tolerance)
+                and result['peak_kb'] - base['peak_kb'] > min_delta_kb
+            ):
+                regressions.append(f"{label}: peak memory {base['peak_kb']} -> {result['peak_kb']} KiB")
+    return regressions
@@ -0,0 +1,190 @@
+"""Set-based write paths for the bulk mutations.
+
+Rows are validated in memory with the model's own field validators, checked
+for duplicates with one ``IN`` query per chunk and inserted with chunked
+``bulk_create`` inside a single transaction, keeping the per-row error
+messages the mutations have always returned.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F
+
+from .cache import invalidate_instances, invalidate_lists
+from .models import Customer, Product, Order, OrderItem
+from .orders import OrderError, parse_order_lines, quantity_expression, set_order_totals
+from .sales import record_sales
+from .stats import record_orders
+
+# Rows per INSERT / IN (...) statement; keeps SQLite under its variable limit
+BULK_BATCH_SIZE = 500
+
+
+def chunked(items, size=BULK_BATCH_SIZE):
+    """Yield successive lists of at most ``size`` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_emails(emails):
+    """Return the subset of ``emails`` already stored, one query per chunk"""
+    found = set()
+    for chunk in chunked(list(emails)):
+        found.update(Customer.objects.filter(email__in=chunk).values_list('email', flat=True))
+    return found
+
+
+def clean_product(price, stock):
+    """Return ``(price, stock)`` as ``createProduct`` accepts them.
+
+    Raises ``ValueError`` with the mutation's message otherwise.
+    """
+    try:
+        price = Decimal(price)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError("Invalid price format")
+    if not price.is_finite():
+        raise ValueError("Invalid price format")
+    if price <= 0:
+        raise ValueError("Price must be positive")
+    if stock < 0:
+        raise ValueError("Stock cannot be negative")
+    return price, stock
+
+
+def insert_order_items(items):
+    """Insert ``(order_id, product_id, quantity, unit_price)`` rows as ``OrderItem``s.
+
+    Goes straight to ``executemany``; building a model instance per line
+    costs more than the insert itself at import volumes.
+    """
+    meta = OrderItem._meta
+    columns = [meta.get_field(name).column for name in ('order', 'product', 'quantity', 'unit_price')]
+    qn = connection.ops.quote_name
+    sql = (
+        f"INSERT INTO {qn(meta.db_table)} ({', '.join(qn(column) for column in columns)}) "
+        f"VALUES (%s, %s, %s, %s)"
+    )
+    adapt = connection.ops.adapt_decimalfield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (order_id, product_id, quantity, adapt(unit_price, 10, 2))
+            for order_id, product_id, quantity, unit_price in items
+        ])
+
+
+def bulk_create_customers(rows):
+    """Validate and insert customer ``rows``; return ``(customers, errors)``.
+
+    Each row is a mapping with ``name``, ``email`` and an optional ``phone``.
+    """
+    errors = []
+    candidates = []
+    for i, row in enumerate(rows):
+        customer = Customer(name=row.get('name'), email=row.get('email'), phone=row.get('phone') or '')
+        try:
+            # Unique checks would cost a query per row; emails are checked below
+            customer.full_clean(validate_unique=False)
+        except ValidationError as e:
+            errors.append((i, f"Customer {i+1}: {str(e)}"))
+            continue
+        candidates.append((i, customer))
+
+    taken = existing_emails(customer.email for _, customer in candidates)
+    customers = []
+    for i, customer in candidates:
+        if customer.email in taken:
+            errors.append((i, f"Customer {i+1}: Email {customer.email} already exists"))
+            continue
+        taken.add(customer.email)
+        customers.append(customer)
+
+    with transaction.atomic():
+        Customer.objects.bulk_create(customers, batch_size=BULK_BATCH_SIZE)
+        invalidate_lists(Customer)
+
+    return customers, [message for _, message in sorted(errors)]
+
+
+def bulk_create_orders(rows):
+    """Validate and insert order ``rows``; return ``(orders, errors)``.
+
+    Each row is a mapping with ``customer_id`` and ``product_ids`` and/or
+    ``items`` and is placed with the same rules as ``crm.orders.place_order``:
+    one unit per listed product id plus each item's quantity, at the
+    product's current price, stock reserved in row order. Rows that fail are
+    reported and skipped without aborting the rest of the batch.
+    """
+    errors = []
+    parsed = []
+    for i, row in enumerate(rows):
+        try:
+            try:
+                customer_id = int(row.get('customer_id'))
+            except (TypeError, ValueError):
+                raise OrderError("Invalid customer ID")
+            quantities = parse_order_lines(row.get('product_ids'), row.get('items'))
+            if not quantities:
+                raise OrderError("At least one product must be provided")
+            parsed.append((i, customer_id, quantities))
+        except OrderError as e:
+            errors.append((i, f"Order {i+1}: {e}"))
+
+    orders = []
+    with transaction.atomic():
+        customer_ids = set()
+        for chunk in chunked(list({customer_id for _, customer_id, _ in parsed})):
+            customer_ids.update(Customer.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+        products = {}
+        for chunk in chunked(list({pk for *_, quantities in parsed for pk in quantities})):
+            products.update(Product.objects.select_for_update().in_bulk(chunk))
+
+        stock = {pk: product.stock for pk, product in products.items()}
+        reserved = {}
+        lines = []
+        for i, customer_id, quantities in parsed:
+            try:
+                if customer_id not in customer_ids:
+                    raise OrderError("Invalid customer ID")
+                for pk, quantity in quantities.items():
+                    if pk not in products:
+                        raise OrderError(f"Invalid product ID: {pk}")
+                    if stock[pk] < quantity:
+                        raise OrderError(f"Insufficient stock for product {pk}")
+            except OrderError as e:
+                errors.append((i, f"Order {i+1}: {e}"))
+                continue
+            for pk, quantity in quantities.items():
+                stock[pk] -= quantity
+                reserved[pk] = reserved.get(pk, 0) + quantity
+            # Totalled from its items once they are inserted
+            orders.append(Order(customer_id=customer_id, total_amount=Decimal('0.00')))
+            lines.append(quantities)
+
+        for chunk in chunked(list(reserved)):
+            quantities = {pk: reserved[pk] for pk in chunk}
+            required = quantity_expression(quantities)
+            updated = (
+                Product.objects.filter(pk__in=chunk, stock__gte=required)
+                .update(stock=F('stock') - required)
+            )
+            if updated != len(chunk):
+                raise OrderError("Insufficient stock")
+
+        Order.objects.bulk_create(orders, batch_size=BULK_BATCH_SIZE)
+        items = [
+            (order, pk, quantity, products[pk].price)
+            for order, quantities in zip(orders, lines) for pk, quantity in quantities.items()
+        ]
+        insert_order_items((order.pk, pk, quantity, price) for order, pk, quantity, price in items)
+        set_order_totals(orders)
+
+        # bulk_create and raw inserts send no model signals
+        record_orders(orders)
+        record_sales(orders, items)
+        invalidate_lists(Order)
+        invalidate_instances(Customer, {order.customer_id for order in orders})
+        invalidate_instances(Product, reserved)
+
+    return orders, [message for _, message in sorted(errors)]
@@ -0,0 +1,237 @@
+"""Opt-in response cache for ``crm.schema.Query`` resolvers.
+
+Entries live in a Django cache (``CRM_RESOLVER_CACHE['CACHE_ALIAS']``), so the
+backend, TTL and eviction come from ``CACHES``: locmem gives an LRU bounded
+by ``MAX_ENTRIES``, the file backend shares entries between processes.
+
+An entry is keyed by the field, its arguments, the operation's variables and
+the selection set, and stores the resolved model instances (with the
+planner's joins and prefetches) plus the versions of the tags it depends on:
+
+* ``crm.customer:5`` for every instance in the result graph, or
+  ``crm.customer:many`` once a model has more than ``MAX_INSTANCE_TAGS`` rows
+  in it (evicted by any write to that model, bounding tags per entry),
+* ``crm.customer:any`` for every model that appears in it,
+* ``crm.customer`` for list fields, whose membership any write can change.
+
+Writes bump tag versions (``invalidate_*``, wired to model signals in
+``crm.signals``), so only the entries that depended on a written row miss.
+"""
+import functools
+import hashlib
+import json
+import threading
+import uuid
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import print_ast
+
+from .loaders import get_loaders
+
+DEFAULTS = {
+    'ENABLED': False,
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 60,
+    'MAX_INSTANCE_TAGS': 100,
+}
+
+
+def instance_tag(model, pk):
+    return f'{model._meta.label_lower}:{pk}'
+
+
+def any_tag(model):
+    return f'{model._meta.label_lower}:any'
+
+
+def many_tag(model):
+    return f'{model._meta.label_lower}:many'
+
+
+def list_tag(model):
+    return model._meta.label_lower
+
+
+def iter_instances(value, seen=None):
+    """Yield every model instance reachable through loaded relations of ``value``"""
+    seen = set() if seen is None else seen
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            yield from iter_instances(item, seen)
+        return
+    if value is None or not hasattr(value, '_state') or id(value) in seen:
+        return
+    seen.add(id(value))
+    yield value
+    for related in value._state.fields_cache.values():
+        yield from iter_instances(related, seen)
+    for related in getattr(value, '_prefetched_objects_cache', {}).values():
+        yield from iter_instances(list(related), seen)
+
+
+class ResolverCache:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, 'CRM_RESOLVER_CACHE', {})}
+
+    @property
+    def enabled(self):
+        return self.config['ENABLED']
+
+    @property
+    def backend(self):
+        return caches[self.config['CACHE_ALIAS']]
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def make_key(self, info, args):
+        fragments = sorted(print_ast(fragment) for fragment in info.fragments.values())
+        payload = json.dumps(
+            [
+                info.parent_type.name,
+                info.field_name,
+                args,
+                info.variable_values,
+                [print_ast(node) for node in info.field_nodes],
+                fragments,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return 'crm-resolver:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def tags_for(self, value, model):
+        tags = set()
+        if value is None or isinstance(value, (list, tuple)):
+            tags.add(list_tag(model))
+        by_model = {}
+        for instance in iter_instances(value):
+            by_model.setdefault(type(instance), set()).add(instance.pk)
+        for instance_model, pks in by_model.items():
+            tags.add(any_tag(instance_model))
+            if len(pks) > self.config['MAX_INSTANCE_TAGS']:
+                tags.add(many_tag(instance_model))
+            else:
+                tags.update(instance_tag(instance_model, pk) for pk in pks)
+        return tags
+
+    def _tag_versions(self, tags):
+        """Current versions of ``tags``, creating the missing ones.
+
+        A tag that is missing (never written or evicted) always gets a fresh
+        version, so an entry can never validate against an evicted tag.
+        """
+        backend = self.backend
+        versions = backend.get_many(['crm-tag:' + tag for tag in tags])
+        for tag in tags:
+            key = 'crm-tag:' + tag
+            if key not in versions:
+                backend.add(key, uuid.uuid4().hex, None)
+                versions[key] = backend.get(key)
+        return versions
+
+    def get(self, key):
+        """Return ``(found, value)``; stale entries count as misses"""
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, versions = entry
+            if self.backend.get_many(list(versions)) == versions:
+                self._count(True)
+                return True, value
+        self._count(False)
+        return False, None
+
+    def set(self, key, value, tags):
+        versions = self._tag_versions(tags)
+        self.backend.set(key, (value, versions), self.config['TIMEOUT'])
+
+    def invalidate(self, tags):
+        """Bump ``tags`` once the current transaction commits"""
+        if not self.enabled or not tags:
+            return
+        keys = {'crm-tag:' + tag: uuid.uuid4().hex for tag in tags}
+        transaction.on_commit(lambda: self.backend.set_many(keys, None))
+
+    def stats(self):
+        return {'enabled': self.enabled, 'hits': self.hits, 'misses': self.misses}
+
+
+resolver_cache = ResolverCache()
+
+
+def invalidate_instances(model, pks, membership=True):
+    """Evict entries containing the ``model`` rows ``pks``.
+
+    With ``membership`` the write may also change which rows a ``model``
+    list returns, so list entries are evicted as well.
+    """
+    tags = [instance_tag(model, pk) for pk in pks] + [many_tag(model)]
+    if membership:
+        tags.append(list_tag(model))
+    resolver_cache.invalidate(tags)
+
+
+def invalidate_lists(model):
+    """Evict the ``model`` list entries, whose membership new rows change"""
+    resolver_cache.invalidate([list_tag(model)])
+
+
+def invalidate_model(model):
+    """Evict every entry that contains or lists ``model`` rows"""
+    resolver_cache.invalidate([any_tag(model), list_tag(model)])
+
+
+def cached_resolver(model):
+    """Cache a ``Query`` resolver returning ``model`` instances when enabled.
+
+    Coroutine resolvers get a coroutine wrapper; cache backend calls then
+    run in a thread, as backends may block on I/O.
+    """
+    def decorator(resolve):
+        if iscoroutinefunction(resolve):
+            @functools.wraps(resolve)
+            async def async_wrapper(root, info, **args):
+                if not resolver_cache.enabled:
+                    return await resolve(root, info, **args)
+
+                key = resolver_cache.make_key(info, args)
+                found, value = await sync_to_async(resolver_cache.get)(key)
+                if found:
+                    get_loaders(info.context).prime(value if isinstance(value, list) else [value])
+                    return value
+
+                value = await resolve(root, info, **args)
+                await sync_to_async(resolver_cache.set)(key, value, resolver_cache.tags_for(value, model))
+                return value
+            return async_wrapper
+
+        @functools.wraps(resolve)
+        def wrapper(root, info, **args):
+            if not resolver_cache.enabled:
+                return resolve(root, info, **args)
+
+            key = resolver_cache.make_key(info, args)
+            found, value = resolver_cache.get(key)
+            if found:
+                get_loaders(info.context).prime(value if isinstance(value, list) else [value])
+                return value
+
+            value = resolve(root, info, **args)
+            resolver_cache.set(key, value, resolver_cache.tags_for(value, model))
+            return value
+        return wrapper
+    return decorator
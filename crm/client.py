@@ -0,0 +1,252 @@
+"""Shared GraphQL client for the CRM's own jobs.
+
+``get_client()`` returns one connected client per endpoint and process, so
+jobs stop paying for a new TCP connection and a full introspection query
+on every run:
+
+* the HTTP transport keeps its ``requests`` sessions (and their keep-alive
+  connection pools) open between calls, with the timeout and retry policy
+  of ``CRM_GRAPHQL_CLIENT``. Only queries are retried: a mutation whose
+  response was lost may have committed, and posting it again would apply
+  it twice,
+* documents are validated against a schema snapshot stored in
+  ``SCHEMA_SNAPSHOT``. The view sends the hash of its schema in the
+  ``X-GraphQL-Schema-Hash`` header of every response; the snapshot is
+  introspected again only when that hash changes,
+* the operations of ``crm.operations`` are sent as their persisted query
+  hash alone. When the server does not know the hash
+  (``PersistedQueryNotFound``), the text is sent once with it and the
+  server caches it,
+* with ``local=True`` (or ``LOCAL`` in the settings) operations run against
+  ``alx_backend_graphql_crm.schema.schema`` in process, with no network.
+"""
+import json
+import threading
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from gql import Client, gql
+from gql.transport import Transport
+from gql.transport.exceptions import TransportQueryError
+from gql.transport.requests import RequestsHTTPTransport
+from graphql import GraphQLError, OperationType, execute, get_operation_ast
+
+from .documents import SCHEMA_HASH_HEADER, query_hash
+from .operations import OPERATIONS
+
+DEFAULTS = {
+    'URL': 'http://localhost:8000/graphql/',
+    'LOCAL': False,
+    'TIMEOUT': 10,
+    'RETRIES': 3,
+    # Retries wait RETRY_BACKOFF * 2 ** (retry - 1) seconds
+    'RETRY_BACKOFF': 0.5,
+    'SCHEMA_SNAPSHOT': None,
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Operations sent by their hash, as ``register_persisted_queries`` publishes them
+PERSISTED_OPERATIONS = frozenset(OPERATIONS)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CRM_GRAPHQL_CLIENT', {})}
+
+
+def is_mutation(document, operation_name=None):
+    operation = get_operation_ast(document, operation_name)
+    return operation is not None and operation.operation == OperationType.MUTATION
+
+
+class LocalSchemaTransport(Transport):
+    """gql transport executing operations against the project schema in process.
+
+    Mutations run in a transaction that is rolled back when they report
+    errors, as the view does.
+    """
+
+    def __init__(self, schema=None):
+        if schema is None:
+            from alx_backend_graphql_crm.schema import schema
+        self.schema = schema
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def execute(self, document, variable_values=None, operation_name=None, **kwargs):
+        mutation = is_mutation(document, operation_name)
+        with transaction.atomic() if mutation else nullcontext():
+            result = execute(
+                self.schema.graphql_schema,
+                document,
+                variable_values=variable_values,
+                operation_name=operation_name,
+                context_value=SimpleNamespace(),
+            )
+            if mutation and result.errors:
+                transaction.set_rollback(True)
+        return result
+
+
+class QueryRetryingTransport(RequestsHTTPTransport):
+    """HTTP transport that retries queries but posts mutations exactly once.
+
+    Mutations go through a second session, sharing nothing but the
+    settings, whose adapters make no retries.
+    """
+
+    def connect(self):
+        super().connect()
+        self.query_session = self.session
+        self.mutation_session = requests.Session()
+
+    def execute(self, document, variable_values=None, operation_name=None, **kwargs):
+        self.session = self.mutation_session if is_mutation(document, operation_name) else self.query_session
+        try:
+            return super().execute(document, variable_values, operation_name, **kwargs)
+        finally:
+            self.session = self.query_session
+
+    def close(self):
+        if self.session:
+            self.mutation_session.close()
+        super().close()
+
+
+class SchemaSnapshot:
+    """Introspection result of an endpoint cached in a JSON file"""
+
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+
+    def load(self):
+        """Return ``(hash, introspection)``, or ``(None, None)`` without a snapshot"""
+        if not self.path:
+            return None, None
+        try:
+            with open(self.path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (OSError, ValueError):
+            return None, None
+        if snapshot.get('url') != self.url:
+            return None, None
+        return snapshot.get('hash'), snapshot.get('introspection')
+
+    def save(self, schema_hash, introspection):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as snapshot_file:
+                json.dump({'url': self.url, 'hash': schema_hash, 'introspection': introspection}, snapshot_file)
+        except OSError:
+            # A read-only checkout only costs an introspection per process
+            pass
+
+
+class GraphQLClient:
+    """A gql session kept open between operations"""
+
+    def __init__(self, url=None, local=None):
+        config = get_config()
+        self.url = url or config['URL']
+        self.local = config['LOCAL'] if local is None else local
+        self._lock = threading.Lock()
+
+        if self.local:
+            transport = LocalSchemaTransport()
+            self.snapshot = None
+            self.schema_hash = None
+            self.client = Client(transport=transport, schema=transport.schema.graphql_schema)
+        else:
+            transport = QueryRetryingTransport(
+                url=self.url,
+                timeout=config['TIMEOUT'],
+                retries=config['RETRIES'],
+                retry_backoff_factor=config['RETRY_BACKOFF'],
+                retry_status_forcelist=RETRY_STATUSES,
+            )
+            self.snapshot = SchemaSnapshot(config['SCHEMA_SNAPSHOT'], self.url)
+            self.schema_hash, introspection = self.snapshot.load()
+            self.client = Client(transport=transport, introspection=introspection)
+        self.session = self.client.connect_sync()
+
+    def execute(self, query, variable_values=None, operation_name=None):
+        """Run ``query`` (text or a parsed document) and return its data"""
+        document = gql(query) if isinstance(query, str) else query
+        with self._lock:
+            try:
+                result = self._execute(document, variable_values, operation_name)
+            except GraphQLError:
+                # Rejected by local validation; the snapshot may be stale
+                if self.local or self.client.schema is None:
+                    raise
+                self.refresh_schema()
+                result = self._execute(document, variable_values, operation_name)
+            if not self.local:
+                served = self.client.transport.response_headers.get(SCHEMA_HASH_HEADER)
+                if served and served != self.schema_hash:
+                    self.refresh_schema()
+            return result
+
+    def _execute(self, document, variable_values, operation_name):
+        text = document.loc.source.body if document.loc else None
+        if self.local or text not in PERSISTED_OPERATIONS:
+            return self.session.execute(document, variable_values=variable_values, operation_name=operation_name)
+
+        payload = {'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(text)}}}
+        if operation_name:
+            payload['operationName'] = operation_name
+        if variable_values:
+            payload['variables'] = variable_values
+        try:
+            return self.session.execute(
+                document, variable_values=variable_values, operation_name=operation_name,
+                extra_args={'json': payload},
+            )
+        except TransportQueryError as e:
+            if not e.errors or e.errors[0].get('message') != 'PersistedQueryNotFound':
+                raise
+        # Unregistered and not cached yet: the text with its hash teaches the server
+        return self.session.execute(
+            document, variable_values=variable_values, operation_name=operation_name,
+            extra_args={'json': {**payload, 'query': text}},
+        )
+
+    def refresh_schema(self):
+        """Introspect the endpoint and store the result as the snapshot"""
+        self.session.fetch_schema()
+        self.schema_hash = self.client.transport.response_headers.get(SCHEMA_HASH_HEADER)
+        self.snapshot.save(self.schema_hash, self.client.introspection)
+
+    def close(self):
+        self.client.close_sync()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url=None, local=None):
+    """Return the process-wide client for ``url`` (``CRM_GRAPHQL_CLIENT['URL']``)"""
+    config = get_config()
+    key = (url or config['URL'], config['LOCAL'] if local is None else local)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = GraphQLClient(*key)
+        return client
+
+
+def close_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
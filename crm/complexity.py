@@ -0,0 +1,170 @@
+"""Cost and depth limits for GraphQL operations, checked before execution.
+
+The cost of an operation estimates the rows it can make the server load:
+every object field costs ``FIELD_COSTS.get('Type.field', 1)`` per parent
+row and leaf fields are free. A connection multiplies the fields under its
+``edges`` by ``first``/``last`` (or ``RELAY_CONNECTION_MAX_LIMIT``, the page
+size it falls back to), a plain list such as ``customersFiltered`` by
+``LIST_SIZE``. Depth counts the nested fields on the longest path, ignoring
+the ``edges``/``node``/``pageInfo`` plumbing of connections.
+
+Page sizes can come from variables, so unlike validation the result cannot
+be cached with the document; the view runs ``analyze`` on every request,
+after validation and before any resolver.
+"""
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    IntValueNode,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+    is_list_type,
+    is_object_type,
+)
+from graphql.utilities import type_from_ast
+
+DEFAULTS = {
+    'MAX_DEPTH': 5,
+    'MAX_COST': 10000,
+    'LIST_SIZE': 100,
+    'FIELD_COSTS': {},
+}
+
+CONNECTION_FIELDS = {'edges', 'node', 'pageInfo'}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'GRAPHQL_QUERY_COST', {})}
+
+
+class QueryCostError(GraphQLError):
+    pass
+
+
+def is_connection(graphql_type):
+    return is_object_type(graphql_type) and {'edges', 'pageInfo'} <= set(graphql_type.fields)
+
+
+class CostAnalyzer:
+    """Computes ``(cost, depth)`` of one operation"""
+
+    def __init__(self, schema, fragments, variables, config):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables or {}
+        self.config = config
+
+    def argument(self, field_node, name):
+        """Literal or variable value of an integer argument, or None"""
+        for argument in field_node.arguments:
+            if argument.name.value != name:
+                continue
+            value = argument.value
+            if isinstance(value, IntValueNode):
+                return int(value.value)
+            if isinstance(value, VariableNode):
+                value = self.variables.get(value.name.value)
+                return value if isinstance(value, int) else None
+        return None
+
+    def iter_fields(self, parent_type, selection_set):
+        """Yield ``(field_node, parent_type)``, expanding fragments"""
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield selection, parent_type
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+                condition, selection_set = fragment.type_condition, fragment.selection_set
+            elif isinstance(selection, InlineFragmentNode):
+                condition, selection_set = selection.type_condition, selection.selection_set
+            else:
+                continue
+            fragment_type = type_from_ast(self.schema, condition) if condition else parent_type
+            yield from self.iter_fields(fragment_type or parent_type, selection_set)
+
+    def page_size(self, field_node):
+        size = self.argument(field_node, 'first')
+        if size is None:
+            size = self.argument(field_node, 'last')
+        if size is None:
+            size = graphene_settings.RELAY_CONNECTION_MAX_LIMIT or self.config['LIST_SIZE']
+        return size
+
+    def measure(self, parent_type, selection_set, multiplier, edges_multiplier=None):
+        """Return ``(cost, depth)`` of ``selection_set`` read ``multiplier`` times"""
+        cost = 0
+        depth = 0
+        for field_node, field_parent in self.iter_fields(parent_type, selection_set):
+            name = field_node.name.value
+            if name.startswith('__') or not hasattr(field_parent, 'fields'):
+                continue
+            field = field_parent.fields.get(name)
+            if field is None:
+                continue
+            named_type = get_named_type(field.type)
+            if is_leaf_type(named_type) or field_node.selection_set is None:
+                depth = max(depth, 1)
+                continue
+
+            plumbing = name in CONNECTION_FIELDS
+            field_multiplier = multiplier
+            if name == 'edges' and edges_multiplier is not None:
+                field_multiplier = edges_multiplier
+            if not plumbing:
+                cost += multiplier * self.config['FIELD_COSTS'].get(f'{field_parent.name}.{name}', 1)
+
+            child_edges = None
+            if is_connection(named_type):
+                child_edges = field_multiplier * self.page_size(field_node)
+            elif is_list_type(get_nullable_type(field.type)) and name != 'edges':
+                field_multiplier *= self.config['LIST_SIZE']
+
+            child_cost, child_depth = self.measure(
+                named_type, field_node.selection_set, field_multiplier, child_edges
+            )
+            cost += child_cost
+            depth = max(depth, child_depth + (0 if plumbing else 1))
+        return cost, depth
+
+
+def analyze(schema, document, operation, variables=None):
+    """Return the ``extensions['cost']`` report for ``operation``.
+
+    Raises ``QueryCostError`` when the operation is deeper or costlier than
+    ``GRAPHQL_QUERY_COST`` allows; the report is on ``error.extensions``.
+    """
+    config = get_config()
+    root_type = schema.get_root_type(operation.operation)
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == 'fragment_definition'
+    }
+    analyzer = CostAnalyzer(schema, fragments, variables, config)
+    cost, depth = analyzer.measure(root_type, operation.selection_set, 1)
+    report = {
+        'requestedCost': cost,
+        'maximumCost': config['MAX_COST'],
+        'depth': depth,
+        'maximumDepth': config['MAX_DEPTH'],
+    }
+    if config['MAX_DEPTH'] is not None and depth > config['MAX_DEPTH']:
+        raise QueryCostError(
+            f"Query depth {depth} exceeds the maximum depth of {config['MAX_DEPTH']}",
+            extensions={'cost': report},
+        )
+    if config['MAX_COST'] is not None and cost > config['MAX_COST']:
+        raise QueryCostError(
+            f"Query cost {cost} exceeds the maximum cost of {config['MAX_COST']}",
+            extensions={'cost': report},
+        )
+    return report
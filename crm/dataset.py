@@ -0,0 +1,325 @@
+"""Reproducible synthetic CRM data at benchmark scale.
+
+``generate_dataset()`` fills the customer, product, order and order item
+tables from a seeded ``random.Random`` per table, so the same seed and
+``end`` date give the same rows on an empty database, and changing the
+order count leaves the customers and products as they were.
+
+Rows are written with multi-row ``INSERT`` statements of
+``ROWS_PER_INSERT`` rows, committed every ``ROWS_PER_TRANSACTION`` rows,
+under ``load_pragmas()``, without foreign key checks and with the
+secondary indexes dropped by ``deferred_indexes()``: building an index
+once over the loaded table is far cheaper than maintaining it through
+millions of random inserts. Primary keys are assigned here, starting
+after the current maximum, so orders and items never need the inserted
+ids read back. ``CustomerStats`` is rebuilt and the tables analyzed at the
+end, and the sales rollups are rebuilt once the indexes are back.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .cache import invalidate_model
+from .models import Customer, CustomerStats, Order, OrderItem, Product
+from .sales import rebuild_sales
+from .search import SEARCH_TABLES
+from .stats import rebuild_customer_stats
+
+FIRST_NAMES = (
+    'Ada', 'Alan', 'Amara', 'Ben', 'Chen', 'Chloe', 'Dami', 'Diego', 'Elif', 'Emma', 'Fatima', 'Grace',
+    'Hana', 'Ivan', 'James', 'Kemi', 'Lena', 'Liam', 'Maya', 'Mike', 'Nia', 'Noah', 'Olu', 'Priya',
+    'Ravi', 'Sara', 'Sofia', 'Tariq', 'Uma', 'Wei', 'Yusuf', 'Zoe',
+)
+LAST_NAMES = (
+    'Adeyemi', 'Brown', 'Costa', 'Doe', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Johnson',
+    'Kim', 'Lopez', 'Mensah', 'Novak', 'Okafor', 'Patel', 'Quinn', 'Rossi', 'Smith', 'Tanaka',
+    'Usman', 'Veld', 'Wang', 'Xu', 'Yilmaz', 'Zulu',
+)
+PRODUCT_ADJECTIVES = (
+    'Compact', 'Classic', 'Deluxe', 'Eco', 'Ergonomic', 'Smart', 'Portable', 'Pro', 'Rugged', 'Ultra',
+    'Wireless', 'Vintage',
+)
+PRODUCT_NOUNS = (
+    'Backpack', 'Blender', 'Camera', 'Chair', 'Charger', 'Desk', 'Headphones', 'Kettle', 'Keyboard',
+    'Lamp', 'Laptop', 'Monitor', 'Mouse', 'Phone', 'Speaker', 'Tablet', 'Watch',
+)
+
+# Products per order -> relative weight; a mean of 2.65 items per order
+DEFAULT_ITEMS_PER_ORDER = {1: 20, 2: 30, 3: 25, 4: 15, 5: 10}
+
+# Orders pick customer int(customers * random() ** ORDER_SKEW): the lower
+# ids order most, and a tail of customers ends up with few or no orders
+ORDER_SKEW = 2
+
+# At most 5 parameters a row keeps a statement far under SQLite's limit
+ROWS_PER_INSERT = 500
+ROWS_PER_TRANSACTION = 100_000
+
+# Durability is pointless for a load that can be rerun from its seed
+LOAD_PRAGMAS = {
+    'journal_mode': 'MEMORY',
+    'synchronous': 'OFF',
+    'temp_store': 'MEMORY',
+    'cache_size': -262144,
+}
+
+
+def parse_items_per_order(spec):
+    """``"1:20,2:30"`` -> ``{1: 20, 2: 30}``; raise ``ValueError`` when malformed"""
+    distribution = {}
+    for part in spec.split(','):
+        count, _, weight = part.partition(':')
+        count, weight = int(count), float(weight or 1)
+        if count < 1 or weight < 0:
+            raise ValueError(f"Invalid products per order entry: {part.strip()}")
+        distribution[count] = weight
+    if not any(distribution.values()):
+        raise ValueError('Products per order weights must not all be zero')
+    return distribution
+
+
+@contextmanager
+def load_pragmas(pragmas=LOAD_PRAGMAS):
+    """Apply ``pragmas`` for the duration of a load, then restore them"""
+    # SQLite cannot change the journal mode inside a transaction
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        previous = {}
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}')
+            previous[name] = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA {name} = {value}')
+        try:
+            yield
+        finally:
+            for name, value in previous.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def deferred_indexes(models):
+    """Drop the indexes and FTS5 insert triggers of ``models``; recreate them on exit.
+
+    Indexes backing a ``UNIQUE`` or primary key constraint stay. The search
+    tables of the dropped triggers are rebuilt from their content tables.
+    Foreign key checks must be off, as they are outside a transaction under
+    ``constraint_checks_disabled()``: without the child key indexes every
+    parent insert would scan its child tables.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    tables = [model._meta.db_table for model in models]
+    search_tables = [
+        SEARCH_TABLES[model._meta.label_lower][0] for model in models if model._meta.label_lower in SEARCH_TABLES
+    ]
+    triggers = [f'{table}_insert' for table in search_tables]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL AND "
+            f"((type = 'index' AND tbl_name IN ({', '.join(['%s'] * len(tables))})) "
+            f"OR (type = 'trigger' AND name IN ({', '.join(['%s'] * len(triggers)) or 'NULL'})))",
+            [*tables, *triggers],
+        )
+        dropped = cursor.fetchall()
+        for kind, name, _ in dropped:
+            cursor.execute(f'DROP {kind.upper()} {connection.ops.quote_name(name)}')
+        try:
+            yield
+        finally:
+            for _, _, sql in dropped:
+                cursor.execute(sql)
+            for table in search_tables:
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+class MultiRowInsert:
+    """Buffers rows of ``columns`` and inserts them ``ROWS_PER_INSERT`` at a time"""
+
+    def __init__(self, cursor, model_or_table, columns):
+        qn = connection.ops.quote_name
+        if isinstance(model_or_table, str):
+            table = model_or_table
+        else:
+            meta = model_or_table._meta
+            table = meta.db_table
+            columns = [meta.get_field(name).column for name in columns]
+        self.prefix = f"INSERT INTO {qn(table)} ({', '.join(qn(column) for column in columns)}) VALUES "
+        self.placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        # The DB-API cursor: the DEBUG query log would quote every parameter
+        self.cursor = cursor.cursor
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= ROWS_PER_INSERT:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        self.cursor.execute(
+            self.prefix + ', '.join([self.placeholder] * len(self.rows)),
+            [value for row in self.rows for value in row],
+        )
+        self.count += len(self.rows)
+        self.rows = []
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _timestamp(seconds):
+    # Django's SQLite format for an aware datetime with no microseconds
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+
+def _money(cents):
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def _load(rows, count, write):
+    """Call ``write(cursor, inserters, row)`` for ``count`` rows in large transactions"""
+    done = 0
+    while done < count:
+        size = min(ROWS_PER_TRANSACTION, count - done)
+        with transaction.atomic(), connection.cursor() as cursor:
+            inserters = {}
+            for _ in range(size):
+                write(cursor, inserters, next(rows))
+            for inserter in inserters.values():
+                inserter.flush()
+        done += size
+
+
+def _inserter(cursor, inserters, model_or_table, columns):
+    inserter = inserters.get(model_or_table)
+    if inserter is None:
+        inserter = inserters[model_or_table] = MultiRowInsert(cursor, model_or_table, columns)
+    return inserter
+
+
+def customer_rows(rng, first_id, count, start, span):
+    for customer_id in range(first_id, first_id + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield (
+            customer_id,
+            f"{first} {last}",
+            f"{first.lower()}.{last.lower()}.{customer_id}@example.com",
+            f"+1555{rng.randrange(10 ** 7):07d}",
+            _timestamp(start + rng.random() * span),
+        )
+
+
+def product_rows(rng, first_id, count, start, span):
+    for product_id in range(first_id, first_id + count):
+        # Log-normal prices around $30, within the column's 8 integer digits
+        cents = min(max(int(rng.lognormvariate(8, 1.2)), 99), 10 ** 8 - 1)
+        yield (
+            product_id,
+            f"{rng.choice(PRODUCT_ADJECTIVES)} {rng.choice(PRODUCT_NOUNS)} {product_id}",
+            _money(cents),
+            rng.randrange(200),
+            _timestamp(start + rng.random() * span),
+            cents,
+        )
+
+
+def order_rows(rng, first_id, count, customer_ids, product_ids, prices, items_per_order, start, span):
+    """Yield ``(order row, [(product id, unit price)])``; each line is one unit"""
+    sizes, weights = list(items_per_order), list(items_per_order.values())
+    customers = len(customer_ids)
+    for order_id in range(first_id, first_id + count):
+        size = min(rng.choices(sizes, weights)[0], len(product_ids))
+        picked = rng.sample(range(len(product_ids)), size)
+        yield (
+            order_id,
+            customer_ids[int(customers * rng.random() ** ORDER_SKEW)],
+            _money(sum(prices[i] for i in picked)),
+            _timestamp(start + rng.random() * span),
+        ), [(product_ids[i], _money(prices[i])) for i in picked]
+
+
+def generate_dataset(customers, products, orders, items_per_order=None, seed=0, days=730, end=None):
+    """Insert the synthetic dataset; yield ``(phase, rows by table, seconds)``.
+
+    Timestamps fall in the ``days`` days before ``end`` (midnight UTC today
+    by default).
+    """
+    if orders and not (customers and products):
+        raise ValueError('Orders need at least one generated customer and product')
+    items_per_order = items_per_order or DEFAULT_ITEMS_PER_ORDER
+    if end is None:
+        end = datetime.now(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    span = timedelta(days=days).total_seconds()
+    start = end.timestamp() - span
+
+    models = [Customer, Product, Order, OrderItem, CustomerStats]
+    # The generated keys are consistent by construction
+    with load_pragmas(), connection.constraint_checks_disabled(), deferred_indexes(models):
+        started = time.perf_counter()
+        first_customer = _next_id(Customer)
+        rows = customer_rows(random.Random(f'{seed}:customers'), first_customer, customers, start, span)
+        _load(rows, customers, lambda cursor, inserters, row: _inserter(
+            cursor, inserters, Customer, ['id', 'name', 'email', 'phone', 'created_at'],
+        ).add(row))
+        yield 'customers', {'customers': customers}, time.perf_counter() - started
+
+        started = time.perf_counter()
+        first_product = _next_id(Product)
+        prices = []
+
+        def write_product(cursor, inserters, row):
+            prices.append(row[-1])
+            _inserter(cursor, inserters, Product, ['id', 'name', 'price', 'stock', 'created_at']).add(row[:-1])
+
+        rows = product_rows(random.Random(f'{seed}:products'), first_product, products, start, span)
+        _load(rows, products, write_product)
+        yield 'products', {'products': products}, time.perf_counter() - started
+
+        started = time.perf_counter()
+        item_count = 0
+
+        def write_order(cursor, inserters, generated):
+            nonlocal item_count
+            row, lines = generated
+            _inserter(cursor, inserters, Order, ['id', 'customer', 'total_amount', 'order_date']).add(row)
+            items = _inserter(cursor, inserters, OrderItem, ['order', 'product', 'quantity', 'unit_price'])
+            for product_id, unit_price in lines:
+                items.add((row[0], product_id, 1, unit_price))
+            item_count += len(lines)
+
+        rows = order_rows(
+            random.Random(f'{seed}:orders'), _next_id(Order), orders,
+            range(first_customer, first_customer + customers),
+            range(first_product, first_product + products),
+            prices, items_per_order, start, span,
+        )
+        _load(rows, orders, write_order)
+        yield 'orders', {'orders': orders, 'order items': item_count}, time.perf_counter() - started
+
+        started = time.perf_counter()
+        stats = rebuild_customer_stats()
+        yield 'customer stats', {'customer stats': stats}, time.perf_counter() - started
+
+        # Timed up to the end of the block, which recreates the indexes
+        started = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    yield 'indexes', {}, time.perf_counter() - started
+
+    # Sums each order's items through their recreated index
+    started = time.perf_counter()
+    days = rebuild_sales()
+    yield 'sales rollups', {'sales days': days}, time.perf_counter() - started
+
+    for model in (Customer, Product, Order):
+        invalidate_model(model)
@@ -0,0 +1,140 @@
+"""Parsed-document cache and persisted query registry for the GraphQL view.
+
+Documents are keyed by the sha256 of their query text, so a repeated
+operation is parsed and validated once per process. The registry maps
+hashes of operations registered ahead of time (see the
+``register_persisted_queries`` command) to their text, so clients can send
+only the hash.
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import parse, print_schema, validate
+from graphene_django.settings import graphene_settings
+
+
+def query_hash(query):
+    """Return the persisted query id of ``query``"""
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+# Response header carrying ``schema_hash``; lets ``crm.client`` check its
+# cached schema snapshot without introspecting
+SCHEMA_HASH_HEADER = 'X-GraphQL-Schema-Hash'
+
+
+@functools.lru_cache(maxsize=None)
+def schema_hash(graphql_schema):
+    """Return the sha256 of the printed schema, for clients' cached snapshots"""
+    return hashlib.sha256(print_schema(graphql_schema).encode('utf-8')).hexdigest()
+
+
+class DocumentCache:
+    """Thread-safe LRU of ``hash -> (query, document, {rules: errors})``"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def get_query(self, digest):
+        """Return the cached query text for ``digest``, if any"""
+        entry = self.get(digest)
+        return entry[0] if entry else None
+
+    def get_document(self, schema, query, validation_rules=None):
+        """Return ``(document, validation_errors)`` for ``query``.
+
+        The document is parsed once; validation results are kept per set of
+        rules. Syntax errors propagate as ``GraphQLError`` and are not cached.
+        """
+        digest = query_hash(query)
+        entry = self.get(digest)
+        if entry is None:
+            entry = (query, parse(query), {})
+            self.set(digest, entry)
+        _, document, validated = entry
+        rules = tuple(validation_rules) if validation_rules else None
+        if rules not in validated:
+            validated[rules] = validate(
+                schema, document, validation_rules, graphene_settings.MAX_VALIDATION_ERRORS
+            )
+        return document, validated[rules]
+
+
+class PersistedQueryRegistry:
+    """Registered operations, read from a JSON ``{hash: query}`` file.
+
+    The file is re-read when its modification time changes, so operations
+    registered while the server is running are picked up without a restart.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queries = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path) as f:
+                    self._queries = json.load(f)
+                self._mtime = mtime
+
+    def get(self, digest):
+        self._reload()
+        return self._queries.get(digest)
+
+    def register(self, queries):
+        """Add ``queries`` to the file; return their hashes"""
+        self._reload()
+        added = {query_hash(query): query for query in queries}
+        with self._lock:
+            self._queries = {**self._queries, **added}
+            with open(self.path, 'w') as f:
+                json.dump(self._queries, f, indent=2, sort_keys=True)
+            self._mtime = os.path.getmtime(self.path)
+        return list(added)
+
+
+document_cache = DocumentCache(getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 256))
+persisted_queries = PersistedQueryRegistry(
+    getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_PATH', settings.BASE_DIR / 'persisted_queries.json')
+)
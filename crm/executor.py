@@ -0,0 +1,82 @@
+"""Bounded thread pool for sync ORM work under the async GraphQL view.
+
+Django's ORM is sync (its async methods hop to a thread as well), so the
+async view sends resolvers that may query the database here. The pool size
+(``GRAPHQL_ASYNC_DB_THREADS``) also bounds the database connections the
+async path holds open, one per pool thread.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from inspect import isawaitable
+
+from django.conf import settings
+from django.core.exceptions import SynchronousOnlyOperation
+from graphene.relay.node import GlobalID
+from graphene.types.resolver import attr_resolver, dict_or_attr_resolver, dict_resolver
+from graphql import OperationType, get_named_type, is_leaf_type
+
+# Resolvers that only read attributes of an already loaded row
+ATTRIBUTE_RESOLVERS = {attr_resolver, dict_resolver, dict_or_attr_resolver, GlobalID.id_resolver}
+
+db_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'GRAPHQL_ASYNC_DB_THREADS', 8),
+    thread_name_prefix='crm-db',
+)
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """Run ``func`` on the database pool, in a copy of the caller's context"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+_attribute_fields = {}
+
+
+def reads_attribute(info):
+    """Whether the field being resolved is a scalar read off its parent object"""
+    key = (id(info.parent_type), info.field_name)
+    reads = _attribute_fields.get(key)
+    if reads is None:
+        field = info.parent_type.fields.get(info.field_name)
+        # Introspection fields (__schema, __typename) are not in ``fields``
+        reads = _attribute_fields[key] = field is None or (
+            is_leaf_type(get_named_type(field.type))
+            and isinstance(field.resolve, functools.partial)
+            and field.resolve.func in ATTRIBUTE_RESOLVERS
+        )
+    return reads
+
+
+class OffloadSyncResolvers:
+    """graphql-core middleware moving ORM work off the event loop.
+
+    Mutations always run on ``db_executor``. Other resolvers first run on
+    the loop, since most only read rows the planner or a loader already
+    fetched; one that does reach the database is stopped by Django's
+    ``SynchronousOnlyOperation`` check before its first query and is rerun
+    on the pool. Resolvers here only read until they query, so the rerun is
+    safe. A resolver that turns out to be a coroutine is awaited back on
+    the loop.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if info.operation.operation == OperationType.MUTATION and info.path.prev is None:
+            return self._offload(next, root, info, args)
+
+        if reads_attribute(info):
+            return next(root, info, **args)
+
+        try:
+            return next(root, info, **args)
+        except SynchronousOnlyOperation:
+            return self._offload(next, root, info, args)
+
+    async def _offload(self, next, root, info, args):
+        result = await run_in_executor(next, root, info, **args)
+        if isawaitable(result):
+            result = await result
+        return result
@@ -0,0 +1,216 @@
+import json
+from functools import partial
+
+import graphene
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from graphene.relay import PageInfo
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.filter import DjangoFilterConnectionField
+from graphql import GraphQLError
+from graphql_relay.utils import base64, unbase64
+
+from .loaders import get_loaders
+from .planner import optimize
+
+KEYSET_CURSOR_PREFIX = 'keyset:'
+
+
+class CountableConnection(graphene.relay.Connection):
+    """Connection exposing ``totalCount``, only counted when it is selected"""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(root, info):
+        if getattr(root, 'length', None) is None:
+            iterable = root.iterable
+            root.length = len(iterable) if isinstance(iterable, list) else iterable.count()
+        return root.length
+
+
+class BatchedConnectionField(DjangoFilterConnectionField):
+    """Filter connection that primes the request loaders with its page of nodes.
+
+    Querysets are shaped by ``crm.planner.optimize`` after filtering. When
+    ``loader`` names a relation on ``crm.loaders.Loaders`` and no filter
+    argument is given, the related set is taken from the planner's prefetch
+    or served by that loader instead of one query per parent node.
+    """
+
+    def __init__(self, type_, *args, loader=None, **kwargs):
+        self.loader = loader
+        super().__init__(type_, *args, **kwargs)
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        result = super().connection_resolver(
+            resolver,
+            connection,
+            default_manager,
+            queryset_resolver,
+            max_limit,
+            enforce_first_or_last,
+            root,
+            info,
+            **args,
+        )
+        get_loaders(info.context).prime(edge.node for edge in result.edges)
+        return result
+
+    def wrap_resolve(self, parent_resolver):
+        resolve_queryset = self.get_queryset_resolver()
+        default_resolver = self.resolver or parent_resolver
+        loader = self.loader
+        filtering_args = self.filtering_args
+
+        def resolver(root, info, **args):
+            if loader and all(args.get(name) is None for name in filtering_args):
+                prefetched = getattr(root, '_prefetched_objects_cache', {})
+                name = to_snake_case(info.field_name)
+                if name in prefetched:
+                    return list(prefetched[name])
+                return getattr(get_loaders(info.context), loader).load(root.pk)
+            return default_resolver(root, info, **args)
+
+        def queryset_resolver(connection, iterable, info, args):
+            if isinstance(iterable, list):
+                return iterable
+            return optimize(resolve_queryset(connection, iterable, info, args), info)
+
+        return partial(
+            self.connection_resolver,
+            resolver,
+            self.connection_type,
+            self.get_manager(),
+            queryset_resolver,
+            self.max_limit,
+            self.enforce_first_or_last,
+        )
+
+
+class KeysetConnectionField(BatchedConnectionField):
+    """Connection paged by a ``(keyset, id)`` cursor instead of an offset.
+
+    Cursors encode the keyset column and primary key of the edge, and pages
+    are read with ``WHERE (keyset, id) > (cursor) ORDER BY keyset, id LIMIT
+    n``, so every page costs the same index range scan however deep it is.
+    No ``COUNT(*)`` is run unless ``totalCount`` is selected.
+    """
+
+    def __init__(self, type_, *args, keyset, **kwargs):
+        self.keyset = keyset
+        super().__init__(type_, *args, **kwargs)
+
+    def encode_cursor(self, node):
+        value = node.keyset_value
+        value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        return base64(KEYSET_CURSOR_PREFIX + json.dumps([value, node.pk]))
+
+    def decode_cursor(self, model, cursor):
+        try:
+            data = unbase64(cursor)
+            if not data.startswith(KEYSET_CURSOR_PREFIX):
+                raise ValueError(cursor)
+            value, pk = json.loads(data[len(KEYSET_CURSOR_PREFIX):])
+            return model._meta.get_field(self.keyset).to_python(value), int(pk)
+        except (ValueError, TypeError, ValidationError):
+            raise GraphQLError(f"Invalid cursor: {cursor}")
+
+    def connection_resolver(
+        self,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        first = args.get('first')
+        last = args.get('last')
+
+        if args.get('offset') is not None:
+            raise GraphQLError(
+                f"`offset` is not supported on the `{info.field_name}` connection, page with `after` instead."
+            )
+        if enforce_first_or_last and not (first or last):
+            raise GraphQLError(
+                f"You must provide a `first` or `last` value to properly paginate the `{info.field_name}` connection."
+            )
+        for size in (first, last):
+            if size is not None and (size < 0 or (max_limit and size > max_limit)):
+                raise GraphQLError(
+                    f"Requesting {size} records on the `{info.field_name}` connection exceeds the limit of {max_limit} records."
+                )
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        queryset = queryset_resolver(connection, iterable, info, args)
+        result = self.resolve_keyset_connection(connection, queryset, args, max_limit)
+        get_loaders(info.context).prime(edge.node for edge in result.edges)
+        return result
+
+    def resolve_keyset_connection(self, connection, queryset, args, max_limit):
+        key = self.keyset
+        after = args.get('after')
+        before = args.get('before')
+        backward = args.get('first') is None and args.get('last') is not None
+        size = args.get('last') if backward else args.get('first')
+        if size is None:
+            size = max_limit
+
+        page = queryset.annotate(keyset_value=F(key))
+        if after:
+            value, pk = self.decode_cursor(queryset.model, after)
+            page = page.filter(**{f'{key}__gte': value}).filter(
+                Q(**{f'{key}__gt': value}) | Q(pk__gt=pk)
+            )
+        if before:
+            value, pk = self.decode_cursor(queryset.model, before)
+            page = page.filter(**{f'{key}__lte': value}).filter(
+                Q(**{f'{key}__lt': value}) | Q(pk__lt=pk)
+            )
+
+        if backward:
+            page = page.order_by(f'-{key}', '-pk')
+        else:
+            page = page.order_by(key, 'pk')
+        if size is not None:
+            page = page[:size + 1]
+
+        nodes = list(page)
+        has_more = size is not None and len(nodes) > size
+        nodes = nodes[:size]
+        if backward:
+            nodes.reverse()
+
+        edges = [connection.Edge(node=node, cursor=self.encode_cursor(node)) for node in nodes]
+        result = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_more if backward else bool(after),
+                has_next_page=bool(before) if backward else has_more,
+            ),
+        )
+        result.iterable = queryset
+        result.length = None
+        return result
@@ -1,11 +1,51 @@
 import django_filters
 from django.db.models import Q
+from django_filters.constants import EMPTY_VALUES
 from .models import Customer, Product, Order
+from .search import icontains
+
+
+class SubstringFilter(django_filters.CharFilter):
+    """``icontains`` filter served by ``crm.search`` (FTS5 when enabled)"""
+    
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('lookup_expr', 'icontains')
+        super().__init__(*args, **kwargs)
+    
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        if self.distinct:
+            qs = qs.distinct()
+        return icontains(qs, self.field_name, value)
+
+class StatsFilter(django_filters.Filter):
+    """Range filter on a ``CustomerStats`` column.
+    
+    Customers without a stats row have no orders; they match whenever a
+    zero count or value would.
+    """
+    
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        condition = Q(**{f'stats__{self.field_name}__{self.lookup_expr}': value})
+        if self.field_name != 'last_order_at' and (
+            (self.lookup_expr == 'lte' and value >= 0) or (self.lookup_expr == 'gte' and value <= 0)
+        ):
+            condition |= Q(stats__isnull=True)
+        return qs.filter(condition)
+
+class StatsNumberFilter(StatsFilter, django_filters.NumberFilter):
+    pass
+
+class StatsDateTimeFilter(StatsFilter, django_filters.DateTimeFilter):
+    pass
 
 class CustomerFilter(django_filters.FilterSet):
     # Basic filters
-    name = django_filters.CharFilter(lookup_expr='icontains')
-    email = django_filters.CharFilter(lookup_expr='icontains')
+    name = SubstringFilter()
+    email = SubstringFilter()
     
     # Date range filters
     created_at_gte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
@@ -14,6 +54,14 @@ class CustomerFilter(django_filters.FilterSet):
     # Custom phone pattern filter
     phone_pattern = django_filters.CharFilter(method='filter_phone_pattern')
     
+    # Order aggregates, read from CustomerStats
+    order_count_gte = StatsNumberFilter(field_name='order_count', lookup_expr='gte')
+    order_count_lte = StatsNumberFilter(field_name='order_count', lookup_expr='lte')
+    lifetime_value_gte = StatsNumberFilter(field_name='lifetime_value', lookup_expr='gte')
+    lifetime_value_lte = StatsNumberFilter(field_name='lifetime_value', lookup_expr='lte')
+    last_order_at_gte = StatsDateTimeFilter(field_name='last_order_at', lookup_expr='gte')
+    last_order_at_lte = StatsDateTimeFilter(field_name='last_order_at', lookup_expr='lte')
+    
     class Meta:
         model = Customer
         fields = ['name', 'email']
@@ -24,7 +72,7 @@ class CustomerFilter(django_filters.FilterSet):
 
 class ProductFilter(django_filters.FilterSet):
     # Basic filters
-    name = django_filters.CharFilter(lookup_expr='icontains')
+    name = SubstringFilter()
     
     # Price range filters
     price_gte = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
@@ -58,8 +106,9 @@ class OrderFilter(django_filters.FilterSet):
     order_date_lte = django_filters.DateTimeFilter(field_name='order_date', lookup_expr='lte')
     
     # Related field filters
-    customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
-    product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains')
+    customer_name = SubstringFilter(field_name='customer__name')
+    # Distinct: an order with several matching products is still one order
+    product_name = SubstringFilter(field_name='products__name', distinct=True)
     
     # Custom filter for specific product ID
     product_id = django_filters.NumberFilter(method='filter_by_product_id')
@@ -0,0 +1,163 @@
+"""Liveness report served by ``/health/`` and probed by the heartbeat jobs.
+
+The report covers what a probe needs to tell a working node from a broken
+one without running any GraphQL:
+
+* ``database``: a ``SELECT 1`` round trip and its time,
+* ``migrations``: migrations on disk that are not applied yet,
+* ``latency``: p50/p99 of the last ``WINDOW`` GraphQL requests of this
+  process, recorded by the GraphQL views into ``request_latency``.
+
+Reports are cached in process for ``CACHE_SECONDS``, so probes from every
+node and load balancer cost one check per window. ``heartbeat_status()``
+fetches the report over HTTP and renders the heartbeat log line with the
+measured round-trip time.
+"""
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+DEFAULTS = {
+    'URL': 'http://localhost:8000/health/',
+    'TIMEOUT': 5,
+    'CACHE_SECONDS': 5,
+    'WINDOW': 1000,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CRM_HEALTH', {})}
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class LatencyWindow:
+    """Durations of the last ``WINDOW`` requests"""
+
+    def __init__(self):
+        self._samples = deque()
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        window = get_config()['WINDOW']
+        with self._lock:
+            if self._samples.maxlen != window:
+                self._samples = deque(self._samples, maxlen=window)
+            self._samples.append(seconds)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        with self._lock:
+            durations = sorted(self._samples)
+        if not durations:
+            return {'requests': 0, 'p50_ms': None, 'p99_ms': None}
+        return {
+            'requests': len(durations),
+            'p50_ms': _ms(durations[int(len(durations) * 0.5)]),
+            'p99_ms': _ms(durations[min(len(durations) - 1, int(len(durations) * 0.99))]),
+        }
+
+
+request_latency = LatencyWindow()
+
+
+def check_database():
+    started = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except DatabaseError as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'latency_ms': _ms(time.perf_counter() - started)}
+
+
+def check_migrations():
+    executor = MigrationExecutor(connection)
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return {'ok': not plan, 'pending': [f'{migration.app_label}.{migration.name}' for migration, _ in plan]}
+
+
+def build_report():
+    database = check_database()
+    if database['ok']:
+        migrations = check_migrations()
+        status = 'ok' if migrations['ok'] else 'degraded'
+    else:
+        migrations = None
+        status = 'down'
+    return {
+        'status': status,
+        'checked_at': timezone.now().isoformat(),
+        'database': database,
+        'migrations': migrations,
+        'latency': request_latency.summary(),
+    }
+
+
+_cached = (0.0, None)
+_cached_lock = threading.Lock()
+
+
+def health_report():
+    """The current report, rebuilt at most once per ``CACHE_SECONDS``"""
+    global _cached
+    with _cached_lock:
+        expires, report = _cached
+        now = time.monotonic()
+        if report is None or now >= expires:
+            report = build_report()
+            _cached = (now + get_config()['CACHE_SECONDS'], report)
+        return report
+
+
+def clear_cache():
+    global _cached
+    with _cached_lock:
+        _cached = (0.0, None)
+
+
+# One keep-alive connection per process for repeated probes
+_session = requests.Session()
+
+
+def probe(url=None):
+    """GET the health report at ``url``; return ``(report, seconds)``"""
+    config = get_config()
+    started = time.perf_counter()
+    response = _session.get(url or config['URL'], timeout=config['TIMEOUT'])
+    elapsed = time.perf_counter() - started
+    return response.json(), elapsed
+
+
+def heartbeat_status(url=None):
+    """Heartbeat log text for the report at ``url``"""
+    try:
+        report, elapsed = probe(url)
+    except (requests.RequestException, ValueError) as e:
+        return f"health endpoint error: {e}"
+
+    parts = []
+    database = report.get('database') or {}
+    if database.get('ok'):
+        parts.append(f"db {database['latency_ms']} ms")
+    else:
+        parts.append(f"db error: {database.get('error')}")
+    latency = report.get('latency') or {}
+    if latency.get('requests'):
+        parts.append(f"graphql p50 {latency['p50_ms']} ms p99 {latency['p99_ms']} ms over {latency['requests']}")
+    migrations = report.get('migrations')
+    if migrations is not None:
+        parts.append(f"{len(migrations['pending'])} pending migrations")
+    return f"health {report.get('status')} in {_ms(elapsed)} ms ({', '.join(parts)})"
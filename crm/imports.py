@@ -0,0 +1,524 @@
+"""Streaming imports of customers, products and orders from CSV or NDJSON.
+
+``import_file()`` runs a file through a generator pipeline:
+
+* records are read one at a time (``csv.reader`` rows, or NDJSON lines) and
+  grouped into batches of ``batch_size``,
+* each batch is cleaned with the rules of the mutations: ``Customer``'s
+  field validators as in ``createCustomer``, ``crm.bulk.clean_product`` as
+  in ``createProduct``, and the product id parsing of ``createOrder``.
+  Cleaning needs no database, so with ``workers`` it runs in a
+  ``multiprocessing`` pool,
+* the main process checks the batch against the database through
+  in-memory maps loaded once per import: email -> customer id, sku ->
+  product id and product id -> price. Duplicate emails and skus, and
+  orders with unknown customers or products, are rejected,
+* accepted rows are written with ``bulk_create`` in transactions of
+  ``transaction_rows`` records.
+
+Each transaction also saves the number of records read in an
+``ImportCheckpoint`` row, so the count commits with the rows it covers and
+``resume=True`` starts after it. After the commit the rejected records are
+appended to the reject file. Rejects keep the input's format with
+``record`` and ``error`` added, so a fixed file can be imported again.
+
+Columns (CSV header or NDJSON keys):
+
+* customers: ``name``, ``email``, ``phone``, ``created_at``
+* products: ``name``, ``price``, ``stock``, ``sku``, ``created_at``
+* orders: ``customer_email`` or ``customer_id``; ``product_skus`` or
+  ``product_ids`` (``;``-separated in CSV, as ``export_crm`` writes them,
+  a product repeated once per unit); ``order_date``; ``total_amount``,
+  summed from the items in SQL when missing. Items are priced at the
+  current prices
+
+Timestamps default to the time of import. Orders are history: they are
+imported without reserving stock, which the file cannot know.
+"""
+import csv
+import json
+import multiprocessing
+import os
+from collections import deque
+from contextlib import contextmanager
+from datetime import timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bulk import BULK_BATCH_SIZE, clean_product, insert_order_items
+from .cache import invalidate_model
+from .dataset import load_pragmas
+from .models import Customer, ImportCheckpoint, Order, Product
+from .orders import OrderError, parse_product_ids, set_order_totals
+from .sales import record_sales
+from .stats import record_orders
+
+KINDS = ('customers', 'products', 'orders')
+FORMATS = ('csv', 'ndjson')
+
+# Records per cleaning batch, and per transaction and checkpoint
+BATCH_SIZE = 5000
+TRANSACTION_ROWS = 50_000
+
+# A larger page cache for the index updates; unlike the dataset load's
+# pragmas these keep every committed checkpoint durable
+IMPORT_PRAGMAS = {
+    'cache_size': -262144,
+    'temp_store': 'MEMORY',
+}
+
+
+class ImportFileError(ValueError):
+    """A file, format or checkpoint the import cannot start from"""
+
+
+class Reject(ValueError):
+    """A record that is not imported; the message goes to the reject file"""
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if extension == 'csv':
+        return 'csv'
+    raise ImportFileError(f"Cannot tell the format of {path}; pass csv or ndjson")
+
+
+def read_records(source, format):
+    """Return ``(header, records)``; NDJSON records are the raw lines"""
+    if format == 'csv':
+        reader = csv.reader(source)
+        header = next(reader, None)
+        if header is None:
+            return [], iter(())
+        return [name.strip() for name in header], reader
+    return None, (line for line in source if line.strip())
+
+
+def numbered_batches(records, batch_size, skip=0):
+    """Yield ``(first_record_number, records)``, numbering from 1 after ``skip``"""
+    records = islice(records, skip, None)
+    number = skip + 1
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield number, batch
+        number += len(batch)
+
+
+# Cleaning, run in the worker processes
+
+def _text(data, name):
+    value = data.get(name)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _timestamp(data, name):
+    value = _text(data, name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise Reject(f"Invalid {name}: {value}")
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def _ids(data, name):
+    value = data.get(name)
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        return [part for part in value.split(';') if part.strip()]
+    if not isinstance(value, list):
+        raise Reject(f"Invalid {name}: {value}")
+    return value
+
+
+# What Customer.full_clean(validate_unique=False) checks, minus building an
+# instance per record. Emails are checked against the import's map
+CUSTOMER_FIELDS = ('name', 'email', 'phone')
+
+
+def clean_customer(data):
+    values = []
+    errors = {}
+    for name in CUSTOMER_FIELDS:
+        try:
+            values.append(Customer._meta.get_field(name).clean(_text(data, name), None))
+        except ValidationError as e:
+            errors[name] = e.error_list
+    if errors:
+        raise Reject(f"Validation error: {str(ValidationError(errors))}")
+    return (*values, _timestamp(data, 'created_at'))
+
+
+def clean_product_row(data):
+    name = _text(data, 'name')
+    if not name:
+        raise Reject("Name is required")
+    stock = _text(data, 'stock') or '0'
+    try:
+        stock = int(stock)
+    except ValueError:
+        raise Reject(f"Invalid stock: {stock}")
+    try:
+        price, stock = clean_product(_text(data, 'price'), stock)
+    except ValueError as e:
+        raise Reject(str(e))
+    return name, price, stock, _text(data, 'sku') or None, _timestamp(data, 'created_at')
+
+
+def clean_order(data):
+    customer = _text(data, 'customer_email') or None
+    if customer is None:
+        try:
+            customer = int(_text(data, 'customer_id'))
+        except ValueError:
+            raise Reject("Invalid customer ID")
+
+    skus = _ids(data, 'product_skus')
+    try:
+        if skus:
+            quantities = {}
+            for sku in skus:
+                sku = str(sku).strip()
+                quantities[sku] = quantities.get(sku, 0) + 1
+        else:
+            product_ids = _ids(data, 'product_ids')
+            if not product_ids:
+                raise Reject("At least one product must be provided")
+            quantities = dict(parse_product_ids(product_ids))
+    except OrderError as e:
+        raise Reject(str(e))
+
+    total = _text(data, 'total_amount') or None
+    if total is not None:
+        try:
+            total = Decimal(total)
+        except InvalidOperation:
+            raise Reject(f"Invalid total_amount: {total}")
+        if not total.is_finite() or total < 0:
+            raise Reject(f"Invalid total_amount: {total}")
+    return customer, bool(skus), quantities, total, _timestamp(data, 'order_date')
+
+
+CLEANERS = {'customers': clean_customer, 'products': clean_product_row, 'orders': clean_order}
+
+
+def clean_batch(kind, format, header, batch):
+    """Clean one ``(first_record_number, records)`` batch.
+
+    Returns ``(count, rows, rejects)``: ``rows`` are ``(number, cleaned)``
+    and ``rejects`` are ``(number, data, message)``.
+    """
+    first, records = batch
+    clean = CLEANERS[kind]
+    rows = []
+    rejects = []
+    for number, record in enumerate(records, first):
+        try:
+            data = _data(format, header, record)
+        except ValueError:
+            rejects.append((number, {'line': record.rstrip('\n')}, "Invalid JSON"))
+            continue
+        if not isinstance(data, dict):
+            rejects.append((number, {'line': record.rstrip('\n')}, "Expected a JSON object"))
+            continue
+        try:
+            rows.append((number, clean(data)))
+        except Reject as e:
+            rejects.append((number, data, str(e)))
+    return len(records), rows, rejects
+
+
+def _data(format, header, record):
+    if format == 'csv':
+        return dict(zip(header, record))
+    return json.loads(record)
+
+
+def _init_worker():
+    # Under the spawn start method the workers start without Django
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+# Writing, in the main process
+
+@contextmanager
+def keep_timestamps():
+    """Let ``bulk_create`` write the ``auto_now_add`` values of the import.
+
+    Flips the flag on the model fields of this process, so only for the
+    length of an import command.
+    """
+    fields = [Customer._meta.get_field('created_at'), Product._meta.get_field('created_at'), Order._meta.get_field('order_date')]
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+class CustomerWriter:
+    def __init__(self):
+        # Emails are unique as stored; compared as given, like the mutations
+        self.emails = set(Customer.objects.values_list('email', flat=True).iterator(chunk_size=10000))
+
+    def write(self, rows, now):
+        customers = []
+        rejects = []
+        for number, (name, email, phone, created_at) in rows:
+            if email in self.emails:
+                rejects.append((number, f"Email {email} already exists"))
+                continue
+            self.emails.add(email)
+            customers.append(Customer(name=name, email=email, phone=phone, created_at=created_at or now))
+        Customer.objects.bulk_create(customers, batch_size=BULK_BATCH_SIZE)
+        return len(customers), rejects
+
+
+class ProductWriter:
+    def __init__(self):
+        self.skus = set(Product.objects.exclude(sku=None).values_list('sku', flat=True).iterator(chunk_size=10000))
+
+    def write(self, rows, now):
+        products = []
+        rejects = []
+        for number, (name, price, stock, sku, created_at) in rows:
+            if sku is not None:
+                if sku in self.skus:
+                    rejects.append((number, f"SKU {sku} already exists"))
+                    continue
+                self.skus.add(sku)
+            products.append(Product(name=name, price=price, stock=stock, sku=sku, created_at=created_at or now))
+        Product.objects.bulk_create(products, batch_size=BULK_BATCH_SIZE)
+        return len(products), rejects
+
+
+class OrderWriter:
+    def __init__(self):
+        customers = Customer.objects.values_list('email', 'pk').iterator(chunk_size=10000)
+        self.customer_by_email = dict(customers)
+        self.customer_ids = set(self.customer_by_email.values())
+        self.product_by_sku = {}
+        self.prices = {}
+        for pk, sku, price in Product.objects.values_list('pk', 'sku', 'price').iterator(chunk_size=10000):
+            self.prices[pk] = price
+            if sku is not None:
+                self.product_by_sku[sku] = pk
+
+    def resolve(self, customer, by_sku, quantities):
+        if isinstance(customer, str):
+            customer_id = self.customer_by_email.get(customer)
+            if customer_id is None:
+                raise Reject(f"Unknown customer email: {customer}")
+        elif customer in self.customer_ids:
+            customer_id = customer
+        else:
+            raise Reject("Invalid customer ID")
+
+        if not by_sku:
+            for pk in quantities:
+                if pk not in self.prices:
+                    raise Reject(f"Invalid product ID: {pk}")
+            return customer_id, quantities
+        resolved = {}
+        for sku, quantity in quantities.items():
+            pk = self.product_by_sku.get(sku)
+            if pk is None:
+                raise Reject(f"Unknown product SKU: {sku}")
+            resolved[pk] = resolved.get(pk, 0) + quantity
+        return customer_id, resolved
+
+    def write(self, rows, now):
+        orders = []
+        lines = []
+        # Orders without a total_amount, totalled from their items in SQL
+        untotalled = []
+        rejects = []
+        for number, (customer, by_sku, quantities, total, order_date) in rows:
+            try:
+                customer_id, quantities = self.resolve(customer, by_sku, quantities)
+            except Reject as e:
+                rejects.append((number, str(e)))
+                continue
+            orders.append(Order(
+                customer_id=customer_id, total_amount=Decimal('0.00') if total is None else total,
+                order_date=order_date or now,
+            ))
+            lines.append(quantities)
+            if total is None:
+                untotalled.append(orders[-1])
+        Order.objects.bulk_create(orders, batch_size=BULK_BATCH_SIZE)
+        items = [
+            (order, pk, quantity, self.prices[pk])
+            for order, quantities in zip(orders, lines) for pk, quantity in quantities.items()
+        ]
+        insert_order_items((order.pk, pk, quantity, price) for order, pk, quantity, price in items)
+        set_order_totals(untotalled)
+        # bulk_create sends no signals
+        record_orders(orders)
+        record_sales(orders, items)
+        return len(orders), rejects
+
+
+WRITERS = {'customers': CustomerWriter, 'products': ProductWriter, 'orders': OrderWriter}
+
+
+class RejectFile:
+    """Rejected records in the input's format, with ``record`` and ``error`` added"""
+
+    def __init__(self, path, format, header, append):
+        self.format = format
+        self.header = header
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        if format == 'csv':
+            self.writer = csv.writer(self.file)
+            if not exists:
+                self.writer.writerow(header + ['record', 'error'])
+
+    def write(self, rejects):
+        for number, data, message in rejects:
+            if self.format == 'csv':
+                self.writer.writerow([data.get(name, '') for name in self.header] + [number, message])
+            else:
+                self.file.write(json.dumps({**data, 'record': number, 'error': message}, default=str) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def cleaned_batches(batches, clean, pool=None, in_flight=2):
+    """Yield ``(batch, clean(batch))`` in order, cleaning in ``pool`` when given.
+
+    At most ``in_flight`` batches are sent ahead; ``Pool.imap`` would read
+    the whole file ahead of the writes.
+    """
+    if pool is None:
+        for batch in batches:
+            yield batch, clean(batch)
+        return
+    pending = deque()
+    for batch in batches:
+        pending.append((batch, pool.apply_async(clean, (batch,))))
+        if len(pending) >= in_flight:
+            batch, result = pending.popleft()
+            yield batch, result.get()
+    while pending:
+        batch, result = pending.popleft()
+        yield batch, result.get()
+
+
+class Checkpoint:
+    """Records read by the committed transactions of an import.
+
+    Saved inside each transaction: a crash either keeps the rows and their
+    count or neither, so a resumed import never writes a record twice.
+    """
+
+    def __init__(self, name, kind, source):
+        self.name = name
+        self.identity = {'kind': kind, 'source': source, 'size': os.path.getsize(source)}
+
+    def load(self):
+        try:
+            checkpoint = ImportCheckpoint.objects.get(pk=self.name)
+        except ImportCheckpoint.DoesNotExist:
+            return {'records': 0, 'imported': 0, 'rejected': 0}
+        if {key: getattr(checkpoint, key) for key in self.identity} != self.identity:
+            raise ImportFileError(f"Checkpoint {self.name} belongs to another import")
+        return {key: getattr(checkpoint, key) for key in ('records', 'imported', 'rejected')}
+
+    def save(self, state, finished=False):
+        ImportCheckpoint.objects.update_or_create(
+            name=self.name, defaults={**self.identity, **state, 'finished': finished},
+        )
+
+
+def import_file(
+    kind, path, format=None, workers=0, batch_size=BATCH_SIZE, transaction_rows=TRANSACTION_ROWS,
+    resume=False, checkpoint=None, rejects_path=None,
+):
+    """Import ``path`` into ``kind``; yield the running totals after each transaction.
+
+    Totals are ``{'records', 'imported', 'rejected'}`` over the whole
+    import, resumed parts included, and ``read``: the records read by this
+    call. ``checkpoint`` names the saved progress, by default the file's
+    absolute path.
+    """
+    if kind not in KINDS:
+        raise ImportFileError(f"Unknown kind '{kind}'; expected one of {', '.join(KINDS)}")
+    format = format or detect_format(path)
+    if format not in FORMATS:
+        raise ImportFileError(f"Unknown format '{format}'; expected one of {', '.join(FORMATS)}")
+    if not os.path.exists(path):
+        raise ImportFileError(f"No such file: {path}")
+
+    source = os.path.abspath(path)
+    checkpoint = Checkpoint(checkpoint or source, kind, source)
+    state = checkpoint.load() if resume else {'records': 0, 'imported': 0, 'rejected': 0}
+    batches_per_transaction = max(1, transaction_rows // batch_size)
+    read = 0
+
+    with open(path, newline='', encoding='utf-8') as source:
+        header, records = read_records(source, format)
+        batches = numbered_batches(records, batch_size, skip=state['records'])
+        clean = partial(clean_batch, kind, format, header)
+        pool = multiprocessing.Pool(workers, initializer=_init_worker) if workers else None
+        rejects = RejectFile(rejects_path or f'{path}.rejects.{format}', format, header, append=resume)
+        try:
+            # Workers only clean; they never touch the database
+            cleaned = cleaned_batches(batches, clean, pool, in_flight=2 * workers)
+            writer = WRITERS[kind]()
+            with keep_timestamps(), load_pragmas(IMPORT_PRAGMAS):
+                while True:
+                    batch_rejects = []
+                    records_read = 0
+                    with transaction.atomic():
+                        now = timezone.now()
+                        for (first, records), (count, rows, cleaning_rejects) in islice(cleaned, batches_per_transaction):
+                            records_read += count
+                            imported, writing_rejects = writer.write(rows, now)
+                            state['imported'] += imported
+                            batch_rejects += cleaning_rejects
+                            batch_rejects += [
+                                (number, _data(format, header, records[number - first]), message)
+                                for number, message in writing_rejects
+                            ]
+                        if not records_read:
+                            break
+                        state['records'] += records_read
+                        state['rejected'] += len(batch_rejects)
+                        checkpoint.save(state)
+                    batch_rejects.sort(key=lambda reject: reject[0])
+                    rejects.write(batch_rejects)
+                    read += records_read
+                    yield {**state, 'read': read}
+        finally:
+            rejects.close()
+            if pool:
+                pool.terminate()
+            for model in (Customer, Product, Order):
+                invalidate_model(model)
+    checkpoint.save(state, finished=True)
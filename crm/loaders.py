@@ -0,0 +1,137 @@
+"""Per-request batch loaders for the relations exposed by the CRM types.
+
+GraphQLView executes the schema synchronously, so instead of deferring
+loads to an event loop the list and connection resolvers *prime* the
+loaders with every node they return. The first ``load()`` for a relation
+then fetches all primed keys in one query and serves the siblings from
+the cache. Under the async view sibling fields resolve on several pool
+threads at once, so ``load()`` is serialized per loader.
+"""
+import threading
+
+from .models import Customer, CustomerStats, Product, Order, OrderItem
+
+
+class Loader:
+    """Collects keys and resolves them with a single batch function call"""
+
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._cache = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def prime(self, key):
+        with self._lock:
+            if key not in self._cache:
+                self._pending[key] = None
+
+    def load(self, key):
+        with self._lock:
+            if key not in self._cache:
+                self._pending[key] = None
+                keys = list(self._pending)
+                self._cache.update(self.batch_load_fn(keys))
+                for loaded in keys:
+                    self._pending.pop(loaded, None)
+            return self._cache.get(key)
+
+
+class Loaders:
+    """The loaders for one GraphQL request"""
+
+    def __init__(self):
+        self.customer = Loader(self._load_customers)
+        self.customer_orders = Loader(self._load_customer_orders)
+        self.customer_stats = Loader(self._load_customer_stats)
+        self.order_items = Loader(self._load_order_items)
+        self.order_products = Loader(self._load_order_products)
+        self.product_orders = Loader(self._load_product_orders)
+
+    def prime(self, nodes):
+        """Queue the relation keys of ``nodes`` so siblings load together"""
+        for node in nodes:
+            if isinstance(node, Order):
+                if not Order.customer.is_cached(node):
+                    self.customer.prime(node.customer_id)
+                prefetched = getattr(node, '_prefetched_objects_cache', {})
+                if 'products' not in prefetched:
+                    self.order_products.prime(node.pk)
+                if 'items' not in prefetched:
+                    self.order_items.prime(node.pk)
+            elif isinstance(node, Customer):
+                self.customer_orders.prime(node.pk)
+                self.customer_stats.prime(node.pk)
+            elif isinstance(node, Product):
+                self.product_orders.prime(node.pk)
+
+    def _load_customers(self, keys):
+        customers = Customer.objects.in_bulk(keys)
+        self.prime(customers.values())
+        return customers
+
+    def _load_customer_orders(self, keys):
+        result = {key: [] for key in keys}
+        for order in Order.objects.filter(customer_id__in=keys).order_by('pk'):
+            result[order.customer_id].append(order)
+        for orders in result.values():
+            self.prime(orders)
+        return result
+
+    def _load_customer_stats(self, keys):
+        # Customers without orders have no row; cache the miss as well
+        stats = CustomerStats.objects.in_bulk(keys)
+        return {key: stats.get(key) for key in keys}
+
+    def _load_order_items(self, keys):
+        result = {key: [] for key in keys}
+        for item in OrderItem.objects.filter(order_id__in=keys).select_related('product').order_by('product_id'):
+            result[item.order_id].append(item)
+        self.prime([item.product for items in result.values() for item in items])
+        return result
+
+    def _load_order_products(self, keys):
+        result = {key: [] for key in keys}
+        rows = (
+            OrderItem.objects
+            .filter(order_id__in=keys)
+            .select_related('product')
+            .order_by('product_id')
+        )
+        for row in rows:
+            result[row.order_id].append(row.product)
+        for products in result.values():
+            self.prime(products)
+        return result
+
+    def _load_product_orders(self, keys):
+        result = {key: [] for key in keys}
+        rows = (
+            OrderItem.objects
+            .filter(product_id__in=keys)
+            .select_related('order')
+            .order_by('order_id')
+        )
+        for row in rows:
+            result[row.product_id].append(row.order)
+        for orders in result.values():
+            self.prime(orders)
+        return result
+
+
+def get_loaders(context):
+    """Return the loaders attached to the GraphQL context, creating them once"""
+    if context is None:
+        return Loaders()
+    loaders = getattr(context, 'crm_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        setattr(context, 'crm_loaders', loaders)
+    return loaders
+
+
+def prime_nodes(info, nodes):
+    """Materialize ``nodes`` and prime the request loaders with them"""
+    nodes = list(nodes)
+    get_loaders(info.context).prime(nodes)
+    return nodes
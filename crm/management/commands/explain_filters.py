@@ -0,0 +1,106 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from crm.query_plans import filter_queries, full_scans
+from crm.sales import rebuild_sales
+from crm.stats import rebuild_customer_stats
+
+POPULATE_SQL = [
+    # customers: one per 10 orders, spread over the last year
+    """
+    INSERT INTO crm_customer (name, email, phone, created_at)
+    WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < %(customers)s)
+    SELECT 'Customer ' || i,
+           'explain-' || ((SELECT COALESCE(MAX(id), 0) FROM crm_customer) + i) || '@example.com',
+           '+1555' || printf('%%07d', i),
+           strftime('%%Y-%%m-%%d %%H:%%M:%%S', 'now', '-' || (i %% 365) || ' days')
+    FROM seq
+    """,
+    """
+    INSERT INTO crm_product (name, price, stock, created_at)
+    WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < %(products)s)
+    SELECT 'Product ' || i, (i %% 500) + 0.99, i %% 50,
+           strftime('%%Y-%%m-%%d %%H:%%M:%%S', 'now', '-' || (i %% 365) || ' days')
+    FROM seq
+    """,
+    """
+    INSERT INTO crm_order (customer_id, total_amount, order_date)
+    WITH RECURSIVE seq(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM seq WHERE i < %(orders)s)
+    SELECT (SELECT MAX(id) FROM crm_customer) - %(customers)s + 1 + abs(random()) %% %(customers)s,
+           (abs(random()) %% 50000) / 100.0,
+           strftime('%%Y-%%m-%%d %%H:%%M:%%S', 'now', '-' || (abs(random()) %% 730) || ' days')
+    FROM seq
+    """,
+    # two distinct products per new order, one unit each at the current price
+    """
+    INSERT INTO crm_orderitem (order_id, product_id, quantity, unit_price)
+    SELECT i.order_id, i.product_id, 1, pr.price
+    FROM (
+        SELECT o.id AS order_id, p.first + (o.id + k.k) %% %(products)s AS product_id
+        FROM crm_order o,
+             (SELECT 0 AS k UNION ALL SELECT 1) k,
+             (SELECT MAX(id) - %(products)s + 1 AS first FROM crm_product) p
+        WHERE o.id > (SELECT MAX(id) FROM crm_order) - %(orders)s
+    ) i
+    JOIN crm_product pr ON pr.id = i.product_id
+    """,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the SQLite EXPLAIN QUERY PLAN and timing of every filter path, '
+        'failing if one reads a table without an index'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--populate', type=int, metavar='ORDERS',
+            help='First insert ORDERS orders (1000000 for the reference run), '
+                 'ORDERS/10 customers and 1000 products into the configured database',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN checks are SQLite specific')
+
+        if options['populate']:
+            self.populate(options['populate'])
+
+        with connection.cursor() as cursor:
+            for table in ('crm_customer', 'crm_product', 'crm_order'):
+                cursor.execute(f'SELECT COUNT(*) FROM {table}')
+                self.stdout.write(f"{table}: {cursor.fetchone()[0]} rows")
+
+        failures = []
+        for label, queryset in filter_queries():
+            plan, scans = full_scans(label, queryset)
+            started = time.perf_counter()
+            rows = queryset.count()
+            elapsed = (time.perf_counter() - started) * 1000
+
+            status = self.style.ERROR('FULL SCAN ' + ', '.join(scans)) if scans else self.style.SUCCESS('indexed')
+            self.stdout.write(f"\n{label}: {status}, {rows} rows counted in {elapsed:.1f} ms")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+            if scans:
+                failures.append(label)
+
+        if failures:
+            raise CommandError(f"Unindexed filter paths: {', '.join(failures)}")
+
+    def populate(self, orders):
+        params = {'orders': orders, 'customers': max(orders // 10, 1), 'products': 1000}
+        started = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sql in POPULATE_SQL:
+                cursor.execute(sql % params)
+        # The raw inserts bypass the incremental stats and rollup updates
+        rebuild_customer_stats()
+        rebuild_sales()
+        with connection.cursor() as cursor:
+            # Plans at this size should come from real statistics
+            cursor.execute('ANALYZE')
+        self.stdout.write(f"Inserted {orders} orders in {time.perf_counter() - started:.1f}s")
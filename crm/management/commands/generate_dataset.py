@@ -0,0 +1,59 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.dataset import DEFAULT_ITEMS_PER_ORDER, generate_dataset, parse_items_per_order
+
+
+class Command(BaseCommand):
+    help = (
+        'Insert a reproducible synthetic dataset of customers, products and orders '
+        'with multi-row inserts in large transactions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=40000)
+        parser.add_argument(
+            '--items-per-order', default=','.join(f'{k}:{v}' for k, v in DEFAULT_ITEMS_PER_ORDER.items()),
+            help='Products per order as COUNT:WEIGHT pairs (default %(default)s)',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=730, help='Span of the generated timestamps')
+        parser.add_argument(
+            '--end', type=datetime.fromisoformat,
+            help='Last day of the span, YYYY-MM-DD (default today, UTC); pin it to reproduce a dataset later',
+        )
+
+    def handle(self, *args, **options):
+        for name in ('customers', 'products', 'orders', 'days'):
+            if options[name] < 0:
+                raise CommandError(f'--{name} must not be negative')
+        try:
+            items_per_order = parse_items_per_order(options['items_per_order'])
+        except ValueError as e:
+            raise CommandError(f'--items-per-order: {e}')
+        end = options['end']
+        if end is not None and end.tzinfo is None:
+            end = end.replace(tzinfo=dt_timezone.utc)
+
+        started = time.perf_counter()
+        try:
+            phases = generate_dataset(
+                options['customers'], options['products'], options['orders'],
+                items_per_order=items_per_order, seed=options['seed'], days=options['days'], end=end,
+            )
+            for phase, counts, seconds in phases:
+                line = f"{phase}: "
+                if counts:
+                    rows = sum(counts.values())
+                    line += ', '.join(f'{count} {table}' for table, count in counts.items())
+                    line += f" in {seconds:.1f}s ({rows / seconds if seconds else 0:.0f} rows/s)"
+                else:
+                    line += f"{seconds:.1f}s"
+                self.stdout.write(line)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Generated the dataset in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.imports import BATCH_SIZE, FORMATS, KINDS, TRANSACTION_ROWS, ImportFileError, import_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Import customers, products or orders from a CSV or NDJSON file, validated like the '
+        'mutations and written with bulk_create in large transactions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--workers', type=int, default=0, help='Processes cleaning batches (default: none)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Records per cleaning batch')
+        parser.add_argument(
+            '--transaction-rows', type=int, default=TRANSACTION_ROWS,
+            help='Records per transaction and checkpoint',
+        )
+        parser.add_argument('--resume', action='store_true', help='Continue after the last checkpoint')
+        parser.add_argument('--checkpoint', help='Name of the saved progress (default: the absolute PATH)')
+        parser.add_argument('--rejects', help='Rejected records with their errors (default: PATH.rejects.FORMAT)')
+
+    def handle(self, *args, **options):
+        for name in ('batch_size', 'transaction_rows'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive")
+        if options['workers'] < 0:
+            raise CommandError('--workers must not be negative')
+
+        started = time.perf_counter()
+        totals = None
+        try:
+            for totals in import_file(
+                options['kind'], options['path'], format=options['format'], workers=options['workers'],
+                batch_size=options['batch_size'], transaction_rows=options['transaction_rows'],
+                resume=options['resume'], checkpoint=options['checkpoint'], rejects_path=options['rejects'],
+            ):
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f"{totals['records']} records: {totals['imported']} imported, {totals['rejected']} rejected"
+                    )
+        except ImportFileError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        if totals is None:
+            self.stdout.write(f"Nothing to import from {options['path']}")
+            return
+        self.stdout.write(
+            f"Imported {totals['imported']} {options['kind']} and rejected {totals['rejected']} of "
+            f"{totals['records']} records in {elapsed:.2f}s "
+            f"({totals['read'] / elapsed if elapsed else 0:.0f} records/s)"
+        )
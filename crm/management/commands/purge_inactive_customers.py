@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm.purge import purge_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete customers with no orders in the last DAYS days, with their orders, '
+        'in keyset-ordered chunks of short transactions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Customers selected and deleted per transaction',
+        )
+        parser.add_argument(
+            '--max-seconds', type=float,
+            help='Stop after the chunk that crosses this budget; the next run continues',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Count what would be deleted')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        totals = {'items': 0, 'orders': 0, 'stats': 0, 'customer sales': 0, 'customers': 0}
+        chunks = 0
+        finished = True
+        started = time.perf_counter()
+        for counts in purge_chunks(cutoff, options['batch_size'], dry_run=options['dry_run']):
+            chunks += 1
+            for name, count in counts.items():
+                totals[name] += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f"chunk {chunks}: {counts['customers']} customers, {counts['orders']} orders")
+            if options['max_seconds'] is not None and time.perf_counter() - started >= options['max_seconds']:
+                finished = False
+                break
+        elapsed = time.perf_counter() - started
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(
+            f"{verb} {totals['customers']} inactive customers, {totals['orders']} orders and "
+            f"{totals['items']} order items in {chunks} chunks, {elapsed:.2f}s "
+            f"({totals['customers'] / elapsed if elapsed else 0:.0f} customers/s)"
+            + ('' if finished else '; stopped at --max-seconds')
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from crm.documents import persisted_queries
+from crm.operations import OPERATIONS
+
+
+class Command(BaseCommand):
+    help = 'Register the CRM job operations (and any .graphql files given) as persisted queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='Additional .graphql files, one operation per file')
+
+    def handle(self, *args, **options):
+        queries = list(OPERATIONS)
+        for path in options['files']:
+            with open(path) as f:
+                queries.append(f.read())
+
+        for digest in persisted_queries.register(queries):
+            self.stdout.write(digest)
+        self.stdout.write(self.style.SUCCESS(
+            f"Registered {len(queries)} persisted queries in {persisted_queries.path}"
+        ))
@@ -0,0 +1,77 @@
+import getpass
+import os
+from urllib.parse import urljoin
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from crm.client import get_config
+from crm.views import resolver_timings
+
+
+def sign_in(session, root, username, password, timeout):
+    """Sign ``session`` in through the admin login form at ``root``"""
+    login_url = urljoin(root, reverse('admin:login'))
+    session.get(login_url, timeout=timeout).raise_for_status()
+    response = session.post(
+        login_url,
+        data={
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+        },
+        headers={'Referer': login_url},
+        timeout=timeout,
+        allow_redirects=False,
+    )
+    # The form is shown again on a failed sign-in
+    if response.status_code != 302:
+        raise CommandError(f"Could not sign in to {login_url} as staff user {username}")
+
+
+class Command(BaseCommand):
+    help = 'Dump the per-resolver timing histogram of a running GraphQL server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Server root; defaults to that of CRM_GRAPHQL_CLIENT['URL']")
+        parser.add_argument(
+            '--username', required=True,
+            help='Staff user to sign in as; the password is read from CRM_STAFF_PASSWORD or prompted for',
+        )
+        parser.add_argument('--limit', type=int, default=20, help='Slowest paths to show (by p95)')
+
+    def handle(self, *args, **options):
+        config = get_config()
+        # The histogram lives in the server process, so never in process here
+        root = options['url'] or urljoin(config['URL'], '/')
+        password = os.environ.get('CRM_STAFF_PASSWORD') or getpass.getpass(f"Password for {options['username']}: ")
+        try:
+            with requests.Session() as session:
+                sign_in(session, root, options['username'], password, config['TIMEOUT'])
+                response = session.get(
+                    urljoin(root, reverse(resolver_timings)), timeout=config['TIMEOUT'], allow_redirects=False,
+                )
+                if response.status_code != 200:
+                    raise CommandError(f"{options['username']} may not read the resolver timings")
+                timings = response.json()['timings']
+        except (requests.RequestException, ValueError) as e:
+            raise CommandError(f"Resolver timings endpoint error: {e}")
+
+        if not timings:
+            self.stdout.write("No traced operations; set GRAPHQL_TRACING['RECORD'] = True")
+            return
+
+        self.stdout.write(
+            f"{'path':<48} {'ops':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'sql/op':>7} {'db ms':>8}"
+        )
+        for row in timings[:options['limit']]:
+            self.stdout.write(
+                f"{row['path']:<48} {row['count']:>6} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                f"{row['max_ms']:>9.2f} {row['sql_queries']:>7.1f} {row['db_ms']:>8.2f}"
+            )
+            buckets = '  '.join(
+                f"{'<=' + format(bucket['le_ms'], 'g') if bucket['le_ms'] is not None else '>'}: {bucket['count']}"
+                for bucket in row['buckets']
+            )
+            self.stdout.write(f"    {buckets}")
@@ -0,0 +1,130 @@
+import json
+import platform
+import sqlite3
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from crm.benchmarks import (
+    MODES, SEARCH_BACKENDS, THREADED_MODES, VIEW_MODES, anchors, benchmark_operations, compare, dataset_counts,
+    graphql_benchmarks, measure, search_benchmarks, view_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every Query and Mutation field in process and through the test client, the '
+        'LIKE and FTS5 search backends and the sync and async views, failing on regressions '
+        'against the stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generate', action='store_true',
+            help='First insert a dataset with generate_dataset (see --customers, --products, --orders)',
+        )
+        parser.add_argument('--customers', type=int, default=100000)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=400000)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', help='Run the benchmarks whose name contains this text')
+        parser.add_argument('--mode', choices=MODES + SEARCH_BACKENDS + VIEW_MODES, help='Run one path only')
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help='Requests per run of the view benchmarks, all in flight at once on the async view',
+        )
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmark_baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the baseline')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Allowed p50 latency and peak memory growth over the baseline (default %(default)s)',
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be positive')
+        baseline = None if options['save_baseline'] else self.load_baseline(options['baseline'])
+        if options['generate']:
+            call_command(
+                'generate_dataset', customers=options['customers'], products=options['products'],
+                orders=options['orders'], end=datetime(2026, 1, 1, tzinfo=dt_timezone.utc), stdout=self.stdout,
+            )
+
+        try:
+            anchor = anchors()
+        except ValueError as e:
+            raise CommandError(f'{e}; run with --generate')
+        benchmarks = (
+            graphql_benchmarks(benchmark_operations(anchor))
+            + search_benchmarks(anchor)
+            + view_benchmarks(options['concurrency'])
+        )
+        if options['only']:
+            benchmarks = [benchmark for benchmark in benchmarks if options['only'] in benchmark[0]]
+
+        results = {}
+        self.stdout.write(
+            f"{'benchmark':<42} {'mode':<7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9}"
+        )
+        # Production settings: DEBUG would log (and quote) every statement,
+        # and tracing would time every resolver
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], GRAPHQL_TRACING={'RECORD': False}):
+            for name, runs in benchmarks:
+                for mode, run in runs.items():
+                    if options['mode'] and mode != options['mode']:
+                        continue
+                    try:
+                        result = measure(
+                            run, options['iterations'], options['warmup'], count_queries=mode not in THREADED_MODES,
+                        )
+                    except ValueError as e:
+                        raise CommandError(f"{name} [{mode}] failed: {e}")
+                    results.setdefault(name, {})[mode] = result
+                    queries = '-' if result['queries'] is None else result['queries']
+                    self.stdout.write(
+                        f"{name:<42} {mode:<7} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                        f"{result['p99_ms']:>9.2f} {queries:>8} {result['peak_kb']:>9.1f}"
+                    )
+
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'iterations': options['iterations'],
+            },
+            'dataset': dataset_counts(),
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump(report, baseline_file, indent=2)
+            self.stdout.write(f"Saved the baseline to {options['baseline']}")
+            return
+
+        if baseline['dataset'] != report['dataset']:
+            raise CommandError(
+                f"The baseline was recorded on a different dataset ({baseline['dataset']}, "
+                f"now {report['dataset']}); regenerate it or the baseline"
+            )
+        regressions = compare(results, baseline['results'], tolerance=options['tolerance'])
+        if regressions:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as baseline_file:
+                return json.load(baseline_file)
+        except FileNotFoundError:
+            raise CommandError(f"No baseline at {path}; record one on this machine with --save-baseline")
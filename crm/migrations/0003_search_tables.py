@@ -0,0 +1,55 @@
+from django.db import migrations
+
+# FTS5 trigram indexes over the searchable text columns, as external
+# content tables of the model tables. Triggers keep them in sync for every
+# write path, including bulk_create and raw SQL, which send no signals.
+SEARCH_TABLES = [
+    ('crm_customer', 'crm_customer_search', ['name', 'email']),
+    ('crm_product', 'crm_product_search', ['name']),
+]
+
+
+def create_sql(source, table, columns):
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {table} USING fts5("
+        f"{names}, content='{source}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER {table}_insert AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {table}_delete AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {table}_update AFTER UPDATE OF {names} ON {source} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {table}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+    ]
+
+
+def drop_sql(source, table, columns):
+    return [
+        *(f"DROP TRIGGER IF EXISTS {table}_{event}" for event in ('insert', 'delete', 'update')),
+        f"DROP TABLE IF EXISTS {table}",
+    ]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for source, table, columns in SEARCH_TABLES:
+            for sql in statements(source, table, columns):
+                schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(create_sql), run(drop_sql)),
+    ]
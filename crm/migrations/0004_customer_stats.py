@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:05
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill(apps, schema_editor):
+    Order = apps.get_model('crm', 'Order')
+    CustomerStats = apps.get_model('crm', 'CustomerStats')
+    totals = (
+        Order.objects.order_by().values('customer_id')
+        .annotate(order_count=Count('pk'), lifetime_value=Sum('total_amount'), last_order_at=Max('order_date'))
+    )
+    CustomerStats.objects.bulk_create((CustomerStats(**row) for row in totals.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_search_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='crm.customer')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order_count'], name='crm_stats_order_count_idx'), models.Index(fields=['lifetime_value'], name='crm_stats_lifetime_value_idx'), models.Index(fields=['last_order_at'], name='crm_stats_last_order_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
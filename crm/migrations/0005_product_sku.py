@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-17 08:23
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_tables = import_module('crm.migrations.0003_search_tables')
+
+
+def rebuild_product_search(apps, schema_editor):
+    # Adding or removing a unique column remakes crm_product on SQLite, which
+    # drops the triggers of its search table
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for source, table, columns in search_tables.SEARCH_TABLES:
+        if source == 'crm_product':
+            for sql in search_tables.drop_sql(source, table, columns) + search_tables.create_sql(source, table, columns):
+                schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_customer_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, rebuild_product_search),
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(rebuild_product_search, migrations.RunPython.noop),
+    ]
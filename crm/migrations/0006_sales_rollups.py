@@ -0,0 +1,117 @@
+# Generated by Django 5.2.1 on 2026-10-17 09:23
+
+import django.db.models.deletion
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill(apps, schema_editor):
+    # Models as of this migration: an order's products are its plain
+    # crm_order_products links, one unit each at the product's price
+    db = schema_editor.connection.alias
+    Order = apps.get_model('crm', 'Order')
+    Link = Order.products.through
+    DailySales = apps.get_model('crm', 'DailySales')
+    DailyCustomerSales = apps.get_model('crm', 'DailyCustomerSales')
+    DailyProductSales = apps.get_model('crm', 'DailyProductSales')
+
+    customers = {}
+    orders = (
+        Order.objects.using(db)
+        .values(day=TruncDate('order_date', tzinfo=dt_timezone.utc), customer_pk=F('customer_id'))
+        .order_by()
+        .annotate(orders=Count('pk'), total=Sum('total_amount'))
+    )
+    for row in orders:
+        customers[(row['day'], row['customer_pk'])] = [row['orders'], row['total'], 0]
+    links = (
+        Link.objects.using(db)
+        .values(day=TruncDate('order__order_date', tzinfo=dt_timezone.utc), customer_pk=F('order__customer_id'))
+        .order_by()
+        .annotate(quantity=Count('pk'))
+    )
+    for row in links:
+        customers[(row['day'], row['customer_pk'])][2] = row['quantity']
+    DailyCustomerSales.objects.using(db).bulk_create([
+        DailyCustomerSales(date=day, customer_id=customer_id, order_count=count, revenue=revenue, units=units)
+        for (day, customer_id), (count, revenue, units) in customers.items()
+    ], batch_size=500)
+
+    products = (
+        Link.objects.using(db)
+        .values(day=TruncDate('order__order_date', tzinfo=dt_timezone.utc), product_pk=F('product_id'))
+        .order_by()
+        .annotate(orders=Count('pk'), total=Sum('product__price'))
+    )
+    DailyProductSales.objects.using(db).bulk_create([
+        DailyProductSales(
+            date=row['day'], product_id=row['product_pk'],
+            order_count=row['orders'], revenue=row['total'], units=row['orders'],
+        )
+        for row in products
+    ], batch_size=500)
+
+    # A day's totals are the sums of its customers' rows
+    days = {}
+    for (day, _), (count, revenue, units) in customers.items():
+        total = days.setdefault(day, [0, Decimal('0.00'), 0])
+        total[0] += count
+        total[1] += revenue
+        total[2] += units
+    DailySales.objects.using(db).bulk_create([
+        DailySales(date=day, order_count=count, revenue=revenue, units=units)
+        for day, (count, revenue, units) in days.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_product_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCustomerSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='crm.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', 'date', 'order_count', 'revenue', 'units'], name='crm_customer_sales_cust_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'customer'), name='crm_customer_sales_day_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='crm.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'date', 'order_count', 'revenue', 'units'], name='crm_product_sales_prod_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='crm_product_sales_day_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
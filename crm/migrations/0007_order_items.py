@@ -0,0 +1,62 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_links(apps, schema_editor):
+    # The links never recorded quantities or prices: one unit each, at the
+    # product's current price
+    schema_editor.execute(
+        "INSERT INTO crm_orderitem (order_id, product_id, quantity, unit_price) "
+        "SELECT l.order_id, l.product_id, 1, p.price "
+        "FROM crm_order_products l JOIN crm_product p ON p.id = l.product_id"
+    )
+
+
+def copy_items(apps, schema_editor):
+    schema_editor.execute(
+        "INSERT INTO crm_order_products (order_id, product_id) SELECT order_id, product_id FROM crm_orderitem"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='crm.order')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='crm.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'order'], name='crm_order_item_product_idx')],
+                'constraints': [
+                    models.UniqueConstraint(fields=('order', 'product'), name='crm_order_item_uniq'),
+                    models.CheckConstraint(condition=models.Q(('quantity__gte', 1)), name='crm_order_item_quantity_gte_1'),
+                ],
+            },
+        ),
+        migrations.RunPython(copy_links, copy_items),
+        # A through model cannot be added to an existing M2M field: drop the
+        # auto-created table (with the index 0002 added to it) and redeclare
+        migrations.RunSQL(
+            'DROP INDEX "crm_order_products_product_order_idx"',
+            reverse_sql='CREATE INDEX "crm_order_products_product_order_idx" '
+                        'ON "crm_order_products" ("product_id", "order_id")',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='products',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='products',
+            field=models.ManyToManyField(related_name='orders', through='crm.OrderItem', to='crm.product'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Collate
 from django.core.validators import RegexValidator
 from decimal import Decimal
 
@@ -12,6 +14,15 @@ class Customer(models.Model):
     phone = models.CharField(validators=[phone_regex], max_length=17, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # created_at range filters and the keyset order of allCustomers
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_idx'),
+            # phone__startswith compiles to a case-insensitive LIKE on SQLite,
+            # which can only use a NOCASE index
+            models.Index(Collate('phone', 'NOCASE'), name='crm_customer_phone_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} ({self.email})"
 
@@ -19,20 +30,153 @@ class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Stock keeping unit of the source catalogue; imports resolve order lines by it
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='crm_product_created_idx'),
+            models.Index(fields=['price'], name='crm_product_price_idx'),
+            models.Index(fields=['stock'], name='crm_product_stock_idx'),
+            # low_stock filter and updateLowStockProducts' default threshold
+            models.Index(fields=['stock'], condition=Q(stock__lt=10), name='crm_product_low_stock_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.name} - ${self.price}"
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    products = models.ManyToManyField(Product, related_name='orders')
+    products = models.ManyToManyField(Product, through='OrderItem', related_name='orders')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     order_date = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_idx'),
+            models.Index(fields=['total_amount'], name='crm_order_total_idx'),
+            # a customer's latest order, for the inactive-customer sweep
+            models.Index(fields=['customer', 'order_date'], name='crm_order_customer_date_idx'),
+        ]
+    
     def __str__(self):
         return f"Order {self.id} - {self.customer.name} - ${self.total_amount}"
     
     def calculate_total(self):
-        """Calculate total amount based on associated products"""
-        return sum(product.price for product in self.products.all())
\ No newline at end of file
+        """Sum the order's lines at their recorded prices, in one query"""
+        total = self.items.aggregate(total=Sum(F('quantity') * F('unit_price')))['total']
+        # SQLite returns the product's full precision
+        return (total or Decimal('0')).quantize(Decimal('0.01'))
+
+class OrderItem(models.Model):
+    """One product line of an order: the units bought and the price of each"""
+    # Indexed first in crm_order_item_uniq
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', db_index=False)
+    # Indexed first in crm_order_item_product_idx
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items', db_index=False)
+    quantity = models.PositiveIntegerField(default=1)
+    # The product's price when the order was placed
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='crm_order_item_uniq'),
+            models.CheckConstraint(condition=Q(quantity__gte=1), name='crm_order_item_quantity_gte_1'),
+        ]
+        indexes = [
+            # productId/productName order filters and the product_orders loader
+            models.Index(fields=['product', 'order'], name='crm_order_item_product_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Order {self.order_id}: {self.quantity} x product {self.product_id} at ${self.unit_price}"
+
+class CustomerStats(models.Model):
+    """Order aggregates of one customer, maintained by ``crm.stats``"""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    last_order_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_count'], name='crm_stats_order_count_idx'),
+            models.Index(fields=['lifetime_value'], name='crm_stats_lifetime_value_idx'),
+            models.Index(fields=['last_order_at'], name='crm_stats_last_order_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.customer_id}: {self.order_count} orders, ${self.lifetime_value}"
+
+class DailySales(models.Model):
+    """Orders, revenue and units sold on one (UTC) day, maintained by ``crm.sales``"""
+    date = models.DateField(primary_key=True)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    units = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date}: {self.order_count} orders, ${self.revenue}"
+
+class DailyProductSales(models.Model):
+    """Orders of one product on one day, the units sold and their revenue"""
+    date = models.DateField()
+    # Indexed first in crm_product_sales_prod_idx
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales', db_index=False)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    units = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            # Also serves the date range scans of topProducts
+            models.UniqueConstraint(fields=['date', 'product'], name='crm_product_sales_day_uniq'),
+        ]
+        indexes = [
+            # Covering: per product totals are summed without reading the table
+            models.Index(
+                fields=['product', 'date', 'order_count', 'revenue', 'units'], name='crm_product_sales_prod_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} product {self.product_id}: {self.units} units, ${self.revenue}"
+
+class DailyCustomerSales(models.Model):
+    """Orders of one customer on one day, the units bought and their revenue"""
+    date = models.DateField()
+    # Indexed first in crm_customer_sales_cust_idx
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='daily_sales', db_index=False)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    units = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'customer'], name='crm_customer_sales_day_uniq'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['customer', 'date', 'order_count', 'revenue', 'units'], name='crm_customer_sales_cust_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} customer {self.customer_id}: {self.order_count} orders, ${self.revenue}"
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of a resumable ``import_crm`` run, saved in the transaction of the rows it counts"""
+    name = models.CharField(max_length=500, primary_key=True)
+    kind = models.CharField(max_length=20)
+    source = models.TextField()
+    size = models.PositiveBigIntegerField()
+    records = models.PositiveBigIntegerField(default=0)
+    imported = models.PositiveBigIntegerField(default=0)
+    rejected = models.PositiveBigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name}: {self.records} records read"
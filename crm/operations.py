@@ -0,0 +1,41 @@
+"""GraphQL operations sent by the CRM's own jobs.
+
+Kept in one module so the ``register_persisted_queries`` command can
+preload them into the persisted query registry.
+"""
+
+UPDATE_LOW_STOCK_MUTATION = """
+mutation UpdateLowStock {
+    updateLowStockProducts(returnProducts: false) {
+        success
+        message
+    }
+}
+"""
+
+RECENT_ORDERS_QUERY = """
+query RecentOrders($since: DateTime!, $first: Int!, $after: String) {
+    allOrders(orderDate_Gte: $since, first: $first, after: $after) {
+        pageInfo {
+            hasNextPage
+            endCursor
+        }
+        edges {
+            node {
+                id
+                orderDate
+                customer {
+                    email
+                    name
+                }
+                totalAmount
+            }
+        }
+    }
+}
+"""
+
+OPERATIONS = [
+    UPDATE_LOW_STOCK_MUTATION,
+    RECENT_ORDERS_QUERY,
+]
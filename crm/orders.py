@@ -0,0 +1,140 @@
+"""Order placement.
+
+``place_order`` runs in one (immediate, on SQLite) transaction: products are
+locked and fetched in a single query, stock is decremented with one
+conditional ``UPDATE`` and the order lines, with their quantities and unit
+prices, are written with ``bulk_create``. The total is then summed from the
+lines by the database with ``set_order_totals``, as on the bulk paths.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+
+from .cache import invalidate_instances
+from .models import Customer, Product, Order, OrderItem
+from .sales import record_sales
+from .stats import record_orders
+
+# Orders per UPDATE / IN (...) statement; keeps SQLite under its variable limit
+TOTALS_BATCH_SIZE = 500
+
+
+class OrderError(Exception):
+    """An order that cannot be placed; the message is returned to the client"""
+
+
+def quantity_expression(quantities):
+    """Map each product pk in ``quantities`` to its requested quantity in SQL"""
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def parse_product_ids(product_ids):
+    """Count the requested units per product pk"""
+    quantities = Counter()
+    for product_id in product_ids:
+        try:
+            quantities[int(product_id)] += 1
+        except (TypeError, ValueError):
+            raise OrderError(f"Invalid product ID: {product_id}")
+    return quantities
+
+
+def parse_order_lines(product_ids=None, items=None):
+    """Count the requested units per product pk of an order.
+
+    ``product_ids`` lists one unit per id; ``items`` are mappings with a
+    ``product_id`` and its ``quantity``. Either or both may be given.
+    """
+    quantities = parse_product_ids(product_ids or ())
+    for item in items or ():
+        product_id, quantity = item.get('product_id'), item.get('quantity')
+        try:
+            pk = int(product_id)
+        except (TypeError, ValueError):
+            raise OrderError(f"Invalid product ID: {product_id}")
+        if not isinstance(quantity, int) or quantity < 1:
+            raise OrderError(f"Quantity must be at least 1 for product {pk}")
+        quantities[pk] += quantity
+    return quantities
+
+
+def set_order_totals(orders):
+    """Set the total of each of ``orders`` to the sum of its items, in SQL.
+
+    One ``UPDATE`` over ``Sum(quantity * unit_price)`` per chunk of orders,
+    then one query reading the totals back into the instances.
+    """
+    item_totals = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum(F('quantity') * F('unit_price')))
+        .values('total')
+    )
+    by_pk = {order.pk: order for order in orders}
+    pks = list(by_pk)
+    for start in range(0, len(pks), TOTALS_BATCH_SIZE):
+        chunk = pks[start:start + TOTALS_BATCH_SIZE]
+        Order.objects.filter(pk__in=chunk).update(total_amount=Subquery(item_totals))
+        for pk, total in Order.objects.filter(pk__in=chunk).values_list('pk', 'total_amount'):
+            by_pk[pk].total_amount = total
+
+
+def place_order(customer_id, product_ids=None, items=None):
+    """Create an order for ``customer_id`` from ``product_ids`` and ``items``.
+
+    Each listed product id is one unit, each item its ``quantity`` of
+    ``product_id`` (see ``parse_order_lines``); all units of a product
+    become one ``OrderItem``.
+
+    Raises ``OrderError`` and leaves the database untouched when the customer
+    or a product does not exist or a product is out of stock.
+    """
+    with transaction.atomic():
+        try:
+            customer = Customer.objects.get(pk=customer_id)
+        except Customer.DoesNotExist:
+            raise OrderError("Invalid customer ID")
+
+        quantities = parse_order_lines(product_ids, items)
+        if not quantities:
+            raise OrderError("At least one product must be provided")
+
+        products = Product.objects.select_for_update().in_bulk(list(quantities))
+        for pk, quantity in quantities.items():
+            if pk not in products:
+                raise OrderError(f"Invalid product ID: {pk}")
+            if products[pk].stock < quantity:
+                raise OrderError(f"Insufficient stock for product {pk}")
+
+        # The stock guard is repeated in SQL so a concurrent writer can never
+        # drive stock below zero, even where the row lock is advisory
+        required = quantity_expression(quantities)
+        updated = (
+            Product.objects.filter(pk__in=quantities, stock__gte=required)
+            .update(stock=F('stock') - required)
+        )
+        if updated != len(quantities):
+            raise OrderError("Insufficient stock")
+
+        # Inserted without signals, so its stats and rollups are recorded
+        # once it has been totalled from its items
+        order, = Order.objects.bulk_create([Order(customer=customer, total_amount=Decimal('0.00'))])
+        # The prices read under the lock
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pk, quantity=quantity, unit_price=products[pk].price)
+            for pk, quantity in quantities.items()
+        ])
+        set_order_totals([order])
+
+        record_orders([order])
+        record_sales([order], [(order, item.product_id, item.quantity, item.unit_price) for item in items])
+        invalidate_instances(Order, [order.pk])
+        invalidate_instances(Customer, [customer.pk])
+        invalidate_instances(Product, quantities)
+    return order
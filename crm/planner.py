@@ -0,0 +1,123 @@
+"""Shape list querysets after the GraphQL selection set that requested them.
+
+``optimize(queryset, info)`` walks ``info.field_nodes`` and turns the
+selected fields into ``only()`` columns, ``select_related()`` joins for
+foreign keys and ``Prefetch()`` objects for the to-many connections, so a
+list field costs one query per relation whatever its page size.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+# Arguments that only page a related connection; anything else filters it
+# and is resolved with its own queryset, so prefetching would be wasted.
+PAGINATION_ARGS = {'first', 'last', 'before', 'after', 'offset'}
+
+
+def iter_fields(info, selection_set):
+    """Yield the field nodes of a selection set, expanding fragments"""
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments[selection.name.value]
+            yield from iter_fields(info, fragment.selection_set)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from iter_fields(info, selection.selection_set)
+
+
+def node_selection_sets(info, field_nodes):
+    """Return the selection sets that apply to the model rows of a field.
+
+    For a connection these are the ``edges { node }`` selections, for a
+    plain list or object field the field's own selection set.
+    """
+    selection_sets = []
+    for field_node in field_nodes:
+        edges = [f for f in iter_fields(info, field_node.selection_set) if f.name.value == 'edges']
+        if not edges:
+            selection_sets.append(field_node.selection_set)
+            continue
+        for edge in edges:
+            for node in iter_fields(info, edge.selection_set):
+                if node.name.value == 'node':
+                    selection_sets.append(node.selection_set)
+    return selection_sets
+
+
+def _plan(model, info, selection_sets, prefix=''):
+    """Collect ``(only, select_related, prefetches, complete)`` for ``model``.
+
+    ``complete`` is False when a selected field is not a model field (a
+    custom resolver may need any column), in which case no column of this
+    model should be deferred.
+    """
+    only = {prefix + model._meta.pk.name}
+    related = []
+    prefetches = []
+    complete = True
+
+    # Foreign key columns are always kept so the loaders can read them
+    for field in model._meta.concrete_fields:
+        if field.many_to_one:
+            only.add(prefix + field.name)
+
+    # Group aliased selections of the same field so each relation is planned once
+    selected = {}
+    for selection_set in selection_sets:
+        for node in iter_fields(info, selection_set):
+            selected.setdefault(to_snake_case(node.name.value), []).append(node)
+
+    for name, nodes in selected.items():
+        if name in ('id', '__typename'):
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            complete = False
+            continue
+
+        if field.many_to_one or field.one_to_one:
+            nested = _plan(
+                field.related_model, info,
+                node_selection_sets(info, nodes), prefix + name + '__',
+            )
+            nested_only, nested_related, nested_prefetches, nested_complete = nested
+            only.add(prefix + name)
+            related.append(prefix + name)
+            related.extend(nested_related)
+            prefetches.extend(nested_prefetches)
+            if nested_complete:
+                only.update(nested_only)
+        elif field.many_to_many or field.one_to_many:
+            if any(arg.name.value not in PAGINATION_ARGS for node in nodes for arg in node.arguments):
+                continue
+            queryset = apply_plan(
+                field.related_model._default_manager.all(), info,
+                node_selection_sets(info, nodes),
+            )
+            prefetches.append(Prefetch(prefix + name, queryset=queryset))
+        else:
+            only.add(prefix + name)
+
+    return only, related, prefetches, complete
+
+
+def apply_plan(queryset, info, selection_sets):
+    """Apply the plan for ``selection_sets`` to ``queryset``"""
+    only, related, prefetches, complete = _plan(queryset.model, info, selection_sets)
+    if related:
+        queryset = queryset.select_related(*related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    if complete:
+        queryset = queryset.only(*only)
+    return queryset
+
+
+def optimize(queryset, info):
+    """Restrict ``queryset`` to the columns and relations ``info`` selects"""
+    return apply_plan(queryset, info, node_selection_sets(info, info.field_nodes))
@@ -0,0 +1,104 @@
+"""Chunked deletion of customers without recent orders.
+
+Django's ``QuerySet.delete()`` collects every customer, order and item row
+in memory to cascade and send signals, all inside one long write
+transaction. ``purge_chunks()`` instead walks the inactive customers in
+primary key order, ``batch_size`` at a time, and deletes each chunk's
+order items, orders, stats, customer sales rollups and customers with
+set-based ``DELETE`` statements in a transaction of its own, so memory
+stays flat and API writers only ever wait for one chunk. The purged orders
+are subtracted from the day and product sales rollups first.
+
+No ``post_delete`` signals are sent; each chunk evicts the resolver cache
+entries of the models it touched instead.
+"""
+from contextlib import nullcontext
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from .cache import invalidate_instances, invalidate_model
+from .models import Customer, CustomerStats, DailyCustomerSales, Order, OrderItem
+from .sales import subtract_customers_sales
+
+
+def inactive_customers(cutoff):
+    """Customers without an order since ``cutoff``"""
+    recent = Order.objects.filter(customer=OuterRef('pk'), order_date__gte=cutoff)
+    return Customer.objects.filter(~Exists(recent))
+
+
+def next_chunk(cutoff, after, batch_size):
+    """Ids of the next ``batch_size`` inactive customers after id ``after``"""
+    return list(
+        inactive_customers(cutoff).filter(pk__gt=after)
+        .order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+
+
+def _in(ids):
+    return '(' + ', '.join(['%s'] * len(ids)) + ')'
+
+
+def _count(cursor, sql, ids):
+    cursor.execute(sql, ids)
+    return cursor.fetchone()[0]
+
+
+def delete_customers(ids, dry_run=False):
+    """Delete customers ``ids`` with their orders; return the row counts.
+
+    With ``dry_run`` nothing is deleted and the counts are what would be.
+    """
+    qn = connection.ops.quote_name
+    item_order = qn(OrderItem._meta.get_field('order').column)
+    order_table = qn(Order._meta.db_table)
+    order_customer = qn(Order._meta.get_field('customer').column)
+    orders_of = f"SELECT {qn(Order._meta.pk.column)} FROM {order_table} WHERE {order_customer} IN {_in(ids)}"
+
+    # Children first: SQLite enforces the foreign keys
+    statements = [
+        ('items', qn(OrderItem._meta.db_table), f"{item_order} IN ({orders_of})"),
+        ('orders', order_table, f"{order_customer} IN {_in(ids)}"),
+        ('stats', qn(CustomerStats._meta.db_table),
+         f"{qn(CustomerStats._meta.pk.column)} IN {_in(ids)}"),
+        ('customer sales', qn(DailyCustomerSales._meta.db_table),
+         f"{qn(DailyCustomerSales._meta.get_field('customer').column)} IN {_in(ids)}"),
+        ('customers', qn(Customer._meta.db_table), f"{qn(Customer._meta.pk.column)} IN {_in(ids)}"),
+    ]
+    counts = {}
+    if not dry_run:
+        # Reads the customers' rollup rows and order items, so before they go
+        subtract_customers_sales(ids)
+    with connection.cursor() as cursor:
+        for name, table, where in statements:
+            if dry_run:
+                counts[name] = _count(cursor, f"SELECT COUNT(*) FROM {table} WHERE {where}", ids)
+            else:
+                cursor.execute(f"DELETE FROM {table} WHERE {where}", ids)
+                counts[name] = cursor.rowcount
+    return counts
+
+
+def purge_chunks(cutoff, batch_size, dry_run=False):
+    """Delete the customers inactive since ``cutoff`` chunk by chunk.
+
+    Yields the row counts of each chunk. Each chunk is selected and deleted
+    in one transaction, so a customer who orders in between is never
+    deleted; stopping between chunks leaves a consistent database for the
+    next run to continue.
+    """
+    after = 0
+    while True:
+        # A dry run must not take SQLite's write lock
+        with nullcontext() if dry_run else transaction.atomic():
+            ids = next_chunk(cutoff, after, batch_size)
+            if not ids:
+                return
+            counts = delete_customers(ids, dry_run=dry_run)
+            if not dry_run:
+                invalidate_instances(Customer, ids)
+                # Evicts every product and customer entry listing the deleted orders
+                invalidate_model(Order)
+        after = ids[-1]
+        yield counts
@@ -0,0 +1,67 @@
+"""The queries behind each filter path, for checking their SQLite plans.
+
+``filter_queries()`` builds every filter of ``crm.filters`` (plus the keyset
+pages and the inactive-customer purge) through the real FilterSets, and
+``full_scans()`` lists the tables a query's ``EXPLAIN QUERY PLAN`` reads
+without an index. Used by the ``explain_filters`` command and the tests.
+"""
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .models import Customer, Product, Order
+from .purge import inactive_customers
+
+# "SCAN crm_order" reads every row; "SCAN crm_order USING INDEX ..." walks an index
+FULL_SCAN = re.compile(r'\bSCAN (\w+)\b(?! USING)')
+
+# label -> tables a path may read in full by design (none at present)
+SCANNED_BY_DESIGN = {}
+
+
+def filter_queries():
+    """Return ``[(label, queryset)]`` for every indexed filter path"""
+    now = timezone.now()
+    week_ago = now - timedelta(days=7)
+    return [
+        ('CustomerFilter.created_at_gte/lte',
+         CustomerFilter({'created_at_gte': week_ago, 'created_at_lte': now}, Customer.objects.all()).qs),
+        ('CustomerFilter.phone_pattern',
+         CustomerFilter({'phone_pattern': '+1555'}, Customer.objects.all()).qs),
+        ('CustomerFilter.order_count_gte',
+         CustomerFilter({'order_count_gte': 20}, Customer.objects.all()).qs),
+        ('CustomerFilter.lifetime_value_gte',
+         CustomerFilter({'lifetime_value_gte': Decimal('5000')}, Customer.objects.all()).qs),
+        ('CustomerFilter.last_order_at_lte',
+         CustomerFilter({'last_order_at_lte': now - timedelta(days=180)}, Customer.objects.all()).qs),
+        ('allCustomers keyset page',
+         Customer.objects.filter(created_at__gt=week_ago).order_by('created_at', 'id')[:51]),
+        ('ProductFilter.price_gte/lte',
+         ProductFilter({'price_gte': Decimal('10'), 'price_lte': Decimal('20')}, Product.objects.all()).qs),
+        ('ProductFilter.stock', ProductFilter({'stock': 5}, Product.objects.all()).qs),
+        ('ProductFilter.stock_gte/lte',
+         ProductFilter({'stock_gte': 5, 'stock_lte': 50}, Product.objects.all()).qs),
+        ('ProductFilter.low_stock', ProductFilter({'low_stock': True}, Product.objects.all()).qs),
+        ('updateLowStockProducts', Product.objects.filter(stock__lt=10)),
+        ('allProducts keyset page', Product.objects.order_by('created_at', 'id')[:51]),
+        ('OrderFilter.total_amount_gte/lte',
+         OrderFilter({'total_amount_gte': Decimal('100'), 'total_amount_lte': Decimal('150')},
+                     Order.objects.all()).qs),
+        ('OrderFilter.order_date_gte/lte',
+         OrderFilter({'order_date_gte': week_ago, 'order_date_lte': now}, Order.objects.all()).qs),
+        ('OrderFilter.product_id', OrderFilter({'product_id': 1}, Order.objects.all()).qs),
+        ('allOrders keyset page', Order.objects.order_by('order_date', 'id')[:51]),
+        # walks crm_customer by primary key, probing crm_order per customer
+        ('purge_inactive_customers chunk',
+         inactive_customers(week_ago).filter(pk__gt=0).order_by('pk').values_list('pk', flat=True)[:500]),
+    ]
+
+
+def full_scans(label, queryset):
+    """Return ``(plan, tables read without an index)`` for a filter query"""
+    plan = queryset.explain()
+    allowed = SCANNED_BY_DESIGN.get(label, set())
+    return plan, [table for table in FULL_SCAN.findall(plan) if table not in allowed]
@@ -0,0 +1,115 @@
+"""Order reminder log of the orders placed in the last few days.
+
+The date window is applied in SQL on the indexed ``order_date`` column, so
+a run costs in proportion to the recent orders, not the order history:
+
+* ``db_reminders()`` streams them straight from the database in
+  ``chunk_size`` rows with their customers joined in,
+* ``graphql_reminders()`` pages through the same window over the GraphQL
+  API with ``allOrders(orderDate_Gte:, first:, after:)``, the keyset-paged
+  connection (``ordersFiltered`` returns one unpaged list).
+
+Both yield the same log lines; ``write_log()`` appends them in batches.
+``send_order_reminders()`` is the job run by
+``crm/cron_jobs/send_order_reminders.py``.
+"""
+import os
+from datetime import timedelta
+
+from django.utils import timezone
+from graphql_relay import to_global_id
+
+from .models import Order
+from .operations import RECENT_ORDERS_QUERY
+
+LOG_PATH = 'C:/tmp/order_reminders_log.txt'
+CHUNK_SIZE = 2000
+PAGE_SIZE = 100
+LINES_PER_WRITE = 1000
+
+
+def reminder_line(timestamp, order_id, name, email, order_date, amount):
+    return f"[{timestamp}] Order ID: {order_id}, Customer: {name} ({email}), Date: {order_date}, Amount: ${amount}\n"
+
+
+def recent_orders(since):
+    """Orders placed since ``since``, oldest first, with their customers"""
+    return (
+        Order.objects.filter(order_date__gte=since)
+        .select_related('customer')
+        .only('order_date', 'total_amount', 'customer', 'customer__name', 'customer__email')
+        .order_by('order_date', 'id')
+    )
+
+
+def db_reminders(since, timestamp, chunk_size=CHUNK_SIZE):
+    for order in recent_orders(since).iterator(chunk_size=chunk_size):
+        yield reminder_line(
+            timestamp,
+            # The global ID, as the GraphQL mode logs it
+            to_global_id('OrderType', order.pk),
+            order.customer.name,
+            order.customer.email,
+            order.order_date.isoformat(),
+            order.total_amount,
+        )
+
+
+def graphql_reminders(client, since, timestamp, page_size=PAGE_SIZE):
+    from gql import gql
+
+    query = gql(RECENT_ORDERS_QUERY)
+    after = None
+    while True:
+        result = client.execute(query, variable_values={
+            'since': since.isoformat(), 'first': page_size, 'after': after,
+        })
+        connection = result['allOrders']
+        for edge in connection['edges']:
+            order = edge['node']
+            yield reminder_line(
+                timestamp,
+                order['id'],
+                order['customer']['name'],
+                order['customer']['email'],
+                order['orderDate'],
+                order['totalAmount'],
+            )
+        if not connection['pageInfo']['hasNextPage']:
+            return
+        after = connection['pageInfo']['endCursor']
+
+
+def write_log(log_file, lines, lines_per_write=LINES_PER_WRITE):
+    """Append ``lines`` to ``log_file`` ``lines_per_write`` at a time; return their count"""
+    batch = []
+    count = 0
+    for line in lines:
+        batch.append(line)
+        count += 1
+        if len(batch) >= lines_per_write:
+            log_file.writelines(batch)
+            batch.clear()
+    log_file.writelines(batch)
+    return count
+
+
+def send_order_reminders(days=7, log_path=LOG_PATH, client=None):
+    """Log the orders of the last ``days`` days; return how many were logged.
+
+    Reads the database directly unless a gql ``client`` is given. The
+    orders stream into the log, so the count follows them in a closing line.
+    """
+    timestamp = timezone.localtime().strftime('%Y-%m-%d %H:%M:%S')
+    since = timezone.now() - timedelta(days=days)
+    if client is None:
+        lines = db_reminders(since, timestamp)
+    else:
+        lines = graphql_reminders(client, since, timestamp)
+
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'a') as log_file:
+        log_file.write(f"\n[{timestamp}] Processing orders from last {days} days:\n")
+        count = write_log(log_file, lines)
+        log_file.write(f"[{timestamp}] Processed {count} orders\n")
+    return count
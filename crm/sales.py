@@ -0,0 +1,278 @@
+"""Precomputed daily sales rollups for the analytics queries.
+
+Three tables hold one row per (UTC) day: ``DailySales`` with the day's
+totals, ``DailyProductSales`` per product sold that day and
+``DailyCustomerSales`` per customer who ordered. ``salesByDay``,
+``topProducts`` and ``topCustomers`` read a few hundred of these rows
+instead of aggregating ``crm_order`` and its items.
+
+Like ``crm.stats`` they are kept current incrementally:
+
+* ``record_sales()`` adds newly inserted orders and their items with one
+  upsert per table. Single ``Order`` and ``OrderItem`` saves and
+  ``products.add()`` go through ``crm.signals``; ``place_order`` and the
+  bulk paths insert items without signals and call it themselves,
+* edits and deletions recompute the affected days with ``refresh_sales()``,
+* ``subtract_customers_sales()`` takes purged customers' orders out before
+  ``crm.purge`` deletes them,
+* raw SQL loads are caught up with ``rebuild_sales()``, the
+  ``rebuild_sales_rollups`` command.
+
+Orders count their total amount as revenue, products their items'
+quantity times unit price.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from .models import DailyCustomerSales, DailyProductSales, DailySales, Order, OrderItem
+
+# Rows per upsert statement; six parameters each stays under SQLite's limit
+UPSERT_BATCH_SIZE = 150
+
+# Days per refresh statement, two range parameters each
+REFRESH_BATCH_SIZE = 200
+
+VALUE_FIELDS = ('order_count', 'revenue', 'units')
+
+# model: key fields of its rows
+ROLLUPS = {
+    DailySales: ('date',),
+    DailyProductSales: ('date', 'product'),
+    DailyCustomerSales: ('date', 'customer'),
+}
+
+
+def sales_date(moment):
+    """The UTC day a timestamp is rolled up under"""
+    return moment.astimezone(dt_timezone.utc).date()
+
+
+def _columns(model, names):
+    qn = connection.ops.quote_name
+    return [qn(model._meta.get_field(name).column) for name in names]
+
+
+def _add(totals, key, orders, revenue, units):
+    count, value, quantity = totals.get(key, (0, Decimal('0.00'), 0))
+    totals[key] = (count + orders, value + revenue, quantity + units)
+
+
+def _upsert(model, totals):
+    """Add ``totals``, ``{key: (order_count, revenue, units)}``, to ``model``'s rows"""
+    if not totals:
+        return
+    keys = ROLLUPS[model]
+    key_columns = _columns(model, keys)
+    value_columns = _columns(model, VALUE_FIELDS)
+    table = connection.ops.quote_name(model._meta.db_table)
+    ops = connection.ops
+    rows = [
+        (
+            ops.adapt_datefield_value(key[0]), *key[1:],
+            order_count, ops.adapt_decimalfield_value(revenue, 14, 2), units,
+        )
+        # In key order, so each statement walks the unique index forwards
+        for key, (order_count, revenue, units) in sorted(totals.items())
+    ]
+    placeholder = '(' + ', '.join(['%s'] * (len(keys) + len(VALUE_FIELDS))) + ')'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            chunk = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(key_columns + value_columns)}) VALUES "
+                + ', '.join([placeholder] * len(chunk))
+                + f" ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET "
+                + ', '.join(f"{column} = {table}.{column} + excluded.{column}" for column in value_columns),
+                [param for row in chunk for param in row],
+            )
+
+
+def record_sales(orders, items=()):
+    """Add freshly inserted ``orders`` and order items to the rollups.
+
+    ``items`` are ``(order, product_id, quantity, unit_price)`` for each new
+    item; an order's items may be recorded in a later call than the order.
+    """
+    days, customers, products = {}, {}, {}
+    for order in orders:
+        day = sales_date(order.order_date)
+        _add(days, (day,), 1, order.total_amount, 0)
+        _add(customers, (day, order.customer_id), 1, order.total_amount, 0)
+    for order, product_id, quantity, unit_price in items:
+        day = sales_date(order.order_date)
+        _add(days, (day,), 0, Decimal('0.00'), quantity)
+        _add(customers, (day, order.customer_id), 0, Decimal('0.00'), quantity)
+        _add(products, (day, product_id), 1, quantity * unit_price, quantity)
+    _upsert(DailySales, days)
+    _upsert(DailyCustomerSales, customers)
+    _upsert(DailyProductSales, products)
+
+
+def order_days(order_ids):
+    """The days ``order_ids`` are rolled up under"""
+    dates = Order.objects.filter(pk__in=list(order_ids)).values_list('order_date', flat=True)
+    return {sales_date(moment) for moment in dates}
+
+
+def record_items(items):
+    """Add new ``OrderItem`` rows to the rollups; their orders are read in one query"""
+    items = list(items)
+    orders = Order.objects.only('customer', 'order_date').in_bulk({item.order_id for item in items})
+    record_sales([], [
+        (orders[item.order_id], item.product_id, item.quantity, item.unit_price) for item in items
+    ])
+
+
+def _day_ranges(days):
+    """Order date ``WHERE`` clause and parameters selecting the UTC ``days``"""
+    ops = connection.ops
+    order_date, = _columns(Order, ('order_date',))
+    where = ' OR '.join([f"(o.{order_date} >= %s AND o.{order_date} < %s)"] * len(days))
+    params = []
+    for day in days:
+        start = datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+        params += [ops.adapt_datetimefield_value(start), ops.adapt_datetimefield_value(start + timedelta(days=1))]
+    return f"WHERE {where}", params
+
+
+def _insert_rollups(days=None):
+    """Aggregate the orders of ``days`` (default all) into rollup rows.
+
+    The rows of those days must have been deleted first.
+    """
+    qn = connection.ops.quote_name
+    item_table = qn(OrderItem._meta.db_table)
+    item_order, item_product, quantity, unit_price = _columns(
+        OrderItem, ('order', 'product', 'quantity', 'unit_price'),
+    )
+    order_table = qn(Order._meta.db_table)
+    order_pk, customer, total, order_date = _columns(Order, ('id', 'customer', 'total_amount', 'order_date'))
+    customer_table = qn(DailyCustomerSales._meta.db_table)
+    date, = _columns(DailyCustomerSales, ('date',))
+    values = _columns(DailySales, VALUE_FIELDS)
+    where, params = _day_ranges(days) if days is not None else ('', [])
+    day_where = f"WHERE {date} IN ({', '.join(['%s'] * len(days))})" if days is not None else ''
+    day_params = [connection.ops.adapt_datefield_value(day) for day in days or ()]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {customer_table} "
+            f"({', '.join(_columns(DailyCustomerSales, ROLLUPS[DailyCustomerSales]) + values)}) "
+            f"SELECT DATE(o.{order_date}), o.{customer}, COUNT(*), SUM(o.{total}), "
+            f"SUM((SELECT COALESCE(SUM(i.{quantity}), 0) FROM {item_table} i WHERE i.{item_order} = o.{order_pk})) "
+            f"FROM {order_table} o {where} GROUP BY DATE(o.{order_date}), o.{customer}",
+            params,
+        )
+        cursor.execute(
+            f"INSERT INTO {qn(DailyProductSales._meta.db_table)} "
+            f"({', '.join(_columns(DailyProductSales, ROLLUPS[DailyProductSales]) + values)}) "
+            f"SELECT DATE(o.{order_date}), i.{item_product}, COUNT(*), SUM(i.{quantity} * i.{unit_price}), "
+            f"SUM(i.{quantity}) "
+            f"FROM {item_table} i JOIN {order_table} o ON o.{order_pk} = i.{item_order} "
+            f"{where} GROUP BY DATE(o.{order_date}), i.{item_product}",
+            params,
+        )
+        # A day's totals are the sums of its customers' rows
+        cursor.execute(
+            f"INSERT INTO {qn(DailySales._meta.db_table)} "
+            f"({', '.join(_columns(DailySales, ('date',)) + values)}) "
+            f"SELECT {date}, {', '.join(f'SUM({column})' for column in values)} "
+            f"FROM {customer_table} {day_where} GROUP BY {date}",
+            day_params,
+        )
+        return cursor.rowcount
+
+
+def _delete_rollups(days=None):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model in ROLLUPS:
+            table = qn(model._meta.db_table)
+            date, = _columns(model, ('date',))
+            if days is None:
+                cursor.execute(f"DELETE FROM {table}")
+            else:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE {date} IN ({', '.join(['%s'] * len(days))})",
+                    [connection.ops.adapt_datefield_value(day) for day in days],
+                )
+
+
+def refresh_sales(days):
+    """Recompute the rollup rows of ``days`` from their orders.
+
+    Used when orders or their items are edited or deleted, where the change
+    cannot be applied as a delta.
+    """
+    days = sorted(set(days))
+    with transaction.atomic():
+        for start in range(0, len(days), REFRESH_BATCH_SIZE):
+            chunk = days[start:start + REFRESH_BATCH_SIZE]
+            _delete_rollups(chunk)
+            _insert_rollups(chunk)
+
+
+def rebuild_sales():
+    """Recompute every rollup row from ``crm_order``; return the number of days"""
+    with transaction.atomic():
+        _delete_rollups()
+        return _insert_rollups()
+
+
+def _subtract(model, totals):
+    """Subtract ``totals`` from ``model``'s existing rows, never below zero"""
+    if not totals:
+        return
+    keys = ROLLUPS[model]
+    table = connection.ops.quote_name(model._meta.db_table)
+    ops = connection.ops
+    assignments = ', '.join(
+        f"{column} = CASE WHEN {column} > %s THEN {column} - %s ELSE 0 END"
+        for column in _columns(model, VALUE_FIELDS)
+    )
+    where = ' AND '.join(f"{column} = %s" for column in _columns(model, keys))
+    rows = []
+    for key, (order_count, revenue, units) in totals.items():
+        revenue = ops.adapt_decimalfield_value(revenue, 14, 2)
+        rows.append((
+            order_count, order_count, revenue, revenue, units, units,
+            ops.adapt_datefield_value(key[0]), *key[1:],
+        ))
+    with connection.cursor() as cursor:
+        cursor.executemany(f"UPDATE {table} SET {assignments} WHERE {where}", rows)
+
+
+def subtract_customers_sales(customer_ids):
+    """Take the orders of ``customer_ids`` out of the day and product rollups.
+
+    ``crm.purge`` calls it before deleting the customers' orders, whose
+    ``DailyCustomerSales`` rows it deletes along with them.
+    """
+    days = {}
+    customer_rows = (
+        DailyCustomerSales.objects.filter(customer_id__in=customer_ids)
+        .values('date').order_by()
+        .annotate(orders=Sum('order_count'), revenue_total=Sum('revenue'), unit_total=Sum('units'))
+    )
+    for row in customer_rows:
+        days[(row['date'],)] = (row['orders'], row['revenue_total'], row['unit_total'])
+    products = {}
+    items = (
+        OrderItem.objects.filter(order__customer_id__in=customer_ids)
+        .values(day=TruncDate('order__order_date', tzinfo=dt_timezone.utc), product_pk=F('product_id'))
+        .order_by()
+        .annotate(
+            orders=Count('pk'), revenue_total=Sum(F('quantity') * F('unit_price')), unit_total=Sum('quantity'),
+        )
+    )
+    for row in items:
+        products[(row['day'], row['product_pk'])] = (row['orders'], row['revenue_total'], row['unit_total'])
+    _subtract(DailySales, days)
+    _subtract(DailyProductSales, products)
+    dates = [key[0] for key in days]
+    for model in (DailySales, DailyProductSales):
+        model.objects.filter(date__in=dates, order_count=0).delete()
@@ -1,14 +1,30 @@
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from graphql import GraphQLError
 from decimal import Decimal
-from .models import Customer, Product, Order
+from .models import (
+    Customer, CustomerStats, DailyCustomerSales, DailyProductSales, DailySales, Product, Order, OrderItem,
+)
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .fields import BatchedConnectionField, CountableConnection, KeysetConnectionField
+from .bulk import bulk_create_customers, bulk_create_orders, chunked, clean_product
+from .cache import cached_resolver, invalidate_instances, invalidate_model
+from .loaders import get_loaders, prime_nodes
+from .orders import OrderError, place_order
+from .planner import optimize
 
 
 # GraphQL Types
 class CustomerType(DjangoObjectType):
+    orders = BatchedConnectionField('crm.schema.OrderType', loader='customer_orders')
+    # Denormalized order aggregates (crm.stats); customers without orders have no row
+    order_count = graphene.Int(required=True)
+    lifetime_value = graphene.Decimal(required=True)
+    last_order_at = graphene.DateTime()
+
     class Meta:
         model = Customer
         fields = '__all__'
@@ -18,8 +34,23 @@ class CustomerType(DjangoObjectType):
             'created_at': ['exact', 'gte', 'lte'],
         }
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    def resolve_order_count(self, info):
+        stats = get_loaders(info.context).customer_stats.load(self.pk)
+        return stats.order_count if stats else 0
+
+    def resolve_lifetime_value(self, info):
+        stats = get_loaders(info.context).customer_stats.load(self.pk)
+        return stats.lifetime_value if stats else Decimal('0.00')
+
+    def resolve_last_order_at(self, info):
+        stats = get_loaders(info.context).customer_stats.load(self.pk)
+        return stats.last_order_at if stats else None
 
 class ProductType(DjangoObjectType):
+    orders = BatchedConnectionField('crm.schema.OrderType', loader='product_orders')
+
     class Meta:
         model = Product
         fields = '__all__'
@@ -29,8 +60,19 @@ class ProductType(DjangoObjectType):
             'stock': ['exact', 'gte', 'lte'],
         }
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+class OrderItemType(DjangoObjectType):
+    class Meta:
+        model = OrderItem
+        fields = ('product', 'quantity', 'unit_price')
+
 
 class OrderType(DjangoObjectType):
+    products = BatchedConnectionField(ProductType, loader='order_products')
+    # The order lines, with the quantity and unit price of each product
+    items = graphene.List(graphene.NonNull(OrderItemType), required=True)
+
     class Meta:
         model = Order
         fields = '__all__'
@@ -40,6 +82,75 @@ class OrderType(DjangoObjectType):
             'customer__name': ['exact', 'icontains'],
         }
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info.context).customer.load(self.customer_id)
+
+    def resolve_items(self, info):
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'items' in prefetched:
+            return list(prefetched['items'])
+        return get_loaders(info.context).order_items.load(self.pk)
+
+
+# Sales Analytics Types (crm/sales.py rollups)
+class SalesDayType(graphene.ObjectType):
+    date = graphene.Date(required=True)
+    order_count = graphene.Int(required=True)
+    revenue = graphene.Decimal(required=True)
+    units = graphene.Int(required=True)
+
+class ProductSalesType(graphene.ObjectType):
+    product = graphene.Field(ProductType, required=True)
+    order_count = graphene.Int(required=True)
+    revenue = graphene.Decimal(required=True)
+    units = graphene.Int(required=True)
+
+class CustomerSalesType(graphene.ObjectType):
+    customer = graphene.Field(CustomerType, required=True)
+    order_count = graphene.Int(required=True)
+    revenue = graphene.Decimal(required=True)
+    units = graphene.Int(required=True)
+
+# Rows a topProducts/topCustomers query may ask for
+TOP_LIMIT = 100
+
+def in_date_range(queryset, date_from, date_to):
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset
+
+def check_top_limit(info, n):
+    if not 1 <= n <= TOP_LIMIT:
+        raise GraphQLError(f"`{info.field_name}` returns between 1 and {TOP_LIMIT} rows, not {n}.")
+
+def top_sales(info, rollup, key, n, date_from, date_to):
+    """The ``n`` ``key`` rows of ``rollup`` with the highest revenue between the days"""
+    check_top_limit(info, n)
+    totals = list(
+        in_date_range(rollup.objects.all(), date_from, date_to)
+        .values(key).order_by()
+        .annotate(orders=Sum('order_count'), total=Sum('revenue'), sold=Sum('units'))
+        .order_by('-total', key)[:n]
+    )
+    model = rollup._meta.get_field(key).related_model
+    objects = model.objects.in_bulk([row[key] for row in totals])
+    prime_nodes(info, objects.values())
+    return [
+        {
+            key: objects[row[key]],
+            'order_count': row['orders'],
+            # SQLite sums come back unquantized
+            'revenue': row['total'].quantize(Decimal('0.01')),
+            'units': row['sold'],
+        }
+        for row in totals
+    ]
 
 # Input Types for Filters
 class CustomerFilterInput(graphene.InputObjectType):
@@ -48,6 +159,12 @@ class CustomerFilterInput(graphene.InputObjectType):
     created_at_gte = graphene.DateTime()
     created_at_lte = graphene.DateTime()
     phone_pattern = graphene.String()
+    order_count_gte = graphene.Int()
+    order_count_lte = graphene.Int()
+    lifetime_value_gte = graphene.Float()
+    lifetime_value_lte = graphene.Float()
+    last_order_at_gte = graphene.DateTime()
+    last_order_at_lte = graphene.DateTime()
 
 class ProductFilterInput(graphene.InputObjectType):
     name_icontains = graphene.String()
@@ -77,9 +194,15 @@ class ProductInput(graphene.InputObjectType):
     price = graphene.String(required=True)
     stock = graphene.Int()
 
+class OrderItemInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int(required=True)
+
 class OrderInput(graphene.InputObjectType):
     customer_id = graphene.ID(required=True)
-    product_ids = graphene.List(graphene.ID, required=True)
+    # One unit per id; kept for clients written before ``items``
+    product_ids = graphene.List(graphene.ID)
+    items = graphene.List(graphene.NonNull(OrderItemInput))
     order_date = graphene.DateTime()
 
 # Mutations 
@@ -117,27 +240,12 @@ class BulkCreateCustomers(graphene.Mutation):
     errors = graphene.List(graphene.String)
     
     def mutate(self, info, input):
-        created_customers = []
-        errors = []
-        
-        for i, customer_data in enumerate(input):
-            try:
-                if Customer.objects.filter(email=customer_data.email).exists():
-                    errors.append(f"Customer {i+1}: Email {customer_data.email} already exists")
-                    continue
-                
-                customer = Customer(
-                    name=customer_data.name,
-                    email=customer_data.email,
-                    phone=customer_data.get('phone', '')
-                )
-                customer.full_clean()
-                customer.save()
-                created_customers.append(customer)
-            except Exception as e:
-                errors.append(f"Customer {i+1}: {str(e)}")
+        try:
+            created_customers, errors = bulk_create_customers(input)
+        except (IntegrityError, ValidationError) as e:
+            return BulkCreateCustomers(customers=[], errors=[f"Error: {str(e)}"])
         
-        return BulkCreateCustomers(customers=created_customers, errors=errors)
+        return BulkCreateCustomers(customers=prime_nodes(info, created_customers), errors=errors)
 
 class CreateProduct(graphene.Mutation):
     class Arguments:
@@ -149,16 +257,9 @@ class CreateProduct(graphene.Mutation):
     def mutate(self, info, input):
         try:
             try:
-                price = Decimal(input.price)
-            except:
-                return CreateProduct(product=None, message="Invalid price format")
-            
-            if price <= 0:
-                return CreateProduct(product=None, message="Price must be positive")
-            
-            stock = input.get('stock', 0)
-            if stock < 0:
-                return CreateProduct(product=None, message="Stock cannot be negative")
+                price, stock = clean_product(input.price, input.get('stock', 0))
+            except ValueError as e:
+                return CreateProduct(product=None, message=str(e))
             
             product = Product(
                 name=input.name,
@@ -180,41 +281,50 @@ class CreateOrder(graphene.Mutation):
     
     def mutate(self, info, input):
         try:
-            try:
-                customer = Customer.objects.get(pk=input.customer_id)
-            except Customer.DoesNotExist:
-                return CreateOrder(order=None, message="Invalid customer ID")
-            
-            if not input.product_ids:
-                return CreateOrder(order=None, message="At least one product must be provided")
-            
-            products = []
-            for product_id in input.product_ids:
-                try:
-                    product = Product.objects.get(pk=product_id)
-                    products.append(product)
-                except Product.DoesNotExist:
-                    return CreateOrder(order=None, message=f"Invalid product ID: {product_id}")
-            
-            total_amount = sum(product.price for product in products)
-            
-            order = Order(
-                customer=customer,
-                total_amount=total_amount
-            )
-            order.save()
-            order.products.set(products)
-            
+            order = place_order(input.customer_id, input.get('product_ids'), input.get('items'))
             return CreateOrder(order=order, message="Order created successfully")
+        except OrderError as e:
+            return CreateOrder(order=None, message=str(e))
         except Exception as e:
             return CreateOrder(order=None, message=f"Error: {str(e)}")
 
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(OrderInput), required=True)
+    
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+    
+    def mutate(self, info, input):
+        try:
+            created_orders, errors = bulk_create_orders(input)
+        except Exception as e:
+            return BulkCreateOrders(orders=[], errors=[f"Error: {str(e)}"])
+        
+        return BulkCreateOrders(orders=prime_nodes(info, created_orders), errors=errors)
+
 # Query Class with Filters
+# *FilterInput fields named after the lookup rather than the filter
+FILTER_INPUT_ALIASES = {'name_icontains': 'name', 'email_icontains': 'email'}
+
+def filtered_queryset(model, filterset_class, filter=None, order_by=None):
+    """Queryset for the ``*_filtered`` fields; builds SQL, runs no query"""
+    queryset = model.objects.all()
+    
+    if filter:
+        data = {FILTER_INPUT_ALIASES.get(key, key): value for key, value in filter.items()}
+        queryset = filterset_class(data, queryset=queryset).qs
+    
+    if order_by:
+        queryset = queryset.order_by(order_by)
+    
+    return queryset
+
 class Query(graphene.ObjectType):
     # Connection fields for filtering and pagination
-    all_customers = DjangoFilterConnectionField(CustomerType)
-    all_products = DjangoFilterConnectionField(ProductType)
-    all_orders = DjangoFilterConnectionField(OrderType)
+    all_customers = KeysetConnectionField(CustomerType, keyset='created_at')
+    all_products = KeysetConnectionField(ProductType, keyset='created_at')
+    all_orders = KeysetConnectionField(OrderType, keyset='order_date')
     
     # Basic single object queries
     customer = graphene.Field(CustomerType, id=graphene.Int(required=True))
@@ -238,85 +348,172 @@ class Query(graphene.ObjectType):
         order_by=graphene.String()
     )
     
+    # Sales analytics over the daily rollups (crm.sales); days are UTC and inclusive
+    sales_by_day = graphene.List(
+        SalesDayType,
+        date_from=graphene.Date(name='from'),
+        date_to=graphene.Date(name='to'),
+    )
+    top_products = graphene.List(
+        ProductSalesType,
+        n=graphene.Int(default_value=10),
+        date_from=graphene.Date(name='from'),
+        date_to=graphene.Date(name='to'),
+    )
+    top_customers = graphene.List(
+        CustomerSalesType,
+        n=graphene.Int(default_value=10),
+        date_from=graphene.Date(name='from'),
+        date_to=graphene.Date(name='to'),
+    )
+    
+    def resolve_sales_by_day(self, info, date_from=None, date_to=None):
+        return in_date_range(DailySales.objects.all(), date_from, date_to).order_by('date')
+    
+    def resolve_top_products(self, info, n, date_from=None, date_to=None):
+        return top_sales(info, DailyProductSales, 'product', n, date_from, date_to)
+    
+    def resolve_top_customers(self, info, n, date_from=None, date_to=None):
+        if date_from is not None or date_to is not None:
+            return top_sales(info, DailyCustomerSales, 'customer', n, date_from, date_to)
+        # All time: the lifetime value index of the customer stats has the ranking
+        check_top_limit(info, n)
+        stats = list(CustomerStats.objects.select_related('customer').order_by('-lifetime_value', 'customer_id')[:n])
+        units = dict(
+            DailyCustomerSales.objects.filter(customer_id__in=[row.customer_id for row in stats])
+            .values('customer').order_by().annotate(units=Sum('units')).values_list('customer', 'units')
+        )
+        prime_nodes(info, [row.customer for row in stats])
+        return [
+            {
+                'customer': row.customer,
+                'order_count': row.order_count,
+                'revenue': row.lifetime_value,
+                'units': units.get(row.customer_id, 0),
+            }
+            for row in stats
+        ]
+    
+    @cached_resolver(Customer)
     def resolve_customer(self, info, id):
         try:
-            return Customer.objects.get(pk=id)
+            return optimize(Customer.objects.all(), info).get(pk=id)
         except Customer.DoesNotExist:
             return None
     
+    @cached_resolver(Product)
     def resolve_product(self, info, id):
         try:
-            return Product.objects.get(pk=id)
+            return optimize(Product.objects.all(), info).get(pk=id)
         except Product.DoesNotExist:
             return None
     
+    @cached_resolver(Order)
     def resolve_order(self, info, id):
         try:
-            return Order.objects.get(pk=id)
+            return optimize(Order.objects.all(), info).get(pk=id)
         except Order.DoesNotExist:
             return None
     
+    @cached_resolver(Customer)
     def resolve_customers_filtered(self, info, filter=None, order_by=None):
-        queryset = Customer.objects.all()
-        
-        if filter:
-            customer_filter = CustomerFilter(filter, queryset=queryset)
-            queryset = customer_filter.qs
-        
-        if order_by:
-            queryset = queryset.order_by(order_by)
-        
-        return queryset
+        queryset = filtered_queryset(Customer, CustomerFilter, filter, order_by)
+        return prime_nodes(info, optimize(queryset, info))
     
+    @cached_resolver(Product)
     def resolve_products_filtered(self, info, filter=None, order_by=None):
-        queryset = Product.objects.all()
-        
-        if filter:
-            product_filter = ProductFilter(filter, queryset=queryset)
-            queryset = product_filter.qs
-        
-        if order_by:
-            queryset = queryset.order_by(order_by)
-        
-        return queryset
+        queryset = filtered_queryset(Product, ProductFilter, filter, order_by)
+        return prime_nodes(info, optimize(queryset, info))
     
+    @cached_resolver(Order)
     def resolve_orders_filtered(self, info, filter=None, order_by=None):
-        queryset = Order.objects.all()
-        
-        if filter:
-            order_filter = OrderFilter(filter, queryset=queryset)
-            queryset = order_filter.qs
-        
-        if order_by:
-            queryset = queryset.order_by(order_by)
-        
-        return queryset
+        queryset = filtered_queryset(Order, OrderFilter, filter, order_by)
+        return prime_nodes(info, optimize(queryset, info))
 
-# Mutation Class
-class Mutation(graphene.ObjectType):
-    create_customer = CreateCustomer.Field()
-    bulk_create_customers = BulkCreateCustomers.Field()
-    create_product = CreateProduct.Field()
-    create_order = CreateOrder.Field()
+class AsyncQuery(Query):
+    """``Query`` with coroutine resolvers for the async view.
+
+    The single-object and filtered fields use the async ORM; everything else
+    is inherited and offloaded to a thread by ``crm.executor``.
+    """
+    
+    class Meta:
+        name = 'Query'
+    
+    @cached_resolver(Customer)
+    async def resolve_customer(self, info, id):
+        try:
+            return await optimize(Customer.objects.all(), info).aget(pk=id)
+        except Customer.DoesNotExist:
+            return None
+    
+    @cached_resolver(Product)
+    async def resolve_product(self, info, id):
+        try:
+            return await optimize(Product.objects.all(), info).aget(pk=id)
+        except Product.DoesNotExist:
+            return None
+    
+    @cached_resolver(Order)
+    async def resolve_order(self, info, id):
+        try:
+            return await optimize(Order.objects.all(), info).aget(pk=id)
+        except Order.DoesNotExist:
+            return None
+    
+    @cached_resolver(Customer)
+    async def resolve_customers_filtered(self, info, filter=None, order_by=None):
+        queryset = filtered_queryset(Customer, CustomerFilter, filter, order_by)
+        return prime_nodes(info, [customer async for customer in optimize(queryset, info)])
+    
+    @cached_resolver(Product)
+    async def resolve_products_filtered(self, info, filter=None, order_by=None):
+        queryset = filtered_queryset(Product, ProductFilter, filter, order_by)
+        return prime_nodes(info, [product async for product in optimize(queryset, info)])
+    
+    @cached_resolver(Order)
+    async def resolve_orders_filtered(self, info, filter=None, order_by=None):
+        queryset = filtered_queryset(Order, OrderFilter, filter, order_by)
+        return prime_nodes(info, [order async for order in optimize(queryset, info)])
 
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        pass
+        threshold = graphene.Int(default_value=10)
+        increment = graphene.Int(default_value=10)
+        product_ids = graphene.List(graphene.NonNull(graphene.ID))
+        return_products = graphene.Boolean(default_value=True)
     
     success = graphene.Boolean()
     message = graphene.String()
     updated_products = graphene.List(ProductType)
     
-    def mutate(self, info):
-        # Query products with stock < 10
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated_products = []
+    def mutate(self, info, threshold, increment, return_products, product_ids=None):
+        if increment <= 0:
+            return UpdateLowStockProducts(success=False, message="Increment must be positive")
         
-        # Update each low stock product by adding 10 to stock
-        for product in low_stock_products:
-            product.stock += 10
-            product.save()
-            updated_products.append(product)
+        # Query products with stock below the threshold, optionally scoped by id
+        low_stock_products = Product.objects.filter(stock__lt=threshold)
+        if product_ids is not None:
+            low_stock_products = low_stock_products.filter(pk__in=product_ids)
+        
+        # Restock in one UPDATE; only read the rows back when they are returned
+        with transaction.atomic():
+            if not return_products:
+                count = low_stock_products.update(stock=F('stock') + increment)
+                invalidate_model(Product)
+                return UpdateLowStockProducts(
+                    success=True,
+                    message=f"Updated {count} low-stock products",
+                )
+            
+            updated_products = list(low_stock_products.select_for_update())
+            updated_ids = [product.pk for product in updated_products]
+            for chunk in chunked(updated_ids):
+                Product.objects.filter(pk__in=chunk).update(stock=F('stock') + increment)
+            invalidate_instances(Product, updated_ids)
+        
+        for product in updated_products:
+            product.stock += increment
         
         return UpdateLowStockProducts(
             success=True,
@@ -325,7 +522,13 @@ class UpdateLowStockProducts(graphene.Mutation):
         )
 
 
+# Mutation Class
 class Mutation(graphene.ObjectType):
+    create_customer = CreateCustomer.Field()
+    bulk_create_customers = BulkCreateCustomers.Field()
+    create_product = CreateProduct.Field()
+    create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
 
 
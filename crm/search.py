@@ -0,0 +1,58 @@
+"""Case-insensitive substring search for the ``*_icontains`` style filters.
+
+``LIKE '%x%'`` cannot use a b-tree index, so every type-ahead keystroke
+scans the table. With ``CRM_SEARCH_BACKEND = 'fts5'`` the searchable
+columns are matched through SQLite FTS5 tables with the trigram tokenizer
+instead (created and kept in sync by triggers in migration 0003), which
+index every three-character substring.
+
+Terms shorter than a trigram, other databases and columns without a search
+table fall back to ``icontains``.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+# model label -> (FTS5 table, indexed columns)
+SEARCH_TABLES = {
+    'crm.customer': ('crm_customer_search', {'name', 'email'}),
+    'crm.product': ('crm_product_search', {'name'}),
+}
+
+MIN_TRIGRAM_LENGTH = 3
+
+
+def search_backend():
+    return getattr(settings, 'CRM_SEARCH_BACKEND', 'like')
+
+
+def fts_match(table, column, value):
+    """Subquery of the rowids whose ``column`` contains ``value``"""
+    # A quoted phrase of trigrams matches the exact substring
+    phrase = '"' + value.replace('"', '""') + '"'
+    return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [f'{column} : {phrase}'])
+
+
+def icontains(queryset, field_path, value, backend=None):
+    """Filter ``queryset`` on ``<field_path>__icontains=value``.
+
+    ``field_path`` may follow relations (``customer__name``); the match is
+    then applied to the related rows.
+    """
+    backend = backend or search_backend()
+    *relations, column = field_path.split('__')
+    model = queryset.model
+    for name in relations:
+        model = model._meta.get_field(name).related_model
+
+    table, columns = SEARCH_TABLES.get(model._meta.label_lower, (None, ()))
+    if (
+        backend != 'fts5'
+        or connection.vendor != 'sqlite'
+        or column not in columns
+        or len(value) < MIN_TRIGRAM_LENGTH
+    ):
+        return queryset.filter(**{f'{field_path}__icontains': value})
+
+    lookup = '__'.join(relations + ['in']) if relations else 'pk__in'
+    return queryset.filter(**{lookup: fts_match(table, column, value)})
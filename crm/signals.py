@@ -0,0 +1,110 @@
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_instances, invalidate_model
+from .models import Customer, Product, Order, OrderItem
+from .sales import order_days, record_items, record_sales, refresh_sales, sales_date
+from .stats import record_orders, refresh_customer_stats
+from .tracing import install_execute_wrapper
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_saved_instance(sender, instance, **kwargs):
+    """Evict cached results containing the written customer or product"""
+    invalidate_instances(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_saved_order(sender, instance, **kwargs):
+    """Evict cached results containing the order or its customer's order list"""
+    invalidate_instances(Order, [instance.pk])
+    # The customer's stats change too, and with them the stats filters' matches
+    invalidate_instances(Customer, [instance.customer_id])
+
+
+@receiver(post_save, sender=Order)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """Fold a new order into its customer's stats; recompute them on edits"""
+    if raw:
+        return
+    if created:
+        record_orders([instance])
+        record_sales([instance])
+    else:
+        refresh_customer_stats([instance.customer_id])
+        refresh_sales([sales_date(instance.order_date)])
+
+
+@receiver(post_delete, sender=Order)
+def update_stats_on_delete(sender, instance, **kwargs):
+    refresh_customer_stats([instance.customer_id])
+    refresh_sales([sales_date(instance.order_date)])
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_order_products(sender, instance, action, model, pk_set, **kwargs):
+    """Evict cached results on both sides of a changed order/product link"""
+    if not action.startswith('post_'):
+        return
+    # Links only change which orders match product filters, not product lists
+    invalidate_instances(type(instance), [instance.pk], membership=type(instance) is Order)
+    if pk_set:
+        invalidate_instances(model, pk_set, membership=model is Order)
+    else:
+        # post_clear does not say which rows were unlinked
+        invalidate_model(model)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_saved_item(sender, instance, **kwargs):
+    """Evict cached results on both sides of a written order item"""
+    invalidate_instances(Order, [instance.order_id])
+    invalidate_instances(Product, [instance.product_id], membership=False)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_sales_on_item_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        record_items([instance])
+    else:
+        refresh_sales(order_days([instance.order_id]))
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_sales_on_item_delete(sender, instance, origin=None, **kwargs):
+    """Recompute the day of a deleted item, including ``products.remove()``/``clear()``.
+
+    Items cascading from an order or customer are left to the order's own
+    handler. Deleting a product keeps its units in the rollups, as it keeps
+    their price in the orders' totals.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if model is OrderItem:
+        refresh_sales(order_days([instance.order_id]))
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def update_sales_on_products_add(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Add the items ``products.add()``/``set()`` created; they are bulk inserted without post_save"""
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        items = OrderItem.objects.filter(product=instance, order_id__in=pk_set)
+    else:
+        items = OrderItem.objects.filter(order=instance, product_id__in=pk_set)
+    record_items(items)
+
+
+@receiver(connection_created)
+def trace_connection(sender, connection, **kwargs):
+    """Let ``crm.tracing`` charge the connection's SQL to the running resolver"""
+    install_execute_wrapper(connection)
@@ -0,0 +1,106 @@
+"""Incremental per-customer order aggregates (``CustomerStats``).
+
+``record_orders()`` folds newly inserted orders into their customers' rows
+with one upsert per customer, so order count, lifetime value and last order
+date are read from a single row instead of aggregated over ``crm_order``.
+Single ``Order`` saves and deletes are handled by ``crm.signals``; the bulk
+path calls ``record_orders()`` itself since ``bulk_create`` sends no
+signals. Raw SQL inserts (fixtures, ``explain_filters --populate``) are
+caught up with ``rebuild_customer_stats()``, the ``rebuild_customer_stats``
+command.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import CustomerStats, Order
+
+# Customers per upsert statement; four parameters each stays under SQLite's limit
+UPSERT_BATCH_SIZE = 200
+
+
+def _columns():
+    meta = CustomerStats._meta
+    qn = connection.ops.quote_name
+    return (
+        qn(meta.db_table),
+        [qn(meta.get_field(name).column) for name in ('customer', 'order_count', 'lifetime_value', 'last_order_at')],
+    )
+
+
+def record_orders(orders):
+    """Add freshly inserted ``orders`` to their customers' stats rows"""
+    totals = {}
+    for order in orders:
+        count, value, last = totals.get(order.customer_id, (0, Decimal('0.00'), None))
+        totals[order.customer_id] = (
+            count + 1,
+            value + order.total_amount,
+            order.order_date if last is None or order.order_date > last else last,
+        )
+    if not totals:
+        return
+
+    table, (customer, count, value, last) = _columns()
+    ops = connection.ops
+    rows = [
+        (
+            customer_id,
+            order_count,
+            ops.adapt_decimalfield_value(lifetime_value, 14, 2),
+            ops.adapt_datetimefield_value(last_order_at),
+        )
+        for customer_id, (order_count, lifetime_value, last_order_at) in totals.items()
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            chunk = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} ({customer}, {count}, {value}, {last}) VALUES "
+                + ', '.join(['(%s, %s, %s, %s)'] * len(chunk))
+                + f" ON CONFLICT ({customer}) DO UPDATE SET "
+                f"{count} = {table}.{count} + excluded.{count}, "
+                f"{value} = {table}.{value} + excluded.{value}, "
+                f"{last} = CASE WHEN {table}.{last} IS NULL OR excluded.{last} > {table}.{last} "
+                f"THEN excluded.{last} ELSE {table}.{last} END",
+                [param for row in chunk for param in row],
+            )
+
+
+def refresh_customer_stats(customer_ids):
+    """Recompute the existing stats rows of ``customer_ids`` from their orders.
+
+    Used when an order is edited or deleted, where the change cannot be
+    applied as a delta. Customers without a row are left alone so a cascade
+    deleting the customer cannot recreate it.
+    """
+    orders = Order.objects.filter(customer=OuterRef('customer')).order_by().values('customer')
+    CustomerStats.objects.filter(customer_id__in=list(customer_ids)).update(
+        order_count=Coalesce(
+            Subquery(orders.annotate(n=Count('pk')).values('n')), Value(0), output_field=IntegerField(),
+        ),
+        lifetime_value=Coalesce(
+            Subquery(orders.annotate(total=Sum('total_amount')).values('total')), Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        last_order_at=Subquery(orders.annotate(last=Max('order_date')).values('last')),
+    )
+
+
+def rebuild_customer_stats():
+    """Recompute every stats row from ``crm_order`` with one ``INSERT ... SELECT``"""
+    table, (customer, count, value, last) = _columns()
+    order_meta = Order._meta
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(
+            f"INSERT INTO {table} ({customer}, {count}, {value}, {last}) "
+            f"SELECT {qn(order_meta.get_field('customer').column)}, COUNT(*), "
+            f"SUM({qn(order_meta.get_field('total_amount').column)}), "
+            f"MAX({qn(order_meta.get_field('order_date').column)}) "
+            f"FROM {qn(order_meta.db_table)} GROUP BY {qn(order_meta.get_field('customer').column)}"
+        )
+        return cursor.rowcount
@@ -1,3 +1,1361 @@
-from django.test import TestCase
+import csv
+import importlib
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import (
+    AsyncClient, Client, LiveServerTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+from gql import gql
+from gql.transport import Transport
+from graphql import ExecutionResult, parse, print_ast
+
+from alx_backend_graphql_crm import urls
+from alx_backend_graphql_crm.schema import schema
+from .benchmarks import (
+    MODES, SEARCH_BACKENDS, THREADED_MODES, anchors, benchmark_operations, compare, measure, run_benchmark,
+    search_benchmarks, view_benchmarks,
+)
+from .cache import resolver_cache
+from .client import GraphQLClient, QueryRetryingTransport, get_client
+from .dataset import generate_dataset
+from .export import export
+from .imports import Checkpoint, import_file
+from .documents import PersistedQueryRegistry, document_cache, query_hash, schema_hash
+from .health import clear_cache as clear_health_cache, heartbeat_status, request_latency
+from .loaders import Loaders
+from .models import (
+    Customer, CustomerStats, DailyCustomerSales, DailyProductSales, DailySales, Product, Order, OrderItem,
+)
+from .operations import RECENT_ORDERS_QUERY, UPDATE_LOW_STOCK_MUTATION
+from .query_plans import filter_queries, full_scans
+from .purge import delete_customers
+from .reminders import db_reminders, graphql_reminders, send_order_reminders
+from .sales import rebuild_sales
+from .search import icontains
+from .stats import rebuild_customer_stats
+from .tracing import resolver_histogram
+from .views import AsyncCRMGraphQLView, CRMGraphQLView
+
+SCHEMA_QUERY = "query SchemaName { __schema { queryType { name } } }"
+
+
+class CRMTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f"Product {i}", price=Decimal("10.00") + i, stock=i)
+            for i in range(5)
+        ]
+        cls.customers = [
+            Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com")
+            for i in range(10)
+        ]
+        for i in range(30):
+            order = Order.objects.create(customer=cls.customers[i % 10], total_amount=Decimal("0.00"))
+            for product in cls.products[i % 3:i % 3 + 2]:
+                OrderItem.objects.create(order=order, product=product, unit_price=product.price)
+
+    def execute(self, query, **variables):
+        result = schema.execute(query, variable_values=variables, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return result.data
+
+
+class DataLoaderTests(CRMTestCase):
+    def test_primed_siblings_load_in_one_query_per_relation(self):
+        orders = list(Order.objects.all())
+        loaders = Loaders()
+        loaders.prime(orders)
+        with self.assertNumQueries(3):
+            customers = [loaders.customer.load(order.customer_id) for order in orders]
+            products = [loaders.order_products.load(order.pk) for order in orders]
+            items = [loaders.order_items.load(order.pk) for order in orders]
+        self.assertEqual(customers[11], self.customers[1])
+        self.assertEqual(len(products[0]), 2)
+        # The items' products came with them
+        with self.assertNumQueries(0):
+            self.assertEqual([item.product.name for item in items[0]], ['Product 0', 'Product 1'])
+
+    def test_bulk_mutation_results_batch_nested_relations(self):
+        query = """
+        mutation ($input: [OrderInput!]!) {
+            bulkCreateOrders(input: $input) {
+                orders { customer { name } products { edges { node { name } } } }
+            }
+        }
+        """
+        rows = [
+            {'customerId': customer.pk, 'productIds': [self.products[4].pk]}
+            for customer in self.customers[:3]
+        ]
+        # the 13 write statements, then one query each for customers and products
+        with self.assertNumQueries(15):
+            data = self.execute(query, input=rows)
+        self.assertEqual(len(data['bulkCreateOrders']['orders']), 3)
+
+    def test_orders_filtered_batches_nested_relations(self):
+        query = """
+        query {
+            ordersFiltered {
+                customer { name orders { edges { node { id } } } }
+                products { edges { node { name orders { edges { node { id } } } } } }
+            }
+        }
+        """
+        # orders joined to customers, customer orders, order products, product orders
+        with self.assertNumQueries(4):
+            data = self.execute(query)
+        self.assertEqual(len(data['ordersFiltered']), 30)
+        self.assertEqual(len(data['ordersFiltered'][0]['customer']['orders']['edges']), 3)
+
+    def test_filtered_nested_connection_falls_back_to_queryset(self):
+        query = """
+        query {
+            allCustomers {
+                edges { node { orders(totalAmount: "0.00") { edges { node { id } } } } }
+            }
+        }
+        """
+        data = self.execute(query)
+        self.assertEqual(len(data['allCustomers']['edges'][0]['node']['orders']['edges']), 3)
+
+
+class QueryPlannerTests(CRMTestCase):
+    def test_all_orders_joins_and_prefetches_selected_fields(self):
+        query = """
+        query {
+            allOrders {
+                edges { node { id customer { name } products { edges { node { name } } } } }
+            }
+        }
+        """
+        # page joined to customers, prefetched products
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(query)
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('total_amount', queries[0]['sql'])
+        self.assertNotIn('"crm_customer"."email"', queries[0]['sql'])
+        self.assertEqual(len(data['allOrders']['edges']), 30)
+
+    def test_customers_filtered_selects_only_requested_columns(self):
+        query = """
+        query {
+            customersFiltered(orderBy: "-name") { ...names }
+        }
+        fragment names on CustomerType { name }
+        """
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(query)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('email', queries[0]['sql'])
+        self.assertEqual(data['customersFiltered'][0], {'name': 'Customer 9'})
+
+
+class KeysetPaginationTests(CRMTestCase):
+    query = """
+    query ($first: Int, $after: String, $last: Int, $before: String) {
+        allOrders(first: $first, after: $after, last: $last, before: $before) {
+            edges { node { id } }
+            pageInfo { startCursor endCursor hasNextPage hasPreviousPage }
+        }
+    }
+    """
+
+    def test_pages_forward_through_every_order(self):
+        seen = []
+        after = None
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.execute(self.query, first=7, after=after)['allOrders']
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn('COUNT', queries[0]['sql'])
+            self.assertNotIn('OFFSET', queries[0]['sql'])
+            seen.extend(edge['node']['id'] for edge in page['edges'])
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(len(set(seen)), 30)
+
+    def test_pages_backward_from_cursor(self):
+        forward = self.execute(self.query, first=10)['allOrders']
+        before = forward['pageInfo']['endCursor']
+        backward = self.execute(self.query, last=3, before=before)['allOrders']
+        self.assertEqual(
+            [edge['node']['id'] for edge in backward['edges']],
+            [edge['node']['id'] for edge in forward['edges'][6:9]],
+        )
+        self.assertTrue(backward['pageInfo']['hasPreviousPage'])
+
+    def test_total_count_only_when_selected(self):
+        query = "query { allCustomers(first: 2) { totalCount edges { node { name } } } }"
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(query)
+        self.assertEqual(data['allCustomers']['totalCount'], 10)
+        self.assertEqual(sum('COUNT' in q['sql'] for q in queries), 1)
+
+    def test_offset_is_rejected(self):
+        result = schema.execute("query { allProducts(offset: 2) { edges { node { id } } } }")
+        self.assertIn('offset', result.errors[0].message)
+
+
+class BulkCreateCustomersTests(CRMTestCase):
+    mutation = """
+    mutation ($input: [CustomerInput]!) {
+        bulkCreateCustomers(input: $input) { customers { email } errors }
+    }
+    """
+
+    def test_reports_row_errors_and_inserts_survivors(self):
+        rows = [
+            {'name': 'New 1', 'email': 'new1@example.com', 'phone': '+1234567890'},
+            {'name': 'Bad phone', 'email': 'bad@example.com', 'phone': 'call me'},
+            {'name': 'Taken', 'email': 'customer0@example.com'},
+            {'name': 'New 1 again', 'email': 'new1@example.com'},
+            {'name': 'New 2', 'email': 'new2@example.com', 'phone': '123-456-7890'},
+        ]
+        data = self.execute(self.mutation, input=rows)['bulkCreateCustomers']
+        self.assertEqual(
+            [c['email'] for c in data['customers']],
+            ['new1@example.com', 'new2@example.com'],
+        )
+        self.assertEqual(len(data['errors']), 3)
+        self.assertTrue(data['errors'][0].startswith('Customer 2: '))
+        self.assertEqual(data['errors'][1], 'Customer 3: Email customer0@example.com already exists')
+        self.assertEqual(data['errors'][2], 'Customer 4: Email new1@example.com already exists')
+        self.assertTrue(Customer.objects.filter(email='new2@example.com').exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        rows = [{'name': f'Bulk {i}', 'email': f'bulk{i}@example.com'} for i in range(200)]
+        # email lookup, savepoint, insert, release
+        with self.assertNumQueries(4):
+            data = self.execute(self.mutation, input=rows)['bulkCreateCustomers']
+        self.assertEqual(len(data['customers']), 200)
+        self.assertEqual(data['errors'], [])
+
+    def test_only_insert_conflicts_become_batch_errors(self):
+        rows = [{'name': 'Raced', 'email': 'raced@example.com'}]
+        # An email taken between the check and the insert
+        with mock.patch('crm.bulk.existing_emails', return_value=set()):
+            Customer.objects.create(name='Raced', email='raced@example.com')
+            data = self.execute(self.mutation, input=rows)['bulkCreateCustomers']
+        self.assertEqual(data['customers'], [])
+        self.assertEqual(len(data['errors']), 1)
+
+        with mock.patch('crm.bulk.existing_emails', side_effect=TypeError('bug')):
+            result = schema.execute(self.mutation, variable_values={'input': rows}, context_value=SimpleNamespace())
+        self.assertEqual(result.errors[0].message, 'bug')
+
+
+class CreateOrderTests(CRMTestCase):
+    mutation = """
+    mutation ($customerId: ID!, $productIds: [ID]!) {
+        createOrder(input: {customerId: $customerId, productIds: $productIds}) {
+            order { totalAmount products { edges { node { id } } } }
+            message
+        }
+    }
+    """
+
+    def create_order(self, *product_ids, customer=None):
+        customer = customer or self.customers[0]
+        return self.execute(
+            self.mutation,
+            customerId=customer.pk,
+            productIds=[product.pk for product in product_ids],
+        )['createOrder']
+
+    def test_totals_in_sql_and_decrements_stock(self):
+        product = self.products[4]
+        # customer, locked products, stock update, order, items, total update
+        # and read back, stats, three sales rollup upserts, savepoint pair,
+        # then the products of the returned order
+        with self.assertNumQueries(14):
+            data = self.create_order(product, product, self.products[3])
+        self.assertEqual(data['message'], 'Order created successfully')
+        self.assertEqual(Decimal(data['order']['totalAmount']), Decimal('41.00'))
+        self.assertEqual(len(data['order']['products']['edges']), 2)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 2)
+
+    def test_repeated_products_become_item_quantities(self):
+        self.create_order(self.products[4], self.products[4], self.products[3])
+        order = Order.objects.latest('pk')
+        self.assertEqual(
+            sorted(order.items.values_list('product', 'quantity', 'unit_price')),
+            [(self.products[3].pk, 1, Decimal('13.00')), (self.products[4].pk, 2, Decimal('14.00'))],
+        )
+        # Prices changed later do not change what was paid
+        Product.objects.filter(pk=self.products[4].pk).update(price=Decimal('99.00'))
+        with self.assertNumQueries(1):
+            self.assertEqual(str(order.calculate_total()), '41.00')
+
+        data = self.execute(
+            'query ($id: Int!) { order(id: $id) { items { quantity unitPrice product { name } } } }',
+            id=order.pk,
+        )
+        self.assertEqual(
+            sorted((item['product']['name'], item['quantity'], item['unitPrice']) for item in data['order']['items']),
+            [('Product 3', 1, '13.00'), ('Product 4', 2, '14.00')],
+        )
+
+    def test_insufficient_stock_rolls_back(self):
+        orders = Order.objects.count()
+        data = self.create_order(self.products[3], self.products[1], self.products[1])
+        self.assertIsNone(data['order'])
+        self.assertEqual(data['message'], f'Insufficient stock for product {self.products[1].pk}')
+        self.assertEqual(Order.objects.count(), orders)
+        self.products[3].refresh_from_db()
+        self.assertEqual(self.products[3].stock, 3)
+
+    def test_invalid_product_id(self):
+        data = self.create_order(Product(pk=999))
+        self.assertEqual(data['message'], 'Invalid product ID: 999')
+
+    def test_items_carry_quantities(self):
+        mutation = """
+        mutation ($input: OrderInput!) {
+            createOrder(input: $input) { order { totalAmount items { quantity } } message }
+        }
+        """
+        high, low = self.products[4], self.products[2]
+        data = self.execute(mutation, input={
+            'customerId': self.customers[0].pk,
+            'items': [{'productId': high.pk, 'quantity': 3}],
+            'productIds': [low.pk, high.pk],
+        })['createOrder']
+        self.assertEqual(data['message'], 'Order created successfully')
+        # 4 x 14.00 + 12.00
+        self.assertEqual(data['order']['totalAmount'], '68.00')
+        self.assertEqual(sorted(item['quantity'] for item in data['order']['items']), [1, 4])
+
+        data = self.execute(mutation, input={
+            'customerId': self.customers[0].pk, 'items': [{'productId': low.pk, 'quantity': 0}],
+        })['createOrder']
+        self.assertEqual(data['message'], f'Quantity must be at least 1 for product {low.pk}')
+        data = self.execute(mutation, input={'customerId': self.customers[0].pk})['createOrder']
+        self.assertEqual(data['message'], 'At least one product must be provided')
+
+
+class BulkCreateOrdersTests(CRMTestCase):
+    mutation = """
+    mutation ($input: [OrderInput!]!) {
+        bulkCreateOrders(input: $input) { orders { totalAmount } errors }
+    }
+    """
+
+    def test_reports_row_errors_without_aborting_batch(self):
+        low, high = self.products[1], self.products[4]
+        rows = [
+            {'customerId': self.customers[0].pk, 'productIds': [high.pk, low.pk]},
+            {'customerId': 999, 'productIds': [high.pk]},
+            {'customerId': self.customers[1].pk, 'productIds': [low.pk]},
+            {'customerId': self.customers[2].pk, 'productIds': []},
+            {'customerId': self.customers[3].pk, 'items': [{'productId': high.pk, 'quantity': 2}]},
+            {'customerId': self.customers[4].pk, 'items': [{'productId': high.pk, 'quantity': -1}]},
+        ]
+        data = self.execute(self.mutation, input=rows)['bulkCreateOrders']
+        # summed from the inserted items in SQL
+        self.assertEqual([order['totalAmount'] for order in data['orders']], ['25.00', '28.00'])
+        self.assertEqual(data['errors'], [
+            'Order 2: Invalid customer ID',
+            f'Order 3: Insufficient stock for product {low.pk}',
+            'Order 4: At least one product must be provided',
+            f'Order 6: Quantity must be at least 1 for product {high.pk}',
+        ])
+        high.refresh_from_db()
+        self.assertEqual(high.stock, 1)
+        self.assertEqual(Order.products.through.objects.filter(product=high).count(), 2)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        rows = [
+            {'customerId': customer.pk, 'productIds': [self.products[4].pk]}
+            for customer in self.customers[:4]
+        ]
+        # customers, products, stock update, orders, items, totals update and
+        # read, stats, three sales rollup upserts, savepoint pair
+        with self.assertNumQueries(13):
+            data = self.execute(self.mutation, input=rows)['bulkCreateOrders']
+        self.assertEqual(len(data['orders']), 4)
+
+
+class UpdateLowStockProductsTests(CRMTestCase):
+    def test_restocks_in_one_update_without_returning_products(self):
+        query = "mutation { updateLowStockProducts(returnProducts: false) { success message updatedProducts { id } } }"
+        # savepoint pair around a single UPDATE
+        with self.assertNumQueries(3):
+            data = self.execute(query)['updateLowStockProducts']
+        self.assertEqual(data['message'], 'Updated 5 low-stock products')
+        self.assertIsNone(data['updatedProducts'])
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('stock', flat=True)),
+            [10, 11, 12, 13, 14],
+        )
+
+    def test_threshold_increment_and_scope(self):
+        query = """
+        mutation ($ids: [ID!]) {
+            updateLowStockProducts(threshold: 3, increment: 5, productIds: $ids) {
+                message updatedProducts { name stock }
+            }
+        }
+        """
+        ids = [product.pk for product in self.products[1:]]
+        data = self.execute(query, ids=ids)['updateLowStockProducts']
+        self.assertEqual(data['message'], 'Updated 2 low-stock products')
+        self.assertEqual(data['updatedProducts'], [
+            {'name': 'Product 1', 'stock': 6},
+            {'name': 'Product 2', 'stock': 7},
+        ])
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 0)
+
+
+class PersistedQueryTests(CRMTestCase):
+    query = "query Names { allProducts(first: 2) { edges { node { name } } } }"
+
+    def setUp(self):
+        document_cache.clear()
+
+    def post(self, **body):
+        response = self.client.post('/graphql/', json.dumps(body), content_type='application/json')
+        return response.status_code, response.json()
+
+    def persisted(self, digest):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': digest}}
+
+    def test_hash_only_request_after_registration(self):
+        digest = query_hash(self.query)
+        status, body = self.post(extensions=self.persisted(digest))
+        self.assertEqual(status, 400)
+        self.assertEqual(body['errors'][0]['message'], 'PersistedQueryNotFound')
+
+        status, body = self.post(query=self.query, extensions=self.persisted(digest))
+        self.assertEqual(status, 200)
+        with mock.patch('crm.documents.parse') as parse, mock.patch('crm.documents.validate') as validate:
+            status, body = self.post(extensions=self.persisted(digest))
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body['data']['allProducts']['edges']), 2)
+        parse.assert_not_called()
+        validate.assert_not_called()
+
+    def test_rejects_mismatched_hash(self):
+        status, body = self.post(query=self.query, extensions=self.persisted('0' * 64))
+        self.assertEqual(status, 400)
+
+    def test_registered_operations_resolve_by_hash(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = PersistedQueryRegistry(f'{tmp}/persisted_queries.json')
+            with mock.patch('crm.views.persisted_queries', registry):
+                [digest] = registry.register([SCHEMA_QUERY])
+                status, body = self.post(extensions=self.persisted(digest))
+        self.assertEqual(status, 200)
+        self.assertEqual(body['data']['__schema']['queryType']['name'], 'Query')
+
+    def test_cache_evicts_least_recently_used(self):
+        with mock.patch.object(document_cache, 'maxsize', 2):
+            for i in range(3):
+                self.post(query=f"query Q{i} {{ allProducts(first: 1) {{ totalCount }} }}")
+        self.assertEqual(len(document_cache), 2)
+        self.assertIsNone(document_cache.get_query(query_hash("query Q0 { allProducts(first: 1) { totalCount } }")))
+
+
+@override_settings(CRM_RESOLVER_CACHE={'ENABLED': True, 'CACHE_ALIAS': 'graphql', 'TIMEOUT': 60})
+class ResolverCacheTests(CRMTestCase):
+    product_query = "query ($id: Int!) { product(id: $id) { name stock orders { edges { node { id } } } } }"
+
+    def setUp(self):
+        caches['graphql'].clear()
+
+    def product(self, product):
+        return self.execute(self.product_query, id=product.pk)['product']
+
+    def test_repeated_read_is_served_from_cache(self):
+        first = self.product(self.products[1])
+        hits = resolver_cache.hits
+        with self.assertNumQueries(0):
+            second = self.product(self.products[1])
+        self.assertEqual(first, second)
+        self.assertEqual(resolver_cache.hits, hits + 1)
+
+    def test_stats_are_staff_only(self):
+        self.product(self.products[1])
+        self.product(self.products[1])
+        self.assertEqual(self.client.get('/internal/resolver-cache/').status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        stats = self.client.get('/internal/resolver-cache/').json()
+        self.assertEqual(stats, {'enabled': True, 'hits': resolver_cache.hits, 'misses': resolver_cache.misses})
+        self.assertGreaterEqual(stats['hits'], 1)
+
+    def test_write_evicts_only_affected_entries(self):
+        self.product(self.products[1])
+        self.product(self.products[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.products[2].pk).update(stock=99)
+            self.products[2].stock = 99
+            self.products[2].save()
+        with self.assertNumQueries(0):
+            self.product(self.products[1])
+        self.assertEqual(self.product(self.products[2])['stock'], 99)
+
+    def test_create_order_evicts_ordered_products_and_customer(self):
+        customer_query = "query ($id: Int!) { customer(id: $id) { orders { totalCount } } }"
+        self.execute(customer_query, id=self.customers[0].pk)
+        self.product(self.products[3])
+        self.product(self.products[4])
+        mutation = """
+        mutation ($customerId: ID!, $productIds: [ID]!) {
+            createOrder(input: {customerId: $customerId, productIds: $productIds}) { message }
+        }
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute(mutation, customerId=self.customers[0].pk, productIds=[self.products[4].pk])
+        with self.assertNumQueries(0):
+            self.product(self.products[3])
+        self.assertEqual(self.product(self.products[4])['stock'], 3)
+        data = self.execute(customer_query, id=self.customers[0].pk)
+        self.assertEqual(data['customer']['orders']['totalCount'], 4)
+
+    def test_restock_evicts_product_lists(self):
+        query = "query { productsFiltered(filter: {lowStock: true}) { stock } }"
+        self.assertEqual(len(self.execute(query)['productsFiltered']), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute("mutation { updateLowStockProducts(returnProducts: false) { success } }")
+        self.assertEqual(self.execute(query)['productsFiltered'], [])
+
+
+class QueryCostTests(CRMTestCase):
+    def post(self, query, **variables):
+        return self.client.post(
+            '/graphql/', {'query': query, 'variables': variables}, content_type='application/json'
+        )
+
+    def test_cost_is_reported_with_page_sizes_from_variables(self):
+        query = """
+        query ($n: Int) {
+            allOrders(first: $n) { edges { node { customer { name } products { edges { node { name } } } } } }
+        }
+        """
+        response = self.post(query, n=5)
+        self.assertEqual(response.status_code, 200)
+        cost = response.json()['extensions']['cost']
+        # allOrders, then customer and products for each of the 5 orders
+        self.assertEqual(cost['requestedCost'], 11)
+        self.assertEqual(cost['depth'], 3)
+
+        # An empty page costs the connection alone
+        cost = self.post(query, n=0).json()['extensions']['cost']
+        self.assertEqual(cost['requestedCost'], 1)
+
+    @override_settings(GRAPHQL_QUERY_COST={'MAX_DEPTH': 10, 'MAX_COST': 1000})
+    def test_over_budget_query_is_rejected_before_resolving(self):
+        query = """
+        {
+            allCustomers { edges { node { orders { edges { node {
+                products { edges { node { name } } }
+            } } } } } }
+        }
+        """
+        with self.assertNumQueries(0):
+            response = self.post(query)
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertNotIn('data', body)
+        self.assertIn('exceeds the maximum cost of 1000', body['errors'][0]['message'])
+        self.assertEqual(body['extensions']['cost']['requestedCost'], 1 + 100 + 100 * 100)
+
+    def test_too_deep_query_is_rejected(self):
+        query = """
+        {
+            allCustomers(first: 1) { edges { node { orders(first: 1) { edges { node {
+                products(first: 1) { edges { node { orders(first: 1) { edges { node {
+                    customer { name }
+                } } } } } }
+            } } } } } }
+        }
+        """
+        response = self.post(query)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['message'], "Query depth 6 exceeds the maximum depth of 5")
+
+
+class TracingTests(CRMTestCase):
+    query = """
+    {
+        allOrders(first: 5) { edges { node { customer { name } products { edges { node { name } } } } } }
+        customersFiltered { orders { totalCount } }
+    }
+    """
+
+    def post(self, **extensions):
+        return self.client.post(
+            '/graphql/', {'query': self.query, 'extensions': extensions}, content_type='application/json'
+        ).json()
+
+    def test_tracing_extension_attributes_sql_to_resolver_paths(self):
+        self.assertNotIn('tracing', self.post()['extensions'])
+
+        tracing = self.post(tracing=True)['extensions']['tracing']
+        paths = {entry['path']: entry for entry in tracing['resolvers']}
+        self.assertEqual(paths['allOrders']['sqlQueries'], 2)
+        self.assertEqual(paths['allOrders.edges.node.customer']['calls'], 5)
+        self.assertEqual(paths['allOrders.edges.node.customer']['sqlQueries'], 0)
+        # the planner prefetches the customers' orders with the list itself
+        self.assertEqual(paths['customersFiltered']['sqlQueries'], 2)
+        self.assertEqual(paths['customersFiltered.orders']['sqlQueries'], 0)
+        self.assertEqual(tracing['sqlQueries'], sum(entry['sqlQueries'] for entry in tracing['resolvers']))
+
+    @override_settings(GRAPHQL_TRACING={'RECORD': True})
+    def test_recorded_operations_feed_resolver_timings(self):
+        resolver_histogram.clear()
+        self.post()
+        self.post()
+        # Staff only
+        self.assertEqual(self.client.get('/internal/resolver-timings/').status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        timings = {row['path']: row for row in self.client.get('/internal/resolver-timings/').json()['timings']}
+        self.assertEqual(timings['allOrders']['count'], 2)
+        self.assertEqual(timings['allOrders']['sql_queries'], 2)
+        self.assertEqual(sum(bucket['count'] for bucket in timings['allOrders']['buckets']), 2)
+
+
+class ResolverTimingsCommandTests(LiveServerTestCase):
+    @override_settings(GRAPHQL_TRACING={'RECORD': True})
+    def test_signs_in_as_staff_and_dumps_the_server_histogram(self):
+        User.objects.create_user('staff', password='secret', is_staff=True)
+        resolver_histogram.clear()
+        Client().post('/graphql/', {'query': '{ hello }'}, content_type='application/json')
+        options = ['--url', self.live_server_url, '--username', 'staff']
+
+        out = StringIO()
+        with mock.patch.dict(os.environ, {'CRM_STAFF_PASSWORD': 'secret'}):
+            call_command('resolver_timings', *options, stdout=out)
+        self.assertIn('hello', out.getvalue())
+
+        with mock.patch.dict(os.environ, {'CRM_STAFF_PASSWORD': 'wrong'}):
+            with self.assertRaisesMessage(CommandError, 'Could not sign in'):
+                call_command('resolver_timings', *options, stdout=StringIO())
+
+
+class FilterIndexTests(CRMTestCase):
+    def test_every_filter_path_searches_an_index(self):
+        for label, queryset in filter_queries():
+            with self.subTest(label):
+                plan, scans = full_scans(label, queryset)
+                self.assertEqual(scans, [], plan)
+
+
+@override_settings(CRM_SEARCH_BACKEND='fts5')
+class SearchTests(CRMTestCase):
+    def assertSameAsLike(self, queryset, field_path, value):
+        found = icontains(queryset, field_path, value)
+        expected = icontains(queryset, field_path, value, backend='like')
+        self.assertQuerySetEqual(found.order_by('pk'), expected.order_by('pk'), transform=lambda row: row)
+        return list(found)
+
+    def test_trigram_search_matches_icontains(self):
+        self.assertIn('MATCH', str(icontains(Customer.objects.all(), 'name', 'tomer 3').query))
+        self.assertEqual(len(self.assertSameAsLike(Customer.objects.all(), 'name', 'tomer 3')), 1)
+        self.assertEqual(len(self.assertSameAsLike(Customer.objects.all(), 'email', 'EXAMPLE.COM')), 10)
+        self.assertEqual(len(self.assertSameAsLike(Product.objects.all(), 'name', 'duct')), 5)
+        self.assertSameAsLike(Customer.objects.all(), 'name', 'no "such" name')
+        self.assertSameAsLike(Order.objects.all(), 'customer__name', 'tomer 1')
+        self.assertSameAsLike(Order.objects.all(), 'products__name', 'Product 2')
+        # too short for a trigram
+        self.assertNotIn('MATCH', str(icontains(Customer.objects.all(), 'name', ' 1').query))
+        self.assertEqual(len(self.assertSameAsLike(Customer.objects.all(), 'name', '1')), 1)
+
+    def test_triggers_keep_the_index_in_sync(self):
+        customer = Customer.objects.create(name="Zelda Fitzgerald", email="zelda@example.com")
+        Customer.objects.bulk_create([Customer(name="Zelig", email="zelig@example.com")])
+        self.assertEqual(icontains(Customer.objects.all(), 'name', 'zel').count(), 2)
+
+        Customer.objects.filter(pk=customer.pk).update(name="Scott Fitzgerald")
+        self.assertEqual(icontains(Customer.objects.all(), 'name', 'zel').count(), 1)
+        self.assertEqual(icontains(Customer.objects.all(), 'name', 'scott').get(), customer)
+
+        customer.delete()
+        self.assertFalse(icontains(Customer.objects.all(), 'name', 'fitz').exists())
+
+    def test_filter_inputs_use_search(self):
+        data = self.execute("""
+            {
+                customersFiltered(filter: {nameIcontains: "tomer 7"}) { name }
+                productsFiltered(filter: {nameIcontains: "duct 4"}) { name }
+                ordersFiltered(filter: {customerName: "tomer 7"}) { customer { name } }
+            }
+        """)
+        self.assertEqual(data['customersFiltered'], [{'name': 'Customer 7'}])
+        self.assertEqual(data['productsFiltered'], [{'name': 'Product 4'}])
+        self.assertEqual(len(data['ordersFiltered']), 3)
+
+
+class CustomerStatsTests(CRMTestCase):
+    query = """
+    query ($filter: CustomerFilterInput) {
+        customersFiltered(filter: $filter) { name orderCount lifetimeValue lastOrderAt }
+    }
+    """
+
+    def stats(self):
+        return {
+            row.customer_id: (row.order_count, row.lifetime_value, row.last_order_at)
+            for row in CustomerStats.objects.all()
+        }
+
+    def test_writes_keep_stats_equal_to_a_rebuild(self):
+        customer = self.customers[0]
+        self.execute(
+            'mutation ($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) { message } }',
+            c=customer.pk, p=[self.products[4].pk],
+        )
+        self.execute(
+            'mutation ($input: [OrderInput!]!) { bulkCreateOrders(input: $input) { errors } }',
+            input=[{'customerId': pk, 'productIds': [self.products[3].pk]} for pk in (customer.pk, customer.pk)],
+        )
+        Order.objects.filter(customer=self.customers[1]).first().delete()
+        Order.objects.filter(customer=self.customers[2]).delete()
+
+        incremental = self.stats()
+        self.assertEqual(incremental[customer.pk][:2], (6, Decimal('40.00')))
+        self.assertEqual(incremental[self.customers[1].pk][0], 2)
+        self.assertEqual(incremental[self.customers[2].pk], (0, Decimal('0.00'), None))
+        rebuild_customer_stats()
+        rebuilt = self.stats()
+        rebuilt[self.customers[2].pk] = (0, Decimal('0.00'), None)
+        self.assertEqual(incremental, rebuilt)
+
+    def test_fields_and_filters(self):
+        newcomer = Customer.objects.create(name="Newcomer", email="new@example.com")
+        Order.objects.filter(customer=self.customers[0]).update(total_amount=Decimal('100.00'))
+        rebuild_customer_stats()
+
+        # one query for the page, one for the stats of every customer on it
+        with self.assertNumQueries(2):
+            rows = self.execute(self.query)['customersFiltered']
+        by_name = {row['name']: row for row in rows}
+        self.assertEqual(by_name['Customer 0']['orderCount'], 3)
+        self.assertEqual(Decimal(by_name['Customer 0']['lifetimeValue']), Decimal('300.00'))
+        self.assertEqual(by_name['Newcomer'], {
+            'name': 'Newcomer', 'orderCount': 0, 'lifetimeValue': '0.00', 'lastOrderAt': None,
+        })
+
+        def names(**filter):
+            return sorted(row['name'] for row in self.execute(self.query, filter=filter)['customersFiltered'])
+
+        self.assertEqual(names(lifetimeValueGte=100), ['Customer 0'])
+        self.assertEqual(names(orderCountLte=0), [newcomer.name])
+        self.assertEqual(len(names(orderCountGte=3)), 10)
+        self.assertNotIn(newcomer.name, names(lastOrderAtLte=timezone.now().isoformat()))
+
+
+class PurgeInactiveCustomersTests(CRMTestCase):
+    def purge(self, *args):
+        out = StringIO()
+        call_command('purge_inactive_customers', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_inactive_customers_with_their_orders_in_chunks(self):
+        inactive = self.customers[:5]
+        Order.objects.filter(customer__in=inactive).update(order_date=timezone.now() - timedelta(days=400))
+        newcomer = Customer.objects.create(name="Newcomer", email="new@example.com")
+        links = Order.products.through.objects.count()
+
+        self.assertIn('Would delete 6 inactive customers, 15 orders and 30 order items', self.purge('--dry-run'))
+        self.assertEqual(Customer.objects.count(), 11)
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self.purge('--batch-size', '2')
+        self.assertIn('Deleted 6 inactive customers, 15 orders and 30 order items in 3 chunks', output)
+        # five tables, then the emptied day and product rollup rows, per chunk
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 21)
+
+        self.assertQuerySetEqual(
+            Customer.objects.order_by('pk'), self.customers[5:], transform=lambda customer: customer,
+        )
+        self.assertFalse(Customer.objects.filter(pk=newcomer.pk).exists())
+        self.assertEqual(Order.objects.count(), 15)
+        self.assertEqual(Order.products.through.objects.count(), links - 30)
+        self.assertEqual(CustomerStats.objects.count(), 5)
+
+
+class OrderReminderTests(CRMTestCase):
+    class SchemaClient:
+        """gql client stand-in executing against the schema in process"""
+
+        def execute(self, document, variable_values=None):
+            result = schema.execute(print_ast(document), variable_values=variable_values, context_value=SimpleNamespace())
+            assert result.errors is None, result.errors
+            return result.data
+
+    def test_logs_only_the_date_window_in_one_query(self):
+        Order.objects.filter(customer__in=self.customers[:4]).update(order_date=timezone.now() - timedelta(days=30))
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = f"{tmp}/reminders.txt"
+            with self.assertNumQueries(1):
+                self.assertEqual(send_order_reminders(log_path=log_path), 18)
+            with open(log_path) as log_file:
+                lines = log_file.read().splitlines()
+        self.assertEqual(len([line for line in lines if 'Order ID' in line]), 18)
+        self.assertTrue(lines[-1].endswith('Processed 18 orders'))
+        self.assertIn('Customer: Customer 4 (customer4@example.com)', lines[2])
+
+    def test_graphql_mode_pages_to_the_same_lines(self):
+        since = timezone.now() - timedelta(days=7)
+        expected = list(db_reminders(since, 'now'))
+        lines = list(graphql_reminders(self.SchemaClient(), since, 'now', page_size=7))
+        self.assertEqual(len(lines), 30)
+        self.assertEqual(lines, expected)
+
+
+class GraphQLClientTests(CRMTestCase):
+    class TestClientTransport(Transport):
+        """HTTP transport stand-in posting through the Django test client"""
+
+        def __init__(self, **kwargs):
+            self.client = Client()
+            self.posted = []
+            self.response_headers = None
+
+        def execute(self, document, variable_values=None, operation_name=None, extra_args=None, **kwargs):
+            body = (extra_args or {}).get('json') or {'query': print_ast(document), 'variables': variable_values}
+            self.posted.append(body)
+            response = self.client.post('/graphql/', body, content_type='application/json')
+            self.response_headers = response.headers
+            return ExecutionResult(**response.json())
+
+    def setUp(self):
+        document_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.registry = PersistedQueryRegistry(f'{directory.name}/persisted_queries.json')
+        patcher = mock.patch('crm.views.persisted_queries', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def http_client(self, snapshot):
+        with override_settings(CRM_GRAPHQL_CLIENT={'SCHEMA_SNAPSHOT': snapshot}), \
+                mock.patch('crm.client.QueryRetryingTransport', self.TestClientTransport):
+            return GraphQLClient(local=False)
+
+    def test_schema_snapshot_is_introspected_once_per_schema_hash(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = f"{tmp}/schema.json"
+            client = self.http_client(snapshot)
+            client.execute(SCHEMA_QUERY)
+            # the first response's hash is unknown, so the schema is fetched
+            self.assertEqual(len(client.client.transport.posted), 2)
+            self.assertEqual(client.schema_hash, schema_hash(schema.graphql_schema))
+
+            client = self.http_client(snapshot)
+            self.assertIsNotNone(client.client.schema)
+            data = client.execute(UPDATE_LOW_STOCK_MUTATION)
+            self.assertTrue(data['updateLowStockProducts']['success'])
+            # the hash, then the text the server did not have yet
+            self.assertEqual(len(client.client.transport.posted), 2)
+
+            with open(snapshot) as snapshot_file:
+                stale = json.load(snapshot_file)
+            stale['hash'] = 'stale'
+            with open(snapshot, 'w') as snapshot_file:
+                json.dump(stale, snapshot_file)
+            client = self.http_client(snapshot)
+            client.execute(SCHEMA_QUERY)
+            self.assertEqual(len(client.client.transport.posted), 2)
+
+    def test_job_operations_are_sent_by_hash(self):
+        client = self.http_client(None)
+        variables = {'since': '2020-01-01T00:00:00+00:00', 'first': 1}
+        client.execute(RECENT_ORDERS_QUERY, variables)
+        client.execute(gql(RECENT_ORDERS_QUERY), variables)
+        posted = client.client.transport.posted
+        # hash, hash and text, the introspection of an unknown schema, hash
+        self.assertEqual(
+            [sorted(body) for body in posted],
+            [
+                ['extensions', 'variables'], ['extensions', 'query', 'variables'],
+                ['query', 'variables'], ['extensions', 'variables'],
+            ],
+        )
+        self.assertEqual(posted[0]['extensions']['persistedQuery']['sha256Hash'], query_hash(RECENT_ORDERS_QUERY))
+
+        # Registered operations never need their text
+        document_cache.clear()
+        self.registry.register([UPDATE_LOW_STOCK_MUTATION])
+        self.assertTrue(client.execute(UPDATE_LOW_STOCK_MUTATION)['updateLowStockProducts']['success'])
+        self.assertEqual(sorted(posted[-1]), ['extensions'])
+        self.assertEqual(len(posted), 5)
+
+    def test_only_queries_are_retried(self):
+        transport = QueryRetryingTransport(url='http://crm.invalid/graphql/', retries=3)
+        transport.connect()
+        self.addCleanup(transport.close)
+        response = mock.Mock(status_code=200, headers={}, **{'json.return_value': {'data': {}}})
+        for query, retries in ((SCHEMA_QUERY, 3), (UPDATE_LOW_STOCK_MUTATION, 0)):
+            with mock.patch('requests.Session.request', autospec=True, return_value=response) as request:
+                transport.execute(parse(query))
+            session = request.call_args.args[0]
+            self.assertEqual(session.get_adapter(transport.url).max_retries.total, retries)
+
+    def test_local_transport_runs_in_process(self):
+        client = get_client(local=True)
+        # the UPDATE inside the transport's and the mutation's savepoints
+        with self.assertNumQueries(5):
+            data = client.execute(UPDATE_LOW_STOCK_MUTATION)
+        self.assertEqual(data['updateLowStockProducts']['message'], 'Updated 5 low-stock products')
+        self.assertEqual(client.execute(SCHEMA_QUERY)['__schema']['queryType']['name'], 'Query')
+
+
+class HealthTests(CRMTestCase):
+    def setUp(self):
+        clear_health_cache()
+        request_latency.clear()
+
+    def test_report_is_cached_and_includes_request_latency(self):
+        client = Client()
+        client.post('/graphql/', {'query': SCHEMA_QUERY}, content_type='application/json')
+        response = client.get('/health/')
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['status'], 'ok')
+        self.assertTrue(report['database']['ok'])
+        self.assertEqual(report['migrations']['pending'], [])
+        self.assertEqual(report['latency']['requests'], 1)
+        self.assertLessEqual(report['latency']['p50_ms'], report['latency']['p99_ms'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/health/').json(), report)
+
+    def test_unreachable_database_is_503(self):
+        with mock.patch('crm.health.connection.cursor', side_effect=OperationalError('unable to open database')):
+            response = Client().get('/health/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'down')
+        self.assertIn('unable to open database', response.json()['database']['error'])
+
+    def test_heartbeat_logs_measured_latency(self):
+        client = Client()
+        with mock.patch('crm.health._session.get', lambda url, timeout: client.get('/health/')):
+            status = heartbeat_status()
+        self.assertRegex(status, r'^health ok in [0-9.]+ ms \(db [0-9.]+ ms, 0 pending migrations\)$')
+
+
+class GenerateDatasetTests(TestCase):
+    def generate(self, **kwargs):
+        options = {'customers': 20, 'products': 8, 'orders': 60, 'seed': 7, 'end': timezone.now(), **kwargs}
+        for _ in generate_dataset(**options):
+            pass
+        return [
+            list(Customer.objects.order_by('pk').values_list()),
+            list(Product.objects.order_by('pk').values_list()),
+            list(Order.objects.order_by('pk').values_list()),
+            # the link ids are the table's own
+            list(Order.products.through.objects.order_by('pk').values_list('order', 'product')),
+        ]
+
+    def test_same_seed_gives_same_rows(self):
+        end = timezone.now()
+        first = self.generate(end=end)
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        self.assertEqual(self.generate(end=end), first)
+
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        self.assertNotEqual(self.generate(seed=8, end=end), first)
+
+    def test_orders_follow_the_products_per_order_distribution(self):
+        self.generate(items_per_order={2: 1, 3: 1})
+        for order in Order.objects.prefetch_related('products'):
+            products = list(order.products.all())
+            self.assertIn(len(products), (2, 3))
+            self.assertEqual(order.total_amount, sum(product.price for product in products))
+        self.assertEqual(sum(CustomerStats.objects.values_list('order_count', flat=True)), 60)
+
+    def test_command_rejects_a_malformed_distribution(self):
+        with self.assertRaisesMessage(CommandError, '--items-per-order'):
+            call_command('generate_dataset', '--items-per-order', '0:5', stdout=StringIO())
+
+
+class BenchmarkTests(CRMTestCase):
+    def test_every_root_field_runs_on_both_paths(self):
+        operations = benchmark_operations(anchors())
+        graphql_schema = schema.graphql_schema
+        fields = {*graphql_schema.query_type.fields, *graphql_schema.mutation_type.fields}
+        self.assertEqual({name.split('.')[0] for name, _, _ in operations}, fields)
+
+        customers = Customer.objects.count()
+        for name, query, variables in operations:
+            for mode in MODES:
+                result = run_benchmark(mode, query, variables, iterations=1, warmup=0)
+                self.assertGreater(result['p50_ms'], 0, name)
+        # mutations are rolled back
+        self.assertEqual(Customer.objects.count(), customers)
+
+    def test_command_generates_a_dataset_and_checks_the_baseline(self):
+        Customer.objects.all().delete()
+        Product.objects.all().delete()
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = f'{directory}/baseline.json'
+            options = ['--iterations', '1', '--warmup', '0', '--mode', 'schema', '--baseline', baseline]
+            with self.assertRaisesMessage(CommandError, 'No baseline at'):
+                call_command('run_benchmarks', *options, stdout=StringIO())
+
+            out = StringIO()
+            call_command(
+                'run_benchmarks', '--generate', '--customers', '20', '--products', '8', '--orders', '60',
+                '--save-baseline', *options, stdout=out,
+            )
+            self.assertIn('Generated the dataset', out.getvalue())
+            self.assertEqual(Order.objects.count(), 60)
+
+            out = StringIO()
+            # Timings of single runs are noise; the statement counts must match
+            call_command('run_benchmarks', '--tolerance', '1000', *options, stdout=out)
+            self.assertIn('No regressions', out.getvalue())
+
+    def test_search_benchmarks_find_the_anchor_on_both_backends(self):
+        benchmarks = search_benchmarks(anchors())
+        self.assertEqual(len(benchmarks), 4)
+        for name, runs in benchmarks:
+            pages = {backend: run() for backend, run in runs.items()}
+            self.assertEqual(set(pages), set(SEARCH_BACKENDS))
+            self.assertTrue(pages['like'], name)
+            self.assertEqual(pages['like'], pages['fts5'], name)
+
+    def test_compare_flags_extra_queries_and_slowdowns(self):
+        base = {'allOrders': {'schema': {'p50_ms': 10.0, 'queries': 2, 'peak_kb': 100.0}}}
+        same = {'allOrders': {'schema': {'p50_ms': 11.0, 'queries': 2, 'peak_kb': 110.0}}}
+        worse = {'allOrders': {'schema': {'p50_ms': 30.0, 'queries': 3, 'peak_kb': 100.0}}}
+        self.assertEqual(compare(same, base), [])
+        self.assertEqual(compare(worse, base), [
+            'allOrders [schema]: 2 -> 3 SQL queries',
+            'allOrders [schema]: p50 10.0 -> 30.0 ms',
+        ])
+
+
+class ExportTests(CRMTestCase):
+    def order_rows(self, **filters):
+        orders = Order.objects.filter(**filters).distinct().order_by('pk')
+        return [
+            [order.pk, order.customer_id, sorted(order.products.values_list('pk', flat=True))]
+            for order in orders
+        ]
+
+    def test_command_streams_orders_with_product_ids(self):
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as output:
+            # Chunks smaller than the export
+            call_command('export_crm', 'orders', format='ndjson', output=output.name, chunk_size=7, stderr=StringIO())
+            rows = [json.loads(line) for line in open(output.name)]
+        self.assertEqual(
+            [[row['id'], row['customer_id'], row['product_ids']] for row in rows],
+            self.order_rows(),
+        )
+        self.assertEqual(rows[0]['total_amount'], '0.00')
+
+    def test_csv_endpoint_applies_order_filters(self):
+        response = Client().get('/export/orders/', {'format': 'csv', 'product_name': 'Product 2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['id', 'customer_id', 'total_amount', 'order_date', 'product_ids'])
+        self.assertEqual(
+            [[int(row[0]), int(row[1]), [int(pk) for pk in row[4].split(';')]] for row in rows[1:]],
+            self.order_rows(products__name='Product 2'),
+        )
+
+    def test_customer_filters_and_empty_export(self):
+        lines = ''.join(export('customers', {'email': 'customer3@'})).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('customer3@example.com', lines[1])
+        self.assertEqual(''.join(export('customers', {'name': 'nobody'})), 'id,name,email,phone,created_at\r\n')
+
+    def test_invalid_requests_are_400(self):
+        client = Client()
+        response = client.get('/export/orders/', {'order_date_gte': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('order_date_gte', response.json()['errors'])
+        self.assertEqual(client.get('/export/invoices/').status_code, 400)
+        self.assertEqual(client.get('/export/orders/', {'format': 'xml'}).status_code, 400)
+
+
+class ImportTests(CRMTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, text):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w') as source:
+            source.write(text)
+        return path
+
+    def test_customers_are_validated_like_the_mutation(self):
+        path = self.write('customers.csv', (
+            'name,email,phone,created_at\n'
+            'Ann,ann@example.com,+12345678901,2020-01-02T03:04:05\n'
+            'Bob,not-an-email,,\n'
+            'Cy,cy@example.com,12,\n'
+            'Dup,customer1@example.com,,\n'
+            'Ann again,ann@example.com,,\n'
+        ))
+        out = StringIO()
+        call_command('import_crm', 'customers', path, stdout=out)
+        self.assertIn('Imported 1 customers and rejected 4 of 5 records', out.getvalue())
+
+        ann = Customer.objects.get(email='ann@example.com')
+        self.assertEqual(ann.created_at.isoformat(), '2020-01-02T03:04:05+00:00')
+        with open(f'{path}.rejects.csv') as rejects:
+            rows = list(csv.DictReader(rejects))
+        self.assertEqual([row['record'] for row in rows], ['2', '3', '4', '5'])
+        self.assertIn('Enter a valid email address', rows[0]['error'])
+        self.assertIn('Phone number must be entered', rows[1]['error'])
+        self.assertEqual(rows[2]['error'], 'Email customer1@example.com already exists')
+        self.assertEqual(rows[3]['name'], 'Ann again')
+
+    def test_orders_resolve_emails_and_skus(self):
+        products = self.write('products.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'name': 'Widget', 'price': '2.50', 'stock': 4, 'sku': 'W-1'},
+            {'name': 'Gadget', 'price': '10', 'sku': 'G-1'},
+            {'name': 'Free', 'price': '0', 'sku': 'F-1'},
+            {'name': 'Widget copy', 'price': '1', 'sku': 'W-1'},
+        ]) + '\n')
+        for _ in import_file('products', products):
+            pass
+        self.assertEqual(Product.objects.filter(sku__isnull=False).count(), 2)
+
+        orders = self.write('orders.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'customer_email': 'customer2@example.com', 'product_skus': ['W-1', 'W-1', 'G-1'], 'order_date': '2021-05-01T00:00:00Z'},
+            {'customer_id': self.customers[3].pk, 'product_ids': [self.products[0].pk], 'total_amount': '7.00'},
+            {'customer_email': 'nobody@example.com', 'product_skus': ['W-1']},
+            {'customer_email': 'customer2@example.com', 'product_skus': ['NOPE']},
+        ]) + '\nnot json\n')
+        results = list(import_file('orders', orders))
+        self.assertEqual(results[-1], {'records': 5, 'imported': 2, 'rejected': 3, 'read': 5})
+
+        order = Order.objects.get(customer=self.customers[2], order_date__year=2021)
+        self.assertEqual(order.total_amount, Decimal('15.00'))
+        self.assertEqual(sorted(order.products.values_list('sku', flat=True)), ['G-1', 'W-1'])
+        # History: stock is left alone; stats follow the imported orders
+        self.assertEqual(Product.objects.get(sku='W-1').stock, 4)
+        self.assertEqual(CustomerStats.objects.get(customer=self.customers[3]).order_count, 4)
+        with open(f'{orders}.rejects.ndjson') as rejects:
+            errors = [json.loads(line)['error'] for line in rejects]
+        self.assertEqual(errors, ['Unknown customer email: nobody@example.com', 'Unknown product SKU: NOPE', 'Invalid JSON'])
+
+    def test_resume_continues_after_the_checkpoint(self):
+        path = self.write('customers.csv', 'name,email\n' + ''.join(
+            f'Imported {i},imported{i}@example.com\n' if i != 4 else 'Bad,bad\n' for i in range(10)
+        ))
+        # Stopped after its first transaction, as a killed run would be
+        run = import_file('customers', path, batch_size=3, transaction_rows=3)
+        self.assertEqual(next(run), {'records': 3, 'imported': 3, 'rejected': 0, 'read': 3})
+        run.close()
+
+        results = list(import_file('customers', path, batch_size=3, transaction_rows=3, resume=True, workers=2))
+        self.assertEqual(results[-1], {'records': 10, 'imported': 9, 'rejected': 1, 'read': 7})
+        self.assertEqual(Customer.objects.filter(email__startswith='imported').count(), 9)
+        with open(f'{path}.rejects.csv') as rejects:
+            self.assertEqual(len(list(csv.DictReader(rejects))), 1)
+        self.assertEqual(list(import_file('customers', path, resume=True)), [])
+
+    def test_a_failed_transaction_keeps_rows_and_checkpoint_together(self):
+        customer = self.customers[0]
+        path = self.write('orders.csv', 'customer_id,product_ids\n' + ''.join(
+            f'{customer.pk},{self.products[i % 5].pk}\n' for i in range(6)
+        ))
+        orders = Order.objects.count()
+        save = Checkpoint.save
+
+        def crash_on_second_save(checkpoint, state, finished=False):
+            if state['records'] > 3:
+                raise RuntimeError('killed')
+            save(checkpoint, state, finished)
+
+        with mock.patch.object(Checkpoint, 'save', crash_on_second_save):
+            with self.assertRaisesMessage(RuntimeError, 'killed'):
+                list(import_file('orders', path, batch_size=3, transaction_rows=3))
+        self.assertEqual(Order.objects.count(), orders + 3)
+
+        results = list(import_file('orders', path, batch_size=3, transaction_rows=3, resume=True))
+        self.assertEqual(results[-1], {'records': 6, 'imported': 6, 'rejected': 0, 'read': 3})
+        self.assertEqual(Order.objects.count(), orders + 6)
+        self.assertEqual(CustomerStats.objects.get(customer=customer).order_count, 9)
+
+
+class SalesRollupTests(CRMTestCase):
+    def rollups(self):
+        return {
+            model: sorted(model.objects.values_list(*keys, 'order_count', 'revenue', 'units'))
+            for model, keys in (
+                (DailySales, ('date',)),
+                (DailyProductSales, ('date', 'product')),
+                (DailyCustomerSales, ('date', 'customer')),
+            )
+        }
+
+    def test_writes_keep_rollups_equal_to_a_rebuild(self):
+        customer = self.customers[0]
+        self.execute(
+            'mutation ($c: ID!, $p: [ID]!) { createOrder(input: {customerId: $c, productIds: $p}) { message } }',
+            c=customer.pk, p=[self.products[4].pk, self.products[3].pk],
+        )
+        self.execute(
+            'mutation ($input: [OrderInput!]!) { bulkCreateOrders(input: $input) { errors } }',
+            input=[{'customerId': pk, 'productIds': [self.products[3].pk]} for pk in (customer.pk, customer.pk)],
+        )
+        Order.objects.filter(customer=self.customers[1]).first().delete()
+        Order.objects.filter(customer=self.customers[2]).first().products.remove(self.products[2])
+        self.products[4].orders.add(
+            *Order.objects.filter(customer=self.customers[3]), through_defaults={'unit_price': Decimal('9.00')},
+        )
+        Order.objects.filter(customer=self.customers[4]).first().products.clear()
+        item = OrderItem.objects.filter(order__customer=self.customers[7]).first()
+        item.quantity = 4
+        item.save()
+        delete_customers([self.customers[5].pk])
+
+        incremental = self.rollups()
+        day, = incremental[DailySales]
+        self.assertEqual(day[1:], (29, Decimal('53.00'), 59))
+        rebuild_sales()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_analytics_queries(self):
+        today = timezone.now().date()
+        Order.objects.filter(customer=self.customers[1]).update(order_date=timezone.now() - timedelta(days=3))
+        Order.objects.filter(customer=self.customers[0]).update(total_amount=Decimal('100.00'))
+        rebuild_sales()
+        rebuild_customer_stats()
+
+        query = """
+        query ($from: Date, $to: Date) {
+            salesByDay(from: $from, to: $to) { date orderCount units }
+            topProducts(n: 2, from: $from, to: $to) { product { name } orderCount revenue units }
+            topCustomers(n: 1, from: $from, to: $to) { customer { name } orderCount revenue }
+        }
+        """
+        # one query per field, and one each for the top products and customers
+        with self.assertNumQueries(5):
+            data = self.execute(query, **{'from': str(today - timedelta(days=7)), 'to': str(today)})
+        self.assertEqual(data['salesByDay'], [
+            {'date': str(today - timedelta(days=3)), 'orderCount': 3, 'units': 6},
+            {'date': str(today), 'orderCount': 27, 'units': 54},
+        ])
+        self.assertEqual(data['topProducts'], [
+            {'product': {'name': 'Product 2'}, 'orderCount': 20, 'revenue': '240.00', 'units': 20},
+            {'product': {'name': 'Product 1'}, 'orderCount': 20, 'revenue': '220.00', 'units': 20},
+        ])
+        self.assertEqual(data['topCustomers'], [
+            {'customer': {'name': 'Customer 0'}, 'orderCount': 3, 'revenue': '300.00'},
+        ])
+
+        later = self.execute(query, **{'from': str(today - timedelta(days=2))})
+        self.assertEqual([row['orderCount'] for row in later['salesByDay']], [27])
+        all_time = self.execute('query { topCustomers(n: 1) { customer { name } orderCount revenue units } }')
+        self.assertEqual(all_time['topCustomers'], [
+            {'customer': {'name': 'Customer 0'}, 'orderCount': 3, 'revenue': '300.00', 'units': 6},
+        ])
+
+        result = schema.execute('query { topProducts(n: 500) { units } }', context_value=SimpleNamespace())
+        self.assertEqual(result.errors[0].message, '`topProducts` returns between 1 and 100 rows, not 500.')
+
+
+class AsyncViewTests(TransactionTestCase):
+    # Pool threads use their own connections, so the data must be committed
+    def setUp(self):
+        products = [Product.objects.create(name=f"Product {i}", price=Decimal("5.00"), stock=3) for i in range(2)]
+        for i in range(3):
+            customer = Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com")
+            order = Order.objects.create(customer=customer, total_amount=Decimal("5.00"))
+            order.products.set(products, through_defaults={'unit_price': Decimal("5.00")})
+        self.product = products[0]
+
+    def post_async(self, query, **extensions):
+        response = async_to_sync(AsyncClient().post)(
+            '/graphql/async/', {'query': query, 'extensions': extensions}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_async_view_matches_sync_view(self):
+        query = """
+        {
+            customer(id: %d) { name orders { totalCount } }
+            ordersFiltered(orderBy: "id") { customer { name } products { edges { node { name } } } }
+            allCustomers(first: 2) { edges { node { email } } }
+        }
+        """ % Customer.objects.first().pk
+        expected = self.client.post('/graphql/', {'query': query}, content_type='application/json').json()
+        self.assertNotIn('errors', expected)
+        self.assertEqual(self.post_async(query), expected)
+
+    def test_mutations_run_on_the_pool(self):
+        data = self.post_async("""
+            mutation { createOrder(input: {customerId: "%d", productIds: ["%d"]}) {
+                order { totalAmount customer { name } }
+            } }
+        """ % (Customer.objects.first().pk, self.product.pk))
+        self.assertEqual(Decimal(data['data']['createOrder']['order']['totalAmount']), Decimal('5.00'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+
+    def test_tracing_follows_resolvers_onto_threads(self):
+        query = """
+        {
+            allOrders(first: 2) { edges { node { customer { name } } } }
+            customersFiltered(orderBy: "id") { orders { totalCount } }
+        }
+        """
+        expected = self.client.post(
+            '/graphql/', {'query': query, 'extensions': {'tracing': True}}, content_type='application/json'
+        ).json()['extensions']['tracing']
+        tracing = self.post_async(query, tracing=True)['extensions']['tracing']
+        # allOrders is offloaded to the pool, customersFiltered uses the async ORM
+        def counts(report):
+            return {entry['path']: (entry['calls'], entry['sqlQueries']) for entry in report['resolvers']}
+        self.assertEqual(counts(tracing), counts(expected))
+        self.assertEqual(counts(tracing)['customersFiltered'], (1, 2))
+        self.assertGreater(counts(tracing)['allOrders'][1], 0)
+
+        mutation = self.post_async("""
+            mutation { createOrder(input: {customerId: "%d", productIds: ["%d"]}) { order { id } } }
+        """ % (Customer.objects.first().pk, self.product.pk), tracing=True)['extensions']['tracing']
+        paths = {entry['path']: entry for entry in mutation['resolvers']}
+        self.assertGreater(paths['createOrder']['sqlQueries'], 0)
+
+    def test_asgi_serves_graphql_with_the_async_view(self):
+        self.addCleanup(clear_url_caches)
+        self.addCleanup(importlib.reload, urls)
+        self.assertIs(resolve('/graphql/').func.view_class, CRMGraphQLView)
+        with override_settings(GRAPHQL_VIEW='async'):
+            importlib.reload(urls)
+        clear_url_caches()
+        self.assertIs(resolve('/graphql/').func.view_class, AsyncCRMGraphQLView)
+        response = async_to_sync(AsyncClient().post)('/graphql/', {'query': '{ hello }'}, content_type='application/json')
+        self.assertEqual(response.json()['data'], {'hello': 'Hello, GraphQL!'})
+
+    def test_view_benchmarks_run_both_views(self):
+        [(name, runs)] = view_benchmarks(concurrency=3)
+        self.assertEqual(name, 'views.allOrders.x3')
+        for mode, run in runs.items():
+            result = measure(run, iterations=1, warmup=0, count_queries=mode not in THREADED_MODES)
+            self.assertGreater(result['p50_ms'], 0, mode)
+        self.assertIsNone(result['queries'])
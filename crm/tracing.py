@@ -0,0 +1,235 @@
+"""Per-resolver timing and SQL attribution for the GraphQL views.
+
+A ``Trace`` covers one operation: ``TracingMiddleware`` marks which resolver
+path (``allOrders.edges.node.customer``, list indexes dropped) is running
+and ``execute_wrapper`` charges every SQL statement to it, so an N+1 shows
+up as a path whose statement count grows with the page size. Scalar fields
+read off an already loaded row are not traced.
+
+Clients get the trace as ``extensions.tracing`` by sending
+``"extensions": {"tracing": true}``. With ``GRAPHQL_TRACING['RECORD']``
+every traced operation also feeds ``resolver_histogram``, the rolling
+per-path statistics served to staff by ``crm.views.resolver_timings`` and
+dumped by the ``resolver_timings`` command.
+
+The running resolver is kept in a context variable, which follows the async
+view's resolvers onto ``crm.executor`` pool threads and ``sync_to_async``
+threads, and ``execute_wrapper`` is installed on every connection
+(``crm.signals``), so both views are traced the same way.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import isawaitable
+
+from django.conf import settings
+
+from .executor import reads_attribute
+
+DEFAULTS = {
+    'RECORD': False,
+    'WINDOW': 1000,
+    'BUCKETS_MS': (1, 5, 10, 50, 100, 500, 1000),
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'GRAPHQL_TRACING', {})}
+
+
+def resolver_path(info):
+    return '.'.join(str(key) for key in info.path.as_list() if not isinstance(key, int))
+
+
+# ``(trace, stats)`` of the resolver running in this context; ``stats`` is
+# ``None`` between resolvers, where SQL is charged to the operation itself
+_charging = ContextVar('crm_tracing_charging', default=None)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class PathStats:
+    __slots__ = ('calls', 'duration', 'sql_count', 'db_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.duration = 0.0
+        self.sql_count = 0
+        self.db_time = 0.0
+
+
+class Trace:
+    """Timings and SQL statements of one operation, by resolver path.
+
+    Under the async view resolvers of one operation run on several threads
+    at once, so the counters are updated under a lock.
+    """
+
+    def __init__(self):
+        self.paths = {}
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def stats(self, path):
+        with self._lock:
+            stats = self.paths.get(path)
+            if stats is None:
+                stats = self.paths[path] = PathStats()
+            return stats
+
+    @contextmanager
+    def charging(self, stats):
+        """Charge the block's SQL, in this context, to ``stats``"""
+        token = _charging.set((self, stats))
+        try:
+            yield
+        finally:
+            _charging.reset(token)
+
+    def count_call(self, stats, started):
+        with self._lock:
+            stats.duration += time.perf_counter() - started
+            stats.calls += 1
+
+    def count_sql(self, stats, started):
+        if stats is None:
+            stats = self.stats('')
+        with self._lock:
+            stats.db_time += time.perf_counter() - started
+            stats.sql_count += 1
+
+    @contextmanager
+    def capture(self):
+        """Time the block and attribute the SQL it runs, on any thread"""
+        started = time.perf_counter()
+        try:
+            with self.charging(None):
+                yield self
+        finally:
+            self.duration += time.perf_counter() - started
+
+    def report(self):
+        """The ``extensions.tracing`` block; slowest paths first"""
+        resolvers = [
+            {
+                'path': path or '(operation)',
+                'calls': stats.calls,
+                'durationMs': _ms(stats.duration),
+                'sqlQueries': stats.sql_count,
+                'dbMs': _ms(stats.db_time),
+            }
+            for path, stats in self.paths.items()
+        ]
+        resolvers.sort(key=lambda entry: entry['durationMs'], reverse=True)
+        return {
+            'durationMs': _ms(self.duration),
+            'sqlQueries': sum(stats.sql_count for stats in self.paths.values()),
+            'dbMs': _ms(sum(stats.db_time for stats in self.paths.values())),
+            'resolvers': resolvers,
+        }
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Charge a statement to the trace and resolver running in this context"""
+    charging = _charging.get()
+    if charging is None:
+        return execute(sql, params, many, context)
+    trace, stats = charging
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.count_sql(stats, started)
+
+
+def install_execute_wrapper(connection):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+class TracingMiddleware:
+    """graphql-core middleware reporting resolver calls to the request's trace.
+
+    A resolver returning an awaitable is timed until it completes.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = getattr(info.context, 'crm_trace', None)
+        if trace is None or reads_attribute(info):
+            return next(root, info, **args)
+
+        stats = trace.stats(resolver_path(info))
+        started = time.perf_counter()
+        try:
+            with trace.charging(stats):
+                result = next(root, info, **args)
+        except Exception:
+            trace.count_call(stats, started)
+            raise
+        if isawaitable(result):
+            return self._resolve_async(trace, stats, started, result)
+        trace.count_call(stats, started)
+        return result
+
+    async def _resolve_async(self, trace, stats, started, result):
+        try:
+            with trace.charging(stats):
+                return await result
+        finally:
+            trace.count_call(stats, started)
+
+
+class ResolverHistogram:
+    """Rolling per-path samples of the last ``WINDOW`` traced operations"""
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        window = get_config()['WINDOW']
+        with self._lock:
+            for path, stats in trace.paths.items():
+                samples = self._samples.get(path)
+                if samples is None:
+                    samples = self._samples[path] = deque(maxlen=window)
+                samples.append((stats.duration, stats.sql_count, stats.db_time))
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """Per-path percentiles and bucket counts of the time per operation"""
+        buckets = get_config()['BUCKETS_MS']
+        with self._lock:
+            snapshot = {path: list(samples) for path, samples in self._samples.items()}
+
+        rows = []
+        for path, samples in snapshot.items():
+            durations = sorted(_ms(duration) for duration, _, _ in samples)
+            counts = [0] * (len(buckets) + 1)
+            for duration in durations:
+                counts[next((i for i, le in enumerate(buckets) if duration <= le), len(buckets))] += 1
+            rows.append({
+                'path': path or '(operation)',
+                'count': len(durations),
+                'p50_ms': durations[int(len(durations) * 0.5)],
+                'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'max_ms': durations[-1],
+                'sql_queries': sum(sql for _, sql, _ in samples) / len(samples),
+                'db_ms': _ms(sum(db for _, _, db in samples) / len(samples)),
+                'buckets': [
+                    {'le_ms': le, 'count': count}
+                    for le, count in zip([*buckets, None], counts)
+                ],
+            })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return rows
+
+
+resolver_histogram = ResolverHistogram()
@@ -1,3 +1,353 @@
-from django.shortcuts import render
+import json
+import time
+from contextlib import contextmanager
+from inspect import isawaitable
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_safe
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, validate_schema
+from graphql.error import GraphQLError
+
+from .cache import resolver_cache
+from .complexity import QueryCostError, analyze
+from .documents import SCHEMA_HASH_HEADER, document_cache, persisted_queries, query_hash, schema_hash
+from .executor import OffloadSyncResolvers, run_in_executor
+from .export import FORMATS, ExportError, export
+from .health import health_report, request_latency
+from .tracing import Trace, TracingMiddleware, get_config as get_tracing_config, resolver_histogram
+
+
+class CRMGraphQLView(GraphQLView):
+    """GraphQLView with automatic persisted queries and a shared document cache.
+
+    Clients may send ``extensions.persistedQuery.sha256Hash`` instead of the
+    query text (Apollo's automatic persisted query protocol). Whether sent as
+    text or as a hash, each operation is parsed and validated once per
+    process and then served from ``crm.documents.document_cache``.
+
+    Operations over the ``crm.complexity`` depth or cost budget are rejected
+    before any resolver runs; the computed cost is reported in
+    ``extensions.cost``. ``"extensions": {"tracing": true}`` adds the
+    ``crm.tracing`` per-resolver timings as ``extensions.tracing``.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.add_schema_hash(super().dispatch(request, *args, **kwargs))
+        finally:
+            request_latency.record(time.perf_counter() - started)
+
+    def add_schema_hash(self, response):
+        response[SCHEMA_HASH_HEADER] = schema_hash(self.schema.graphql_schema)
+        return response
+
+    @staticmethod
+    def get_extensions(request, data):
+        """The request's ``extensions`` object, from the query string or body"""
+        extensions = request.GET.get('extensions') or data.get('extensions') or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except Exception:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return extensions if isinstance(extensions, dict) else {}
+
+    def get_middleware(self, request):
+        return [TracingMiddleware(), *(super().get_middleware(request) or [])]
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+
+        persisted = self.get_extensions(request, data).get('persistedQuery')
+        if not persisted:
+            return query, variables, operation_name, id
+
+        digest = persisted.get('sha256Hash')
+        if query:
+            if query_hash(query) != digest:
+                raise HttpError(HttpResponseBadRequest("provided sha does not match query"))
+            return query, variables, operation_name, id
+
+        query = document_cache.get_query(digest) or persisted_queries.get(digest)
+        if query is None:
+            raise HttpError(HttpResponseBadRequest("PersistedQueryNotFound"))
+        return query, variables, operation_name, id
+
+    def get_operation(self, request, query, operation_name):
+        """``(document, operation_ast, validation_errors)`` from ``document_cache``.
+
+        ``None`` leaves the request to graphene-django, which turns away a
+        missing query, a syntax error, a mutation sent by GET and an invalid
+        schema itself.
+        """
+        schema = self.schema.graphql_schema
+        if not query or validate_schema(schema):
+            return None
+        try:
+            document, validation_errors = document_cache.get_document(
+                schema, query, self.validation_rules
+            )
+        except GraphQLError:
+            return None
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            return None
+        return document, operation_ast, validation_errors
+
+    def get_cost(self, document, operation_ast, variables):
+        """The ``extensions`` reporting the operation's cost; raises ``QueryCostError``"""
+        if operation_ast is None:
+            return {}
+        return {'cost': analyze(self.schema.graphql_schema, document, operation_ast, variables)}
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def is_atomic_mutation(self, operation_ast):
+        return (
+            operation_ast is not None
+            and operation_ast.operation == OperationType.MUTATION
+            and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+            )
+        )
+
+    def execute_atomic(self, request, document, execute_options):
+        with transaction.atomic():
+            result = execute(self.schema.graphql_schema, document, **execute_options)
+            if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                transaction.set_rollback(True)
+        return result
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        # graphene-django parses, validates and executes here in one step; the
+        # parse and validation come from document_cache instead, and anything
+        # the cache does not cover is left to the base class
+        operation = self.get_operation(request, query, operation_name)
+        if operation is None:
+            return super().execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        document, operation_ast, validation_errors = operation
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        try:
+            extensions = self.get_cost(document, operation_ast, variables)
+        except QueryCostError as e:
+            return self.add_extensions(request, ExecutionResult(data=None, errors=[e]), e.extensions)
+
+        execute_options = self.get_execute_options(request, variables, operation_name)
+        with self.tracing(request, data, execute_options['context_value'], extensions):
+            try:
+                if self.is_atomic_mutation(operation_ast):
+                    result = self.execute_atomic(request, document, execute_options)
+                else:
+                    result = execute(self.schema.graphql_schema, document, **execute_options)
+            except Exception as e:
+                result = ExecutionResult(errors=[e])
+        return self.add_extensions(request, result, extensions)
+
+    @contextmanager
+    def tracing(self, request, data, context, extensions):
+        """Trace the operation run in the block, when the client asks for it or
+        for the resolver histogram; the report goes into ``extensions``"""
+        wants_tracing = bool(self.get_extensions(request, data).get('tracing'))
+        record = get_tracing_config()['RECORD']
+        if not (wants_tracing or record):
+            yield
+            return
+
+        trace = context.crm_trace = Trace()
+        try:
+            with trace.capture():
+                yield
+        finally:
+            del context.crm_trace
+
+        if record:
+            resolver_histogram.record(trace)
+        if wants_tracing:
+            extensions['tracing'] = trace.report()
+
+    @staticmethod
+    def add_extensions(request, result, extensions):
+        """Add ``extensions`` to ``result``, and keep them for ``json_encode``"""
+        if extensions:
+            result.extensions = {**(result.extensions or {}), **extensions}
+        request.graphql_extensions = result.extensions
+        return result
+
+    def json_encode(self, request, d, pretty=False):
+        # graphene-django's get_response leaves out result.extensions
+        extensions = request.__dict__.pop('graphql_extensions', None)
+        if extensions:
+            d = {**d, "extensions": extensions}
+        return super().json_encode(request, d, pretty)
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """``CRMGraphQLView`` for ASGI, executed with graphql-core's async executor.
+
+    Resolvers that are coroutines (``crm.schema.AsyncQuery``) run on the
+    event loop; sync resolvers that may touch the ORM are offloaded to the
+    bounded ``crm.executor`` thread pool, so a slow query no longer pins the
+    worker. Atomic mutations run whole on one pool thread, since a
+    transaction cannot span threads. Tracing follows the resolvers onto the
+    pool (see ``crm.tracing``).
+    """
+
+    view_is_async = True
+
+    def get_middleware(self, request):
+        # graphql-core nests the first middleware innermost, directly around
+        # the resolver, where it must see SynchronousOnlyOperation
+        return [OffloadSyncResolvers(), *(super().get_middleware(request) or [])]
+
+    @method_decorator(ensure_csrf_cookie)
+    async def dispatch(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = self.parse_body(request)
+            show_graphiql = self.graphiql and self.can_display_graphiql(request, data)
+
+            if show_graphiql:
+                # Rendered by graphene's sync view (not ours, which would
+                # record the request's latency a second time)
+                response = await sync_to_async(GraphQLView.dispatch)(self, request, *args, **kwargs)
+                return self.add_schema_hash(response)
+
+            if self.batch:
+                responses = [await self.get_response_async(request, entry) for entry in data]
+                result = "[{}]".format(",".join([response[0] for response in responses]))
+                status_code = (
+                    responses and max(responses, key=lambda response: response[1])[1] or 200
+                )
+            else:
+                result, status_code = await self.get_response_async(request, data)
+
+            return self.add_schema_hash(
+                HttpResponse(status=status_code, content=result, content_type="application/json")
+            )
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+        finally:
+            request_latency.record(time.perf_counter() - started)
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        request.graphql_result = await self.execute_graphql_request_async(
+            request, data, query, variables, operation_name
+        )
+        # Formatted by graphene-django, which takes the result from
+        # execute_graphql_request below
+        return self.get_response(request, data)
+
+    def execute_graphql_request(self, request, *args, **kwargs):
+        return request.__dict__.pop('graphql_result')
+
+    async def execute_graphql_request_async(self, request, data, query, variables, operation_name):
+        operation = self.get_operation(request, query, operation_name)
+        if operation is None:
+            # Turned away by graphene-django before anything runs
+            return GraphQLView.execute_graphql_request(
+                self, request, data, query, variables, operation_name
+            )
+        document, operation_ast, validation_errors = operation
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        try:
+            extensions = self.get_cost(document, operation_ast, variables)
+        except QueryCostError as e:
+            return self.add_extensions(request, ExecutionResult(data=None, errors=[e]), e.extensions)
+
+        execute_options = self.get_execute_options(request, variables, operation_name)
+        with self.tracing(request, data, execute_options['context_value'], extensions):
+            try:
+                if self.is_atomic_mutation(operation_ast):
+                    def execute_atomic():
+                        execute_options["middleware"] = super(AsyncCRMGraphQLView, self).get_middleware(request)
+                        return self.execute_atomic(request, document, execute_options)
+
+                    result = await run_in_executor(execute_atomic)
+                else:
+                    result = execute(self.schema.graphql_schema, document, **execute_options)
+                    if isawaitable(result):
+                        result = await result
+            except Exception as e:
+                result = ExecutionResult(errors=[e])
+        return self.add_extensions(request, result, extensions)
+
+
+@require_safe
+def health(request):
+    """Liveness report of ``crm.health``; 503 when the database is unreachable"""
+    report = health_report()
+    return JsonResponse(report, status=503 if report['status'] == 'down' else 200)
+
+
+@require_safe
+def export_view(request, resource):
+    """Stream ``resource`` as CSV or NDJSON (``?format=``), filtered by the other parameters"""
+    format = request.GET.get('format', 'csv')
+    try:
+        chunks = export(resource, request.GET, format)
+    except ExportError as e:
+        return JsonResponse({'error': str(e), 'errors': e.errors}, status=400)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[format])
+    response['Content-Disposition'] = f'attachment; filename="{resource}.{format}"'
+    return response
+
+
+@staff_member_required
+@require_safe
+def resolver_timings(request):
+    """This process's rolling per-path resolver timings (``crm.tracing``), for staff"""
+    return JsonResponse({'timings': resolver_histogram.summary()})
+
+
+@staff_member_required
+@require_safe
+def resolver_cache_stats(request):
+    """This process's resolver cache counters (``crm.cache``), for staff"""
+    return JsonResponse(resolver_cache.stats())